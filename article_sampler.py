@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import math
+import os
+import random
+import re
+
+SAMPLER_STATE_FILE = os.path.join("training_data", "article_sampler_state.json")
+
+# Content is truncated to this many characters in the prompt, so longer articles don't weigh more
+MAX_CONTENT_CHARS = 40000
+
+# Relative preference of each conversation type for each wiki category (default 1.0)
+CATEGORY_AFFINITY = {
+    "mining_and_resources": {"Blocks": 3.0, "Items": 2.0},
+    "crafting_and_recipes": {"Crafting": 3.0, "Items": 2.0, "Blocks": 1.5, "Brewing": 1.5},
+    "mob_knowledge": {"Mobs": 5.0},
+    "game_mechanics": {"Mechanics": 3.0, "Brewing": 2.0},
+    "navigation_and_biomes": {"Mechanics": 2.0, "Blocks": 1.5},
+    "survival_scenarios": {"Mobs": 2.5, "Mechanics": 1.5},
+    "resource_chains": {"Items": 2.0, "Crafting": 2.0, "Blocks": 2.0},
+    "gameplay_strategy": {"Items": 1.5, "Mobs": 1.5},
+}
+
+# Give up on finding a less-used article after this many rejected draws
+MAX_REJECTIONS = 32
+
+# Extra uses charged to an article whose example was a near-duplicate
+SATURATION_PENALTY = 3
+
+def build_alias_table(weights):
+    """Vose's alias method: O(n) build, O(1) draws. Returns (prob, alias) lists."""
+    n = len(weights)
+    total = float(sum(weights))
+    scaled = [w * n / total for w in weights]
+    prob = [0.0] * n
+    alias = [0] * n
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] = scaled[l] + scaled[s] - 1.0
+        (small if scaled[l] < 1.0 else large).append(l)
+
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+def alias_draw(table, rng):
+    prob, alias = table
+    i = int(rng.random() * len(prob))
+    return i if rng.random() < prob[i] else alias[i]
+
+def article_weight(article, weighting):
+    content = article.get("content", "")[:MAX_CONTENT_CHARS]
+    if weighting == "uniform":
+        return 1.0 if content else 0.0
+    if weighting == "informativeness":
+        # Distinct words is a cheap proxy for how much an article has to say
+        return float(len(set(re.findall(r"[a-z]{3,}", content.lower()))))
+    # Square root tempers size so huge articles don't crowd out the long tail
+    return math.sqrt(len(content))
+
+def article_key(category, article):
+    return f"{category}/{article.get('title', 'Unknown')}"
+
+def source_to_key(source):
+    """Map an example's source (minecraft_wiki_{category}_{title}) back to an article key"""
+    if not source or not source.startswith("minecraft_wiki_"):
+        return None
+    category, _, title = source[len("minecraft_wiki_"):].partition("_")
+    return f"{category}/{title}" if title else None
+
+class ArticleSampler:
+    """Precomputed, coverage-aware article sampler for create_instruction_prompt.
+
+    Per conversation type, a category is drawn from an alias table weighted by
+    CATEGORY_AFFINITY x sqrt(category size), then an article from that category's
+    alias table weighted by article size or informativeness. Per-article usage is
+    tracked and over-used draws are rejected in favour of less-used articles, so
+    generation covers the corpus evenly. Usage and tables persist in state_path.
+    """
+
+    def __init__(self, wiki_data, weighting="size", seed=None, state_path=SAMPLER_STATE_FILE):
+        self.weighting = weighting
+        self.state_path = state_path
+        self.rng = random.Random(seed)
+
+        # Flatten the corpus, dropping articles with no content
+        self.categories = []
+        self.articles = []   # per category: list of (key, article)
+        for category in sorted(wiki_data):
+            # Keyed by title, so a re-scraped duplicate keeps the first copy
+            by_key = {}
+            for a in wiki_data[category] or []:
+                if article_weight(a, weighting) > 0:
+                    by_key.setdefault(article_key(category, a), a)
+            entries = list(by_key.items())
+            if entries:
+                self.categories.append(category)
+                self.articles.append(entries)
+        if not self.categories:
+            raise ValueError("No valid categories with content found in wiki data")
+
+        self.fingerprint = self._fingerprint()
+        self.usage = {}
+        self._usage_histogram = {}  # usage count -> number of articles with that count
+        self.min_usage = 0
+
+        state = self._load_state()
+        if state is not None and state.get("fingerprint") == self.fingerprint:
+            self.article_tables = [tuple(t) for t in state["article_tables"]]
+            self.category_tables = {k: tuple(t) for k, t in state["category_tables"].items()}
+            self.usage = state["usage"]
+        else:
+            self._build_tables()
+            if state is not None:
+                # Corpus changed: keep usage for articles that still exist
+                print("Wiki data changed since the sampler index was built, rebuilding tables")
+                keys = {key for entries in self.articles for key, _ in entries}
+                self.usage = {k: v for k, v in state.get("usage", {}).items() if k in keys}
+        self._rebuild_histogram()
+
+    def _fingerprint(self):
+        h = hashlib.sha256(self.weighting.encode("utf-8"))
+        for category, entries in zip(self.categories, self.articles):
+            for key, article in entries:
+                h.update(key.encode("utf-8"))
+                h.update(str(len(article.get("content", ""))).encode("utf-8"))
+        return h.hexdigest()
+
+    def _build_tables(self):
+        self.article_tables = []
+        category_sizes = []
+        for entries in self.articles:
+            weights = [article_weight(a, self.weighting) for _, a in entries]
+            self.article_tables.append(build_alias_table(weights))
+            category_sizes.append(sum(weights))
+
+        self.category_tables = {}
+        for conversation_type in list(CATEGORY_AFFINITY) + ["default"]:
+            affinity = CATEGORY_AFFINITY.get(conversation_type, {})
+            weights = [affinity.get(c, 1.0) * math.sqrt(size) for c, size in zip(self.categories, category_sizes)]
+            self.category_tables[conversation_type] = build_alias_table(weights)
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error loading sampler state, rebuilding: {e}")
+            return None
+        return state
+
+    def save(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        state = {
+            "fingerprint": self.fingerprint,
+            "weighting": self.weighting,
+            "categories": self.categories,
+            "article_tables": self.article_tables,
+            "category_tables": self.category_tables,
+            "usage": self.usage
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _rebuild_histogram(self):
+        self._usage_histogram = {}
+        for entries in self.articles:
+            for key, _ in entries:
+                count = self.usage.get(key, 0)
+                self._usage_histogram[count] = self._usage_histogram.get(count, 0) + 1
+        self.min_usage = min(self._usage_histogram)
+
+    def record_use(self, key):
+        count = self.usage.get(key, 0)
+        self.usage[key] = count + 1
+        self._usage_histogram[count] -= 1
+        self._usage_histogram[count + 1] = self._usage_histogram.get(count + 1, 0) + 1
+        if self._usage_histogram[count] == 0:
+            del self._usage_histogram[count]
+            if count == self.min_usage:
+                self.min_usage = count + 1
+
+    def mark_saturated(self, key, penalty=SATURATION_PENALTY):
+        """Charge extra uses to an article that keeps yielding near-duplicates, so draws move on"""
+        if key is None or key not in self.usage:
+            return
+        for _ in range(penalty):
+            self.record_use(key)
+
+    def seed_usage_from_examples(self, examples):
+        """Count articles already used by an existing dataset (only when there's no saved usage)"""
+        if self.usage:
+            return
+        keys = {key for entries in self.articles for key, _ in entries}
+        for example in examples:
+            key = source_to_key(example.get("source"))
+            if key in keys:
+                self.usage[key] = self.usage.get(key, 0) + 1
+        self._rebuild_histogram()
+
+    def draw(self, conversation_type):
+        """Return (category, article) for a conversation type, preferring under-used articles"""
+        table = self.category_tables.get(conversation_type, self.category_tables["default"])
+        for _ in range(MAX_REJECTIONS):
+            c = alias_draw(table, self.rng)
+            key, article = self.articles[c][alias_draw(self.article_tables[c], self.rng)]
+            # Accept an article used k times more than the least-used one with probability 1/(k+1)
+            excess = self.usage.get(key, 0) - self.min_usage
+            if excess <= 0 or self.rng.random() * (excess + 1) < 1.0:
+                break
+        self.record_use(key)
+        return self.categories[c], article
+
+    def coverage(self):
+        total = sum(len(entries) for entries in self.articles)
+        used = sum(1 for v in self.usage.values() if v > 0)
+        return used, total
+
+    def print_stats(self):
+        used, total = self.coverage()
+        print(f"Article coverage: {used}/{total} articles used ({used / total:.1%}), "
+              f"least-used article drawn {self.min_usage}x, most-used {max(self.usage.values(), default=0)}x")
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark for both dataset generators.
+
+Runs create_unified_dataset and the command-intent main() against the local mock
+LLM server, each in a fresh process with an empty working directory, and reports
+accepted examples/sec, yield per LLM call, client CPU time per example,
+checkpoint I/O time and peak memory. Results are appended to BENCHMARK_RESULTS_FILE
+and compared with the previous run of the same configuration.
+
+    python benchmark_generation.py --examples 200 --latency 0.02 --failure-rate 0.05
+    python benchmark_generation.py --pipeline unified --latency 0.02 --verify-model big --verify-slowdown 4
+    python benchmark_generation.py --history
+"""
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from mock_llm_server import start_mock_server
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_RESULTS_FILE = os.path.join(REPO_DIR, "benchmark_results", "generation.jsonl")
+PIPELINES = ["unified", "command_intent"]
+API_PATHS = {"ollama": "/api/generate", "openai": "/v1"}
+
+# Metrics compared against the previous run; True means higher is better
+COMPARED_METRICS = {
+    "examples_per_sec": True,
+    "yield": True,
+    "client_overhead_ms": False,
+    "checkpoint_seconds": False,
+    "decoded_tokens": False,
+    "prompt_tokens": False,
+    "p95_generation_seconds": False,
+    "peak_rss_mb": False,
+}
+
+def _timed(fn, totals):
+    """Wrap fn so every call adds its duration to totals["seconds"]
+
+    Calls made while another wrapped call is running (close() flushing, say) are
+    part of the outer call and aren't counted twice.
+    """
+    def wrapper(*args, **kwargs):
+        if totals.get("depth"):
+            return fn(*args, **kwargs)
+        totals["depth"] = 1
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            totals["depth"] = 0
+            totals["seconds"] += time.perf_counter() - started
+            totals["calls"] += 1
+    return wrapper
+
+def _write_wiki_data(work_dir):
+    """raw_data/all_minecraft_data.json for the run: the scraped file if present, else the per-category files"""
+    source = os.path.join(REPO_DIR, "raw_data", "all_minecraft_data.json")
+    if os.path.exists(source):
+        with open(source, 'r', encoding='utf-8') as f:
+            wiki_data = json.load(f)
+    else:
+        wiki_data = {}
+        for path in sorted(glob.glob(os.path.join(REPO_DIR, "raw_data", "*.json"))):
+            with open(path, 'r', encoding='utf-8') as f:
+                articles = json.load(f)
+            if isinstance(articles, list) and articles:
+                wiki_data[articles[0].get("category", os.path.basename(path)[:-5])] = articles
+
+    os.makedirs(os.path.join(work_dir, "raw_data"), exist_ok=True)
+    with open(os.path.join(work_dir, "raw_data", "all_minecraft_data.json"), 'w', encoding='utf-8') as f:
+        json.dump(wiki_data, f)
+
+def _run_pipeline(pipeline, api_url, examples, seed, work_dir, results, pipeline_kwargs):
+    """Child process: run one pipeline in work_dir and put its client-side metrics on the results queue"""
+    try:
+        results.put(_measure_pipeline(pipeline, api_url, examples, seed, work_dir, pipeline_kwargs))
+    except Exception:
+        results.put({"error": traceback.format_exc()})
+
+def _measure_pipeline(pipeline, api_url, examples, seed, work_dir, pipeline_kwargs):
+    os.environ["LLM_CACHE_MODE"] = "off"  # every example must reach the server
+    os.chdir(work_dir)
+    os.makedirs("training_data", exist_ok=True)
+    sys.path.insert(0, REPO_DIR)
+    import llm_client
+
+    checkpoint = {"seconds": 0.0, "calls": 0, "depth": 0}
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if pipeline == "unified":
+            import unified_dataset
+            unified_dataset.OLLAMA_API = api_url
+            unified_dataset.save_dataset = _timed(unified_dataset.save_dataset, checkpoint)
+            dataset = unified_dataset.create_unified_dataset(num_examples=examples, model="mock", seed=seed,
+                                                             **pipeline_kwargs)
+            accepted = len(dataset or [])
+        else:
+            import command_intent_dataset_generator as generator
+            generator.LLM_API = api_url
+            generator.BOT_COMMANDS_FILE = os.path.join(REPO_DIR, generator.BOT_COMMANDS_FILE)
+            generator.BOT_PROFILE_FILE = os.path.join(REPO_DIR, generator.BOT_PROFILE_FILE)
+            generator.LLM_MODEL = "mock"
+            # Appends only fill a buffer; the disk writes happen in the store's flushes
+            # and in the JSON copy written at the end
+            store_class = generator.JsonlSampleStore
+            for name in ("flush", "close", "materialize_json"):
+                setattr(store_class, name, _timed(getattr(store_class, name), checkpoint))
+            generator.main(max_examples_per_command=examples, **pipeline_kwargs)
+            with open(generator.JSONL_OUTPUT_FILE, 'r', encoding='utf-8') as f:
+                accepted = sum(1 for line in f if line.strip())
+    elapsed = time.perf_counter() - started
+
+    return {
+        "wall_seconds": elapsed,
+        # CPU time of every thread in this process; the mock server runs in the parent
+        "cpu_seconds": time.process_time() - cpu_started,
+        "accepted": accepted,
+        "checkpoint_seconds": checkpoint["seconds"],
+        "checkpoints": checkpoint["calls"],
+        "client": llm_client.get_backend_stats(),
+        # ru_maxrss is in KiB on Linux; the child is spawned fresh, so this is the pipeline's own peak
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def run_benchmark(pipeline, examples, latency, tokens_per_sec, failure_rate, api="ollama", seed=42,
+                  verify_model=None, verify_mode="review", verify_slowdown=1.0, load_time=0.0, max_loaded_models=0,
+                  model_batch_size=10, ramble_rate=0.0, conversations_per_call=None, workers=None, allocation=None):
+    """Run one pipeline end to end against a fresh mock server and return the result record
+
+    verify_model turns on the unified generator's draft/verify cascade; the mock serves
+    that model verify_slowdown times slower than the draft model. load_time and
+    max_loaded_models make the mock load and evict models like Ollama, and
+    model_batch_size sets how many cascade examples are grouped per model (1 = alternate).
+    ramble_rate makes that fraction of mock outputs run on until stopped or cut off.
+    conversations_per_call sets how many command-intent conversations each call asks for
+    and workers how many command-intent calls run at once; allocation picks the
+    command-intent scheduler ("fixed" or "adaptive").
+    """
+    pipeline_kwargs = {}
+    model_slowdown = None
+    if verify_model and pipeline == "unified":
+        pipeline_kwargs = {"verify_model": verify_model, "verify_mode": verify_mode,
+                           "model_batch_size": model_batch_size}
+        model_slowdown = {verify_model: verify_slowdown}
+    if pipeline == "command_intent":
+        pipeline_kwargs = {key: value for key, value in (("conversations_per_call", conversations_per_call),
+                                                         ("workers", workers), ("allocation", allocation)) if value}
+    server, base_url = start_mock_server(latency=latency, tokens_per_sec=tokens_per_sec, seed=seed,
+                                         failure_rate=failure_rate, model_slowdown=model_slowdown,
+                                         load_time=load_time, max_loaded_models=max_loaded_models,
+                                         ramble_rate=ramble_rate)
+    config = server.RequestHandlerClass.config
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"bench_{pipeline}_") as work_dir:
+            if pipeline == "unified":
+                _write_wiki_data(work_dir)
+            child = ctx.Process(target=_run_pipeline,
+                                args=(pipeline, base_url + API_PATHS[api], examples, seed, work_dir, results,
+                                      pipeline_kwargs))
+            child.start()
+            while True:
+                try:
+                    metrics = results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    if not child.is_alive():
+                        metrics = {"error": f"benchmark process exited with code {child.exitcode}"}
+                        break
+            child.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+    if "error" in metrics:
+        raise RuntimeError(f"{pipeline} benchmark failed:\n{metrics['error']}")
+
+    server_stats = config.snapshot()
+    client = metrics.pop("client")
+    accepted = metrics["accepted"]
+    # The pipeline's own CPU time: wall time minus server time doesn't work once calls
+    # overlap, since busy and backoff seconds are summed across the workers
+    overhead = metrics["cpu_seconds"]
+
+    metrics.update({
+        "examples_per_sec": accepted / metrics["wall_seconds"] if metrics["wall_seconds"] else 0.0,
+        "llm_calls": client["calls"],
+        "yield": accepted / client["calls"] if client["calls"] else 0.0,
+        "retries": client["retries"],
+        "failed_calls": client["failed"],
+        "backoff_seconds": client["backoff_seconds"],
+        "server_requests": server_stats["requests"],
+        "injected_failures": server_stats["failures"],
+        "server_seconds": server_stats["busy_seconds"],
+        "decoded_tokens": server_stats["eval_tokens"],
+        "prompt_tokens": server_stats["prompt_tokens"],
+        "p95_generation_seconds": server_stats["p95_generation_seconds"],
+        "model_loads": server_stats["loads"],
+        "load_seconds": server_stats["load_seconds"],
+        "client_overhead_ms": overhead / accepted * 1000 if accepted else None,
+    })
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "pipeline": pipeline,
+        "config": dict({"examples": examples, "latency": latency, "tokens_per_sec": tokens_per_sec,
+                        "failure_rate": failure_rate, "api": api, "seed": seed},
+                       **({"verify_model": verify_model, "verify_mode": verify_mode,
+                           "verify_slowdown": verify_slowdown, "model_batch_size": model_batch_size}
+                          if verify_model and pipeline == "unified" else {}),
+                       **(pipeline_kwargs if pipeline == "command_intent" else {}),
+                       **({"load_time": load_time, "max_loaded_models": max_loaded_models} if load_time else {}),
+                       **({"ramble_rate": ramble_rate} if ramble_rate else {})),
+        "metrics": metrics,
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(path=BENCHMARK_RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_result(record, path=BENCHMARK_RESULTS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+
+def print_result(record, previous=None):
+    m = record["metrics"]
+    c = record["config"]
+    cascade = f", verify {c['verify_model']} ({c['verify_mode']}, {c['verify_slowdown']}x slower)" if c.get("verify_model") else ""
+    print(f"\n{record['pipeline']} ({c['api']}, {c['examples']} examples, latency {c['latency']}s, "
+          f"{c['tokens_per_sec']} tok/s, failure rate {c['failure_rate']:.0%}{cascade})")
+    print(f"  accepted:          {m['accepted']} in {m['wall_seconds']:.2f}s ({m['examples_per_sec']:.2f} examples/s)")
+    print(f"  yield:             {m['yield']:.2f} accepted per LLM call, {m['llm_calls']} calls "
+          f"({m['retries']} retries, {m['failed_calls']} failed, {m['injected_failures']} injected failures)")
+    overhead = m["client_overhead_ms"]
+    print(f"  client overhead:   {overhead:.2f} ms CPU/example" if overhead is not None else "  client overhead:   n/a")
+    print(f"  server time:       {m['server_seconds']:.2f}s, retry backoff {m['backoff_seconds']:.2f}s")
+    if "decoded_tokens" in m:
+        print(f"  decoding:          {m['decoded_tokens']} tokens, p95 generation {m['p95_generation_seconds']:.3f}s")
+    if m.get("prompt_tokens") and m["accepted"]:
+        print(f"  prompt tokens:     {m['prompt_tokens']} ({m['prompt_tokens'] / m['accepted']:.0f} per accepted example)")
+    print(f"  checkpoint I/O:    {m['checkpoint_seconds']:.3f}s over {m['checkpoints']} writes")
+    if c.get("load_time"):
+        print(f"  model loads:       {m['model_loads']} ({m['load_seconds']:.2f}s), "
+              f"max {c['max_loaded_models'] or 'unlimited'} resident")
+    print(f"  peak memory:       {m['peak_rss_mb']:.1f} MB")
+
+    if previous:
+        changes = []
+        for name, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous["metrics"].get(name), m.get(name)
+            if old and new is not None:
+                change = (new - old) / old
+                better = change > 0 if higher_is_better else change < 0
+                changes.append(f"{name} {change:+.1%}{'' if abs(change) < 0.05 else (' (better)' if better else ' (worse)')}")
+        print(f"  vs {previous['timestamp']} ({previous.get('commit') or 'unknown commit'}): " + ", ".join(changes))
+
+def previous_result(history, record):
+    for old in reversed(history):
+        if old["pipeline"] == record["pipeline"] and old["config"] == record["config"]:
+            return old
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dataset generation throughput against a mock LLM server')
+    parser.add_argument('--pipeline', choices=PIPELINES + ["all"], default="all", help='Pipeline to benchmark')
+    parser.add_argument('--examples', type=int, default=100,
+                        help='Unified: examples to generate. Command intent: examples per command')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock server seconds before the first token')
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0, help='Mock server decode rate (0 = instant)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of mock requests that fail with 503')
+    parser.add_argument('--api', choices=sorted(API_PATHS), default="ollama", help='Server API to exercise')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for sampling and the mock server')
+    parser.add_argument('--verify-model', help='Unified only: run the draft/verify cascade with this verify model')
+    parser.add_argument('--verify-mode', choices=["review", "rewrite"], default="review", help='Cascade verify mode')
+    parser.add_argument('--verify-slowdown', type=float, default=4.0,
+                        help='How many times slower the mock serves the verify model')
+    parser.add_argument('--load-time', type=float, default=0.0,
+                        help='Mock server seconds to load a model that is not resident (0 = always resident)')
+    parser.add_argument('--max-loaded-models', type=int, default=0,
+                        help='Models the mock holds at once before evicting (0 = unlimited)')
+    parser.add_argument('--model-batch-size', type=int, default=10,
+                        help='Cascade examples drafted before switching to the verify model (1 = alternate)')
+    parser.add_argument('--ramble-rate', type=float, default=0.0,
+                        help='Fraction of mock outputs that run on past the answer')
+    parser.add_argument('--conversations-per-call', type=int,
+                        help='Command intent only: conversations requested per LLM call')
+    parser.add_argument('--workers', type=int, help='Command intent only: LLM calls in flight at once')
+    parser.add_argument('--allocation', choices=["fixed", "adaptive"],
+                        help='Command intent only: how the LLM budget is split between commands')
+    parser.add_argument('--results', default=BENCHMARK_RESULTS_FILE, help='JSONL file results are appended to')
+    parser.add_argument('--no-save', action='store_true', help="Don't record this run")
+    parser.add_argument('--history', action='store_true', help='Print saved results and exit')
+    args = parser.parse_args()
+
+    history = load_results(args.results)
+    if args.history:
+        for i, record in enumerate(history):
+            print_result(record, previous_result(history[:i], record))
+        return
+
+    pipelines = PIPELINES if args.pipeline == "all" else [args.pipeline]
+    for pipeline in pipelines:
+        record = run_benchmark(pipeline, args.examples, args.latency, args.tokens_per_sec,
+                               args.failure_rate, api=args.api, seed=args.seed, verify_model=args.verify_model,
+                               verify_mode=args.verify_mode, verify_slowdown=args.verify_slowdown,
+                               load_time=args.load_time, max_loaded_models=args.max_loaded_models,
+                               model_batch_size=args.model_batch_size, ramble_rate=args.ramble_rate,
+                               conversations_per_call=args.conversations_per_call, workers=args.workers,
+                               allocation=args.allocation)
+        print_result(record, previous_result(history, record))
+        if not args.no_save:
+            save_result(record, args.results)
+            history.append(record)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
+import argparse
 import json
+import math
 import os
 import random
 import re
-import requests
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from tqdm import tqdm
+import llm_client
+from llm_backends import POOL_SIZE
+from llm_cache import get_llm_cache
+from model_residency import get_residency, print_residency_stats
+from command_validation import get_validator
+from generation_telemetry import ACCEPTED, TelemetryLog, telemetry_path
+from near_duplicates import NearDuplicateIndex, char_shingles
+from sample_store import JsonlSampleStore
 
-# Initialize LLM API endpoint
-LLM_API = "http://localhost:11434/api/generate"
+# Initialize LLM API endpoint (any /api/generate or OpenAI-compatible /v1 URL works)
+LLM_API = os.environ.get("LLM_API", "http://localhost:11434/api/generate")
 LLM_MODEL = "llama3.2"  # Update this with your preferred model
 
 # Constants
@@ -17,6 +28,55 @@ OUTPUT_FILE = os.path.join(OUTPUT_DIR, "minecraft_command_intent_dataset.json")
 JSONL_OUTPUT_FILE = os.path.join(OUTPUT_DIR, "minecraft_command_intent_dataset.jsonl")
 BOT_COMMANDS_FILE = "bot-commands-summary.md"
 BOT_PROFILE_FILE = "minecraft-finetune-bot-framework/profiles/defaults/_default.json"
+COMMAND_PROGRESS_FILE = os.path.join(OUTPUT_DIR, "command_intent_progress.json")
+
+# LLM calls in flight across all commands; the client's adaptive concurrency limit
+# keeps the server from being overloaded if this is more than it can serve
+WORKERS = POOL_SIZE
+# Completed calls between checkpoints of the dataset and the per-command progress
+CHECKPOINT_EVERY = 10
+# Calls in a row that may fail (no response: errors, open circuit breaker) before the
+# run stops; failed calls are retried and don't use up any quota
+MAX_CONSECUTIVE_FAILURES = 20
+
+# Adaptive allocation (AdaptiveCommandScheduler): the same total budget as the fixed
+# quota, spent on whichever commands are currently yielding the most new samples
+ALLOCATION = "adaptive"
+MIN_CALLS_PER_COMMAND = 2     # calls every command gets before it can be retired
+MIN_YIELD = 0.15              # saved samples per requested conversation worth paying for
+YIELD_DECAY = 0.6             # weight of earlier calls in a command's recent yield
+EXPLORATION = 0.3             # UCB bonus for commands with few calls so far
+MAX_QUOTA_MULTIPLE = 3        # no command gets more than this many times the fixed quota
+
+# One USER/THINKING/BOT conversation is ~150 tokens (the prompt caps the player and bot
+# lines at 20 and 15 words); stop if the model starts a second one
+OUTPUT_BUDGET = 320
+STOP_SEQUENCES = ["\n\nUSER:"]
+
+# Conversations requested per LLM call; the prompt prefill is shared between them
+CONVERSATIONS_PER_CALL = 5
+
+# Samples per LLM call in batched mode
+BATCH_STATS = {"calls": 0, "requested": 0, "parsed": 0, "accepted": 0}
+
+def batch_stop_sequences(num_conversations):
+    """Stop where the model would start one conversation more than was asked for"""
+    if num_conversations <= 1:
+        return STOP_SEQUENCES
+    return [f"CONVERSATION {num_conversations + 1}:"]
+
+def record_batch(requested, parsed, accepted):
+    BATCH_STATS["calls"] += 1
+    BATCH_STATS["requested"] += requested
+    BATCH_STATS["parsed"] += parsed
+    BATCH_STATS["accepted"] += accepted
+
+def print_batch_stats():
+    s = BATCH_STATS
+    if not s["calls"]:
+        return
+    print(f"Yield: {s['accepted'] / s['calls']:.2f} accepted samples per LLM call ({s['accepted']} from "
+          f"{s['calls']} calls), {s['parsed']}/{s['requested']} requested conversations parsed")
 
 # Configuration for commands to ignore
 # Same as COMMAND_CATEGORIES but normal capitalised words - TODO fix
@@ -39,55 +99,16 @@ COMMAND_CATEGORIES = {
     "communication": ["startConversation", "endConversation"]
 }
 
-def llm_generate(prompt, model=LLM_MODEL, temp=0.7, max_tokens=2048):
-    """Generate text using local LLM API with streaming"""
-    try:
-        # Use streaming to handle the response properly
-        response = requests.post(
-            LLM_API,
-            json={
-                "model": model,
-                "prompt": prompt,
-                "temperature": temp,
-                "max_tokens": max_tokens,
-                "options": {
-                    "num_ctx": 50000  # Set the context window size
-                },
-                "stream": True  # Enable streaming to read line by line
-            },
-            stream=True,  # Enable HTTP streaming
-            timeout=120
-        )
-        
-        # Check response
-        if response.status_code != 200:
-            print(f"Error: Received status code {response.status_code}")
-            return ""
-        
-        # Read the streaming response line by line
-        full_response = ""
-        for line in response.iter_lines():
-            if not line:
-                continue
-            
-            try:
-                # Parse JSON from the line
-                line_json = json.loads(line.decode('utf-8'))
-                
-                # Extract response portion and append
-                if 'response' in line_json:
-                    full_response += line_json['response']
-                
-                # Check if done
-                if line_json.get('done', False):
-                    break
-            except json.JSONDecodeError:
-                print(f"Error decoding JSON from line: {line.decode('utf-8')[:100]}")
-        
-        return full_response
-    except Exception as e:
-        print(f"Error generating from LLM: {e}")
-        return ""
+def llm_generate(prompt, model=LLM_MODEL, temp=0.7, max_tokens=2048, seed=None, telemetry=None, stop=None):
+    """Generate text using local LLM API with streaming (served from the shared LLM cache when possible)"""
+    options = {
+        "num_ctx": 50000  # Set the context window size
+    }
+    if stop:
+        options["stop"] = stop
+    response = llm_client.generate(LLM_API, model, prompt, temperature=temp, max_tokens=max_tokens,
+                                   options=options, seed=seed, stream=True, telemetry=telemetry)
+    return response or ""
 
 def load_bot_commands():
     """Parse the bot-commands-summary.md file to extract command information"""
@@ -184,8 +205,12 @@ def extract_command_examples_from_profile(conversation_examples, cmd_name=None):
     
     return command_examples
 
-def generate_command_intent_prompt(bot_name, cmd_name, cmd_info, examples):
-    """Generate a prompt for creating user-bot conversations for a specific command"""
+def generate_command_intent_prompt(bot_name, cmd_name, cmd_info, examples, num_conversations=1):
+    """Generate a prompt for creating user-bot conversations for a specific command
+
+    With num_conversations > 1 the model is asked for that many diverse conversations,
+    each under a "CONVERSATION n:" header (see parse_generated_conversations).
+    """
     
     # Format examples for the prompt
     example_text = ""
@@ -221,8 +246,29 @@ BOT: Sure thing! !{cmd_name}({param_str})
     for param_name, param_info in cmd_info["params"].items():
         params_text += f"- {param_name}: {param_info['description']}\n"
     
+    if num_conversations > 1:
+        request = f"Generate {num_conversations} realistic, diverse conversations"
+        output_format = f"""FORMAT THE RESPONSE EXACTLY LIKE THIS, numbering the conversations from 1 to {num_conversations}:
+CONVERSATION 1:
+USER: [Player message - very brief, 5-20 words maximum]
+THINKING: [Bot analyzes user intent and explains why !{cmd_name} is the right command]
+BOT: [Bot response with !{cmd_name} command - concise, under 15 words]
+
+CONVERSATION 2:
+..."""
+        diversity = f"""
+6. Every conversation must be different: a different situation, wording and request style, and different parameter values where the command takes any
+7. Write exactly {num_conversations} conversations and nothing after the last one"""
+    else:
+        request = "Generate 1 realistic conversation"
+        output_format = f"""FORMAT THE RESPONSE EXACTLY LIKE THIS:
+USER: [Player message - very brief, 5-20 words maximum]
+THINKING: [Bot analyzes user intent and explains why !{cmd_name} is the right command]
+BOT: [Bot response with !{cmd_name} command - concise, under 15 words]"""
+        diversity = ""
+    
     # Build the prompt
-    prompt = f"""Generate 1 realistic conversation between a Minecraft player and the bot named {bot_name}, focusing specifically on the !{cmd_name} command.
+    prompt = f"""{request} between a Minecraft player and the bot named {bot_name}, focusing specifically on the !{cmd_name} command.
 
 COMMAND INFORMATION:
 Command: !{cmd_name}
@@ -233,10 +279,7 @@ Parameters:
 BOT PERSONALITY:
 {bot_name} is a playful Minecraft bot that acts like a typical Minecraft player rather than an AI. The bot is friendly but slightly aloof and always to-the-point with brief responses (under 15 words).
 
-FORMAT THE RESPONSE EXACTLY LIKE THIS:
-USER: [Player message - very brief, 5-20 words maximum]
-THINKING: [Bot analyzes user intent and explains why !{cmd_name} is the right command]
-BOT: [Bot response with !{cmd_name} command - concise, under 15 words]
+{output_format}
 
 EXAMPLES OF CORRECT FORMAT:
 {example_text}
@@ -246,7 +289,7 @@ GUIDELINES:
 2. The thinking section should analyze the actual intent behind the user's message
 3. The bot response must include the !{cmd_name} command with appropriate parameters
 4. Vary the player's request style (direct, indirect, question, statement)
-5. The bot's response should solve the player's actual need
+5. The bot's response should solve the player's actual need{diversity}
 """
     return prompt
 
@@ -270,6 +313,26 @@ def parse_generated_conversation(text):
         return conversation
     return None
 
+def parse_generated_conversations(text, num_conversations=1):
+    """Parse every conversation out of a (possibly batched) generation
+
+    Batched outputs are split on their "CONVERSATION n:" headers, or on each "USER:"
+    line if the model left the headers out; at most num_conversations are returned.
+    """
+    if num_conversations <= 1:
+        conversation = parse_generated_conversation(text)
+        return [conversation] if conversation else []
+    
+    chunks = re.split(r'^\s*\**CONVERSATION\s+\d+\**:?\**\s*$', text, flags=re.MULTILINE | re.IGNORECASE)
+    if len(chunks) == 1:
+        chunks = re.split(r'^(?=\s*USER:)', text, flags=re.MULTILINE)
+    conversations = []
+    for chunk in chunks:
+        conversation = parse_generated_conversation(chunk)
+        if conversation:
+            conversations.append(conversation)
+    return conversations[:num_conversations]
+
 def identify_command_in_response(response, cmd_name):
     """Identify if the specified command is used in the bot's response"""
     pattern = r'!' + re.escape(cmd_name) + r'(?:\(([^)]*)\))?'
@@ -278,60 +341,9 @@ def identify_command_in_response(response, cmd_name):
         return match.group(0)
     return None
 
-def save_single_sample(sample, json_file, jsonl_file):
-    """Save a single sample to both JSON and JSONL formats immediately"""
-    # Make sure the output directory exists
-    os.makedirs(os.path.dirname(json_file), exist_ok=True)
-    
-    print(f"DEBUG: Saving to JSON file: {json_file}")
-    print(f"DEBUG: Saving to JSONL file: {jsonl_file}")
-    
-    # For JSONL, we can directly append
-    with open(jsonl_file, 'a', encoding='utf-8') as f:
-        # Create a copy of the sample to modify for JSONL format
-        jsonl_sample = sample.copy()
-        
-        # If there's a thinking key, incorporate it into the output for JSONL format
-        if "thinking" in jsonl_sample:
-            thinking = jsonl_sample.pop("thinking")
-            # Check if we're dealing with a raw conversation or a formatted sample
-            if "bot" in jsonl_sample:
-                jsonl_sample["bot"] = f"<thinking>\n{thinking}\n</thinking>\n\n{jsonl_sample['bot']}"
-            elif "output" in jsonl_sample:
-                jsonl_sample["output"] = f"<thinking>\n{thinking}\n</thinking>\n\n{jsonl_sample['output']}"
-        
-        f.write(json.dumps(jsonl_sample) + '\n')
-    
-    # For JSON, we need to load, append, and save
-    try:
-        # Read the current JSON file
-        with open(json_file, 'r', encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-                print(f"DEBUG: Loaded {len(data)} existing samples from JSON file")
-            except json.JSONDecodeError:
-                # If the file is empty or invalid, start with an empty list
-                data = []
-                print(f"DEBUG: JSON file was empty or invalid, starting with empty list")
-        
-        # Append the new sample
-        data.append(sample)
-        
-        # Write back to the file
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-        
-        print(f"DEBUG: Saved new sample to {json_file} and {jsonl_file}")
-        print(f"DEBUG: JSON file now has {len(data)} samples")
-        
-        # Verify the file was updated
-        if os.path.exists(json_file):
-            print(f"DEBUG: JSON file exists and is {os.path.getsize(json_file)} bytes")
-        else:
-            print(f"DEBUG: JSON file does not exist after save!")
-            
-    except Exception as e:
-        print(f"ERROR updating JSON file: {e}")
+def save_single_sample(sample, store):
+    """Append a single sample to the JSONL store (buffered; the JSON copy is written at the end of the run)"""
+    store.append(sample)
 
 def format_as_training_samples(conversations):
     """Format conversations as training samples with thinking steps as a separate key"""
@@ -354,84 +366,385 @@ def format_as_training_samples(conversations):
     
     return samples
 
-def generate_examples_for_command(bot_name, cmd_name, cmd_info, examples_from_profile, max_examples=20, 
-                                  json_file=None, jsonl_file=None, existing_inputs=None):
-    """Generate examples for a single command"""
-    print(f"Generating examples for {cmd_name}...")
-    
-    # Get existing examples for this command
-    cmd_examples = [ex for ex in examples_from_profile if ex.get("command") == cmd_name]
+def accept_conversation(conversation, cmd_name, category, store=None, dedup_index=None):
+    """Validate one parsed conversation and save it; returns (outcome, saved)"""
+    # Verify the command is in the response
+    cmd_text = identify_command_in_response(conversation["bot"], cmd_name)
+    if not cmd_text:
+        print(f"  Command {cmd_name} not found in response, skipping")
+        return "command_missing", False
+    
+    # The call must also parse and match the command's parameter types
+    is_valid, message = get_validator().validate(conversation["bot"], cmd_name)
+    if not is_valid:
+        print(f"  Invalid {cmd_name} call ({message}), skipping")
+        return "invalid_call", False
+    
+    conversation["command"] = cmd_name
+    conversation["command_text"] = cmd_text
+    conversation["category"] = category
+    
+    # Format and save this example immediately if requested
+    if store is not None:
+        # Format as training sample
+        sample = {
+            "instruction": conversation["user"],
+            "input": "",
+            "output": conversation["bot"],
+            "thinking": conversation["thinking"],
+            "conversation_type": category or "general_conversation",
+            "command_used": cmd_name
+        }
+        
+        duplicate = "exact duplicate" if sample["instruction"] in store else None
+        if not duplicate and dedup_index is not None:
+            duplicate = dedup_index.check_and_add(sample)
+        
+        if duplicate:
+            print(f"  Duplicate sample found ({duplicate}), skipping")
+            return "duplicate", False
+        
+        # Save immediately
+        save_single_sample(sample, store)
     
-    # Find which category this command belongs to
-    category = None
+    print(f"  Generated valid example for {cmd_name}")
+    return ACCEPTED, store is not None
+
+def command_category(cmd_name):
+    """Which COMMAND_CATEGORIES entry a command belongs to (None if it isn't listed)"""
     for cat, cmds in COMMAND_CATEGORIES.items():
         if cmd_name in cmds:
-            category = cat
-            break
+            return cat
+    return None
+
+def request_conversations(bot_name, cmd_name, cmd_info, cmd_examples, num_conversations, call_index):
+    """One LLM call for num_conversations conversations about cmd_name; returns (call, response, conversations)
+
+    Only talks to the LLM, so it is safe to run from worker threads; validating and
+    saving the conversations is left to save_conversations.
+    """
+    prompt = generate_command_intent_prompt(bot_name, cmd_name, cmd_info, cmd_examples,
+                                            num_conversations=num_conversations)
+    
+    # The prompt is identical for every attempt, so the attempt index is the seed
+    # that keeps attempts distinct in the response cache
+    call = {"command": cmd_name, "category": command_category(cmd_name), "outcome": "no_response",
+            "requested": num_conversations}
+    budget = OUTPUT_BUDGET * num_conversations
+    response = llm_generate(prompt, temp=0.75, max_tokens=budget, seed=call_index, telemetry=call,
+                            stop=batch_stop_sequences(num_conversations))
+    
+    conversations = parse_generated_conversations(response, num_conversations) if response else []
+    if conversations and call.get("done_reason") == "length" and response.rstrip().endswith(conversations[-1]["bot"]):
+        # Only the conversation being written when the budget ran out is incomplete, and
+        # only if it got as far as its BOT line (otherwise it did not parse at all)
+        print(f"  Generation for {cmd_name} hit the {budget} token budget, dropping the last conversation")
+        conversations = conversations[:-1]
+    return call, response, conversations
+
+def save_conversations(call, response, conversations, store=None, dedup_index=None, telemetry_log=None):
+    """Validate, deduplicate and save the conversations from one call; returns (accepted, saved)"""
+    cmd_name = call["command"]
+    outcomes = {}
+    accepted_conversations = []
+    saved = 0
+    for conversation in conversations:
+        outcome, was_saved = accept_conversation(conversation, cmd_name, call["category"], store, dedup_index)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome == ACCEPTED:
+            accepted_conversations.append(conversation)
+        saved += was_saved
+    
+    accepted = len(accepted_conversations)
+    record_batch(call["requested"], len(conversations), accepted)
+    if accepted:
+        call["outcome"] = ACCEPTED
+    elif outcomes:
+        call["outcome"] = max(outcomes, key=outcomes.get)
+    elif response:
+        call["outcome"] = "truncated" if call.get("done_reason") == "length" else "parse_failure"
+        print(f"  Could not parse conversation for {cmd_name}")
+    else:
+        print(f"  No response generated for {cmd_name}")
+    call.update(parsed=len(conversations), accepted_samples=accepted, sample_outcomes=outcomes)
     
-    cmd_conversations = []  # Keep track of conversations for this command
+    if telemetry_log is not None:
+        telemetry_log.record(call)
+    return accepted_conversations, saved
+
+class CommandScheduler:
+    """Round-robin LLM calls over commands, each with a quota of requested conversations.
+
+    next_call() hands out the next call from the command after the last one served,
+    so every command advances at the same rate however many workers are pulling calls.
+    Per-command progress (conversations requested and saved, next seed) is written to
+    state_path by save(), and a rerun only requests what is left of each quota. A call
+    that got no response is retried and doesn't count against the quota; after
+    MAX_CONSECUTIVE_FAILURES of them in a row no more calls are handed out.
+    """
+
+    def __init__(self, commands, quota, conversations_per_call=CONVERSATIONS_PER_CALL,
+                 state_path=COMMAND_PROGRESS_FILE, restart=False):
+        self.quota = quota
+        self.conversations_per_call = conversations_per_call
+        self.state_path = state_path
+        self.progress = self._load_state()
+        if restart:
+            # Only the counters start over: reusing seeds would replay cached responses,
+            # which are all duplicates of samples from the earlier run
+            self.progress = {cmd_name: {"next_seed": progress.get("next_seed", 0)}
+                             for cmd_name, progress in self.progress.items()}
+        for cmd_name in commands:
+            progress = self.progress.setdefault(cmd_name, {})
+            for key in ("requested", "saved", "next_seed", "calls", "duplicates", "invalid"):
+                progress.setdefault(key, 0)
+        self.in_flight = {cmd_name: 0 for cmd_name in commands}
+        self.next_seed = {cmd_name: self.progress[cmd_name]["next_seed"] for cmd_name in commands}
+        self._order = deque(commands)
+        self.failed_calls = 0
+        self.consecutive_failures = 0
+    
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("commands", {})
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Error loading command progress {self.state_path}, starting over: {e}")
+            return {}
+    
+    def remaining(self, cmd_name):
+        return max(0, self.quota - self.progress[cmd_name]["requested"] - self.in_flight[cmd_name])
+    
+    def total_remaining(self):
+        return sum(self.remaining(cmd_name) for cmd_name in self._order)
+    
+    def next_call(self):
+        """(command, conversations, seed) for the next call, or None once every quota is handed out"""
+        if self.stalled():
+            return None
+        for _ in range(len(self._order)):
+            cmd_name = self._order[0]
+            self._order.rotate(-1)
+            remaining = self.remaining(cmd_name)
+            if remaining:
+                k = min(self.conversations_per_call, remaining)
+                seed = self.next_seed[cmd_name]
+                self.next_seed[cmd_name] += 1
+                self.in_flight[cmd_name] += k
+                return cmd_name, k, seed
+        return None
+    
+    def stalled(self):
+        """True once MAX_CONSECUTIVE_FAILURES calls in a row got no response"""
+        return self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES
+    
+    def complete(self, cmd_name, k, seed, saved, outcomes=None, failed=False):
+        """Record a finished call; outcomes is the call's sample outcome counts
+
+        failed=True means the call got no response at all: its conversations go back to
+        the command's quota rather than being counted as requested.
+        """
+        self.in_flight[cmd_name] -= k
+        if failed:
+            self.failed_calls += 1
+            self.consecutive_failures += 1
+            return
+        self.consecutive_failures = 0
+        outcomes = outcomes or {}
+        progress = self.progress[cmd_name]
+        progress["requested"] += k
+        progress["saved"] += saved
+        progress["calls"] += 1
+        progress["duplicates"] += outcomes.get("duplicate", 0)
+        # Conversations that didn't parse count as invalid, like the ones validation rejected
+        rejected = sum(n for outcome, n in outcomes.items() if outcome not in (ACCEPTED, "duplicate"))
+        progress["invalid"] += k - sum(outcomes.values()) + rejected
+        # Seeds of calls still in flight when a run stops are skipped on resume
+        progress["next_seed"] = max(progress["next_seed"], seed + 1)
+    
+    def save(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"quota": self.quota, "commands": self.progress}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+    
+    def print_stats(self):
+        if self.failed_calls:
+            print(f"  {self.failed_calls} calls got no response and were retried")
+        if self.stalled():
+            print(f"  Stopped after {self.consecutive_failures} failed calls in a row; rerun to continue")
+        for cmd_name in self._order:
+            progress = self.progress[cmd_name]
+            requested = progress["requested"]
+            rates = (f" ({progress['duplicates'] / requested:.0%} duplicates, {progress['invalid'] / requested:.0%} invalid)"
+                     if requested else "")
+            status = f", retired: {progress['retired']}" if progress.get("retired") else ""
+            print(f"  {cmd_name}: {progress['saved']} samples saved from {requested} requested{rates}{status}")
+
+class AdaptiveCommandScheduler(CommandScheduler):
+    """Spends the fixed scheduler's total budget where it buys the most new samples.
+
+    Every command starts with MIN_CALLS_PER_COMMAND calls. After that each call goes to
+    the command with the highest marginal value: its recent yield (saved samples per
+    requested conversation, with earlier calls decayed by YIELD_DECAY so saturation
+    shows up quickly) times a coverage weight that favours commands with fewer samples,
+    plus a UCB exploration bonus. Commands whose responses keep failing to parse or
+    validate, or only produce duplicates any more, fall below MIN_YIELD and are retired,
+    and the run stops early once every command is retired. Calls that got no response
+    don't count towards the yield, so an outage can't retire anything. Decisions only
+    depend on completed calls, so the allocation is the same on every rerun of a
+    cached run.
+    """
+
+    def __init__(self, commands, quota, conversations_per_call=CONVERSATIONS_PER_CALL,
+                 state_path=COMMAND_PROGRESS_FILE, restart=False):
+        super().__init__(commands, quota, conversations_per_call, state_path, restart)
+        self.budget = quota * len(self._order)
+        self.calls_in_flight = {cmd_name: 0 for cmd_name in commands}
+        for cmd_name in commands:
+            progress = self.progress[cmd_name]
+            progress.setdefault("recent_requested", 0.0)
+            progress.setdefault("recent_saved", 0.0)
+            progress.setdefault("retired", None)
+    
+    def remaining(self, cmd_name):
+        progress = self.progress[cmd_name]
+        if progress["retired"]:
+            return 0
+        cap = self.quota * MAX_QUOTA_MULTIPLE - progress["requested"] - self.in_flight[cmd_name]
+        return max(0, min(cap, self.budget_left()))
+    
+    def budget_left(self):
+        spent = sum(self.progress[cmd_name]["requested"] for cmd_name in self._order)
+        return max(0, self.budget - spent - sum(self.in_flight.values()))
+    
+    def total_remaining(self):
+        return min(self.budget_left(), super().total_remaining())
+    
+    def recent_yield(self, cmd_name):
+        """Decayed saved/requested, starting from one saved sample in two requested"""
+        progress = self.progress[cmd_name]
+        return (progress["recent_saved"] + 1) / (progress["recent_requested"] + 2)
+    
+    def marginal_value(self, cmd_name):
+        coverage = self.progress[cmd_name]["saved"] / max(1, self.quota)
+        return self.recent_yield(cmd_name) / math.sqrt(1 + coverage)
+    
+    def score(self, cmd_name, total_calls):
+        calls = self.progress[cmd_name]["calls"] + self.calls_in_flight[cmd_name]
+        return self.marginal_value(cmd_name) + EXPLORATION * math.sqrt(math.log(total_calls + 1) / (calls + 1))
+    
+    def next_call(self):
+        if self.stalled():
+            return None
+        candidates = [cmd_name for cmd_name in self._order if self.remaining(cmd_name)]
+        if not candidates:
+            return None
+        # Commands still in their first calls go first, in round-robin order
+        unexplored = [cmd_name for cmd_name in candidates
+                      if self.progress[cmd_name]["calls"] + self.calls_in_flight[cmd_name] < MIN_CALLS_PER_COMMAND]
+        if unexplored:
+            cmd_name = unexplored[0]
+            self._order.remove(cmd_name)
+            self._order.append(cmd_name)
+        else:
+            total_calls = sum(self.progress[c]["calls"] for c in self._order) + sum(self.calls_in_flight.values())
+            cmd_name = max(candidates, key=lambda c: self.score(c, total_calls))
+        k = min(self.conversations_per_call, self.remaining(cmd_name))
+        seed = self.next_seed[cmd_name]
+        self.next_seed[cmd_name] += 1
+        self.in_flight[cmd_name] += k
+        self.calls_in_flight[cmd_name] += 1
+        return cmd_name, k, seed
+    
+    def complete(self, cmd_name, k, seed, saved, outcomes=None, failed=False):
+        super().complete(cmd_name, k, seed, saved, outcomes, failed)
+        self.calls_in_flight[cmd_name] -= 1
+        if failed:
+            # An outage says nothing about the command, so only responses move its yield
+            return
+        progress = self.progress[cmd_name]
+        progress["recent_requested"] = progress["recent_requested"] * YIELD_DECAY + k
+        progress["recent_saved"] = progress["recent_saved"] * YIELD_DECAY + saved
+        if progress["calls"] >= MIN_CALLS_PER_COMMAND and self.recent_yield(cmd_name) < MIN_YIELD:
+            progress["retired"] = f"yield {self.recent_yield(cmd_name):.2f}"
+    
+    def print_stats(self):
+        retired = sum(1 for cmd_name in self._order if self.progress[cmd_name]["retired"])
+        print(f"Adaptive allocation: {self.budget - self.budget_left()}/{self.budget} conversations requested, "
+              f"{retired}/{len(self._order)} commands retired")
+        super().print_stats()
+
+def generate_all_commands(bot_name, commands, examples_from_profile, scheduler, store, dedup_index=None,
+                          telemetry_log=None, workers=WORKERS):
+    """Run the scheduler's calls on a pool of worker threads; returns the number of samples saved
+
+    Workers only make LLM calls. This thread is the single writer: it validates,
+    deduplicates and appends every result to the store, and checkpoints the scheduler
+    after each flush so the progress file never claims more than is on disk.
+    """
+    cmd_examples = {cmd_name: [ex for ex in examples_from_profile if ex.get("command") == cmd_name]
+                    for cmd_name in commands}
     total_saved = 0
+    completed = 0
     
-    # Generate examples for this command
-    for i in range(max_examples):
-        print(f"  Generating example {i+1} of {max_examples}...")
+    with ThreadPoolExecutor(max_workers=workers) as pool, tqdm(total=scheduler.total_remaining()) as bar:
+        pending = {}
         
-        # Create the prompt
-        prompt = generate_command_intent_prompt(bot_name, cmd_name, cmd_info, cmd_examples)
+        def submit_next():
+            task = scheduler.next_call()
+            if task is None:
+                return False
+            cmd_name, k, seed = task
+            future = pool.submit(request_conversations, bot_name, cmd_name, commands[cmd_name],
+                                 cmd_examples[cmd_name], k, seed)
+            pending[future] = task
+            return True
         
-        # Generate the conversation
-        response = llm_generate(prompt, temp=0.75, max_tokens=1024)
+        # Keep exactly `workers` calls queued so the scheduler, not the pool, decides the order
+        while len(pending) < workers and submit_next():
+            pass
         
-        if response:
-            # Parse the conversation
-            conversation = parse_generated_conversation(response)
-            
-            if conversation:
-                # Verify the command is in the response
-                cmd_text = identify_command_in_response(conversation["bot"], cmd_name)
-                
-                if cmd_text:
-                    conversation["command"] = cmd_name
-                    conversation["command_text"] = cmd_text
-                    conversation["category"] = category
-                    cmd_conversations.append(conversation)
-                    
-                    # Format and save this example immediately if requested
-                    if json_file and jsonl_file and existing_inputs is not None:
-                        # Format as training sample
-                        sample = {
-                            "instruction": conversation["user"],
-                            "input": "",
-                            "output": conversation["bot"],
-                            "thinking": conversation["thinking"],
-                            "conversation_type": category or "general_conversation",
-                            "command_used": cmd_name
-                        }
-                        
-                        sample_input = sample.get("instruction", "")
-                        print(f"DEBUG: Generated sample with instruction: {sample_input[:50]}...")
-                        
-                        if sample_input not in existing_inputs:
-                            # Save immediately
-                            save_single_sample(sample, json_file, jsonl_file)
-                            existing_inputs.add(sample_input)
-                            total_saved += 1
-                            print(f"  Saved new example #{total_saved} for {cmd_name}")
-                        else:
-                            print(f"  Duplicate sample found, skipping")
-                    
-                    print(f"  Generated valid example for {cmd_name}")
-                else:
-                    print(f"  Command {cmd_name} not found in response, skipping")
-            else:
-                print(f"  Could not parse conversation for {cmd_name}")
-        else:
-            print(f"  No response generated for {cmd_name}")
-    
-    return cmd_conversations, total_saved
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                cmd_name, k, seed = pending.pop(future)
+                call, response, conversations = future.result()
+                _, saved = save_conversations(call, response, conversations, store, dedup_index, telemetry_log)
+                scheduler.complete(cmd_name, k, seed, saved, call.get("sample_outcomes"), failed=not response)
+                total_saved += saved
+                completed += 1
+                # A failed call's conversations went back to the quota
+                done_k = k if response else 0
+                bar.total = bar.n + done_k + scheduler.total_remaining() + sum(task[1] for task in pending.values())
+                bar.update(done_k)
+                if completed % CHECKPOINT_EVERY == 0:
+                    store.flush()
+                    if telemetry_log is not None:
+                        telemetry_log.flush()
+                    scheduler.save()
+                submit_next()
+    
+    store.flush()
+    scheduler.save()
+    return total_saved
 
-def main():
-    """Main function to generate the dataset"""
+def main(max_examples_per_command=20, conversations_per_call=CONVERSATIONS_PER_CALL, workers=WORKERS,
+         restart=False, allocation=ALLOCATION):
+    """Main function to generate the dataset
+
+    The run requests max_examples_per_command conversations per command in total across
+    runs: an interrupted run picks up where it stopped, and raising the quota adds to
+    the budget. allocation="fixed" gives every command exactly that many; "adaptive"
+    moves the budget to the commands yielding the most new samples and stops early
+    when none are worth more calls. restart=True resets the saved quota counters (but
+    not the seeds, so no cached response is replayed).
+    """
     print("Generating command intent dataset...")
     
     # Make sure the output directory exists
@@ -444,75 +757,68 @@ def main():
     # Load commands
     print("Loading bot commands...")
     commands = load_bot_commands()
+    validator = get_validator(commands)
     
     # Load profile
     print("Loading bot profile...")
     profile_data = load_bot_profile()
     
-    # Load existing dataset from JSON if it exists
-    existing_samples = []
-    existing_inputs = set()
-    
-    if os.path.exists(OUTPUT_FILE):
-        print(f"Loading existing dataset from {OUTPUT_FILE}...")
-        try:
-            with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
-                existing_samples = json.load(f)
-            print(f"Loaded {len(existing_samples)} existing samples from JSON.")
-            
-            # Create a set of existing inputs to check for duplicates
-            for sample in existing_samples:
-                existing_inputs.add(sample.get("input", ""))
-                
-        except json.JSONDecodeError:
-            print(f"Error loading {OUTPUT_FILE}, starting with empty dataset.")
-    else:
-        print(f"DEBUG: Output file {OUTPUT_FILE} does not exist yet.")
+    # The JSONL file is the dataset; its sidecar index gives the existing instructions
+    # without parsing it (the JSON copy is rewritten once, at the end of the run)
+    store = JsonlSampleStore(JSONL_OUTPUT_FILE, json_path=OUTPUT_FILE)
+    print(f"Loaded {len(store)} existing samples from {store.index_path}")
+    # Bot replies are near-identical by design, so only the player's wording is compared
+    dedup_index = NearDuplicateIndex(fields={"instruction": (0.7, char_shingles)})
+    dedup_index.load_examples({"instruction": instruction} for instruction in store.instructions)
     
     # Extract command examples from profile
     print("Extracting command examples from profile...")
     examples_from_profile = extract_command_examples_from_profile(profile_data["conversation_examples"])
     
-    # Make sure the output files exist and are properly initialized
-    if not os.path.exists(OUTPUT_FILE):
-        print(f"DEBUG: Creating empty JSON file at {OUTPUT_FILE}")
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-    
-    if not os.path.exists(JSONL_OUTPUT_FILE):
-        print(f"DEBUG: Creating empty JSONL file at {JSONL_OUTPUT_FILE}")
-        open(JSONL_OUTPUT_FILE, 'w').close()
-    
-    # Generate examples for each command
+    # Generate examples for every command at once, round-robin between commands
     print("Generating examples for commands...")
-    total_new_samples = 0
+    telemetry_log = TelemetryLog(telemetry_path(OUTPUT_FILE))
+    # Load the model up front so the first command doesn't absorb the load stall
+    get_residency(LLM_API).warm(LLM_MODEL)
     
-    # Process each command
+    selected = {}
     for cmd_name, cmd_info in commands.items():
-        print(f"Processing command: {cmd_name}")
-        print(cmd_info)
-        print(IGNORE_COMMANDS.get(cmd_info["category"], []))
         if cmd_name in IGNORE_COMMANDS.get(cmd_info["category"], []):
             print(f"Skipping command {cmd_name} as it is in the ignore list")
             continue
-        
-        # Generate conversations for this command and save them immediately
-        _, cmd_saved = generate_examples_for_command(
-            profile_data["name"], 
-            cmd_name, 
-            cmd_info, 
-            examples_from_profile,
-            json_file=OUTPUT_FILE,
-            jsonl_file=JSONL_OUTPUT_FILE,
-            existing_inputs=existing_inputs
-        )
-        
-        total_new_samples += cmd_saved
-        print(f"Saved {cmd_saved} new samples for {cmd_name}")
-        print(f"Total new samples so far: {total_new_samples}")
+        selected[cmd_name] = cmd_info
+    
+    scheduler_class = AdaptiveCommandScheduler if allocation == "adaptive" else CommandScheduler
+    scheduler = scheduler_class(selected, max_examples_per_command, conversations_per_call, restart=restart)
+    print(f"Requesting {scheduler.total_remaining()} conversations for {len(selected)} commands "
+          f"with {workers} workers (progress in {scheduler.state_path})")
+    total_new_samples = generate_all_commands(profile_data["name"], selected, examples_from_profile, scheduler,
+                                              store, dedup_index, telemetry_log, workers=workers)
+    
+    scheduler.print_stats()
     
+    telemetry_log.close()
+    store.close()
+    store.materialize_json()
     print(f"Generated {total_new_samples} new unique samples")
-    print(f"Total dataset size: {len(existing_inputs)} samples")
+    print(f"Total dataset size: {len(store)} samples")
+    print_batch_stats()
+    validator.print_stats()
+    dedup_index.print_stats()
+    get_llm_cache().print_stats()
+    llm_client.print_backend_stats()
+    print_residency_stats()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Generate the command intent dataset')
+    parser.add_argument('--examples-per-command', type=int, default=20,
+                        help='Conversations to request per command, counting earlier runs')
+    parser.add_argument('--conversations-per-call', type=int, default=CONVERSATIONS_PER_CALL,
+                        help='Conversations requested per LLM call')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='LLM calls in flight at once')
+    parser.add_argument('--restart', action='store_true', help=f'Reset the quota counters saved in {COMMAND_PROGRESS_FILE}')
+    parser.add_argument('--allocation', choices=["fixed", "adaptive"], default=ALLOCATION,
+                        help='fixed: the same number of conversations for every command; '
+                             'adaptive: move the budget to the commands yielding the most new samples')
+    args = parser.parse_args()
+    main(args.examples_per_command, args.conversations_per_call, args.workers, args.restart, args.allocation)
@@ -0,0 +1,755 @@
+#!/usr/bin/env python3
+"""Command-intent samples generated from phrase templates, without the LLM.
+
+Most command-intent samples are a short player request mapped to one command call,
+e.g. "find some iron ore within 32 blocks" -> !searchForBlock("iron_ore", 32). Each
+command gets a few paraphrase grammars ("(find|look for) {type}( nearby|)") whose
+slots are filled from the command table (load_bot_commands) and from item, block and
+mob names in raw_data. Every combination is a valid call, so samples cost nothing to
+generate and only exact duplicates are skipped.
+
+Commands whose parameters are free text (!newAction, !goal, !startConversation) have
+no templates and are left to the LLM generator. An LLM-generated dataset can also be
+given with --seeds: its player requests are turned into extra templates by replacing
+the argument values they mention with slots, so the LLM only supplies phrasings.
+
+    python command_templates.py --per-command 500
+    python command_templates.py --per-command 500 --seeds training_data/minecraft_command_intent_dataset.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+from command_intent_dataset_generator import (
+    JSONL_OUTPUT_FILE, command_category, identify_command_in_response, load_bot_commands, load_bot_profile
+)
+from command_validation import get_validator
+from game_ids import load_game_ids
+from sample_store import JsonlSampleStore, iter_jsonl
+
+RAW_DATA_DIR = "raw_data"
+TEMPLATE_JSONL_FILE = os.path.join("training_data", "minecraft_command_template_dataset.jsonl")
+
+# Give up on a command after this many samples in a row were duplicates
+MAX_DUPLICATE_STREAK = 200
+
+PLAYER_NAMES = ["steve", "alex", "zoe", "emily", "joe", "azul", "jaybird", "kira", "Notch_fan", "xXMinerXx"]
+PLACE_NAMES = ["base", "home", "mine", "farm", "village", "spawn", "portal", "camp", "storage", "tower"]
+MODE_NAMES = ["self_preservation", "unstuck", "cowardice", "self_defense", "hunting", "item_collecting",
+              "torch_placing", "elbow_room", "idle_staring", "cheat"]
+
+# World blocks the wiki scrape has no articles for (it has no ores, stone or logs)
+BASE_BLOCKS = ["stone", "cobblestone", "dirt", "grass_block", "sand", "gravel", "clay", "oak_log", "birch_log",
+               "spruce_log", "oak_planks", "coal_ore", "iron_ore", "copper_ore", "gold_ore", "redstone_ore",
+               "lapis_ore", "diamond_ore", "emerald_ore", "deepslate", "obsidian", "netherrack", "crafting_table",
+               "furnace", "chest", "glass", "white_wool", "torch"]
+BASE_CRAFTABLE = ["torch", "stick", "crafting_table", "furnace", "chest", "oak_planks", "bread", "bucket",
+                  "ladder", "oak_door", "white_bed", "shield", "bow", "arrow", "iron_block", "bookshelf", "oak_boat"]
+BASE_SMELTABLE = ["raw_iron", "raw_gold", "raw_copper", "iron_ore", "gold_ore", "sand", "cobblestone",
+                  "clay_ball", "oak_log", "kelp", "cactus", "netherrack", "potato"]
+# The wiki only has generic pages (Door, Button) for most things that can be activated
+BASE_ACTIVATABLE = ["oak_door", "iron_door", "oak_trapdoor", "oak_fence_gate", "stone_button", "oak_button",
+                    "stone_pressure_plate", "oak_pressure_plate", "repeater", "comparator"]
+# Mobs whose wiki pages the scrape missed or filtered out
+BASE_MOBS = ["villager", "wolf", "vex", "zombie", "skeleton", "creeper", "spider", "cow", "pig", "sheep", "chicken"]
+TOOL_MATERIALS = ["wooden", "stone", "iron", "golden", "diamond", "netherite"]
+TOOLS = ["sword", "pickaxe", "axe", "shovel", "hoe"]
+ARMOR_MATERIALS = ["leather", "chainmail", "iron", "golden", "diamond", "netherite"]
+ARMOR = ["helmet", "chestplate", "leggings", "boots"]
+
+# Wiki articles about a family of items rather than one item with a usable name
+GENERIC_TITLES = {"Axe", "Hoe", "Shovel", "Sword", "Pickaxe", "Helmet", "Chestplate", "Leggings", "Boots",
+                  "Dye", "Flower", "Fungus", "Head", "Log", "Leaves", "Wood", "Roots", "Mushroom", "Compound",
+                  "Shrub", "Grass", "Banner Pattern", "Pottery Sherd", "Bucket of aquatic mob", "Nylium",
+                  "Mushroom Block", "Lava", "Armor", "Item", "Food", "Tool", "Mob", "Animal", "Undead", "NPC"}
+# Wiki titles whose game ID isn't the title in snake case
+TITLE_IDS = {
+    "Steak": "cooked_beef", "Raw Beef": "beef", "Raw Chicken": "chicken", "Raw Cod": "cod", "Raw Mutton": "mutton",
+    "Raw Porkchop": "porkchop", "Raw Rabbit": "rabbit", "Raw Salmon": "salmon", "Block of Redstone": "redstone_block",
+    "Hay Bale": "hay_block", "Redstone Comparator": "comparator", "Redstone Repeater": "repeater", "Vines": "vine",
+    "Eye of Ender": "ender_eye", "Dragon's Breath": "dragon_breath", "Book and Quill": "writable_book",
+    "Bottle o' Enchanting": "experience_bottle", "Nether Quartz": "quartz", "Turtle Shell": "turtle_helmet",
+    "Minecart with Chest": "chest_minecart", "Minecart with Command Block": "command_block_minecart",
+    "Minecart with Furnace": "furnace_minecart", "Minecart with Hopper": "hopper_minecart",
+    "Minecart with TNT": "tnt_minecart", "Disc Fragment": "disc_fragment_5",
+}
+# Which game ID list (game_ids.py) the names of each vocabulary must be in
+GAME_ID_KINDS = {"items": "items", "food": "items", "equipment": "items", "craftable": "items", "smeltable": "items",
+                 "blocks": "blocks", "activatable": "blocks", "mobs": "mobs"}
+# Pages that describe joke, education-only or removed content
+_NOT_IN_GAME_RE = re.compile(r"April Fools|education-related|outdated versions|been removed|Minecraft Earth")
+_ACTIVATABLE_RE = re.compile(r"Lever|Button|Door|Trapdoor|Gate|Bell|Note Block|Pressure Plate|Daylight Detector|"
+                             r"Repeater|Comparator|Lectern|Dispenser|Target")
+
+# Which vocabulary fills a string parameter, by (command, parameter) and then by parameter
+PARAM_VOCABULARY = {
+    ("searchForBlock", "type"): "blocks",
+    ("collectBlocks", "type"): "blocks",
+    ("placeHere", "type"): "blocks",
+    ("searchForEntity", "type"): "mobs",
+    ("attack", "type"): "mobs",
+    ("activate", "type"): "activatable",
+    ("consume", "item_name"): "food",
+    ("equip", "item_name"): "equipment",
+    ("craftRecipe", "recipe_name"): "craftable",
+    ("smeltItem", "item_name"): "smeltable",
+    "item_name": "items",
+    "player_name": "players",
+    "name": "places",
+    "mode_name": "modes",
+}
+# Values for numeric parameters the request mentions
+NUMBER_CHOICES = {
+    ("stay", "type"): [10, 30, 60, 120, 300, 600],
+    "num": [1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 32, 64],
+    "search_range": [16, 24, 32, 48, 64, 100, 128],
+    "closeness": [1, 2, 3, 4, 5],
+    "follow_dist": [2, 3, 4, 5, 6, 8],
+    "distance": [5, 8, 10, 15, 20, 30, 50],
+}
+# Values for parameters the request doesn't mention ("@speaker" is whoever is asking)
+DEFAULT_VALUES = {
+    ("stay", "type"): -1,
+    "num": 1,
+    "search_range": 64,
+    "closeness": 3,
+    "follow_dist": 3,
+    "distance": 10,
+    "player_name": "@speaker",
+}
+
+# Paraphrase grammars: (a|b|) picks one alternative (empty allowed), {param} is a slot,
+# {param:plural} / {param:a} inflect it, {param=value} sets a value without text, and
+# {bot} / {speaker} are the bot's and the player's names; {please} is POLITE_GRAMMAR
+COMMAND_TEMPLATES = {
+    "stop": [
+        "{please}(stop|stop (that|it|everything|what you're doing)|halt|freeze|cancel (that|everything)|quit it)( right now| now|)",
+        "(hold on|wait)(,|) (stop|stop that)",
+    ],
+    "stfu": [
+        "{please}(be quiet|stop talking|shush|stop chatting|quiet down|zip it|enough chatting)( for a (bit|while|second)|)",
+        "(you talk too much|too much chatter)(,|) (be quiet|stop talking)",
+    ],
+    "restart": [
+        "{please}(restart|reboot)( yourself|)",
+        "you (seem|look) (stuck|frozen)(,|) (restart|reboot|try restarting)",
+    ],
+    "clearChat": [
+        "{please}(clear|wipe|reset) (the |your |)(chat|chat history|messages)",
+        "forget (our|this) (conversation|chat)",
+    ],
+    "goToPlayer": [
+        "{please}(go|head|walk|run) (to|over to) {player_name}",
+        "{please}(come|get) (here|over here|to me)( now| quick|)",
+        "{please}(come|get) within {closeness} blocks of me",
+        "{please}(go|head) to {player_name} and (stay|get) within {closeness} blocks",
+    ],
+    "followPlayer": [
+        "{please}(follow|tail) {player_name}( around|)",
+        "{please}(follow me|come with me|keep following me|stick with me)",
+        "{please}follow me (at|from) {follow_dist} blocks( away| back|)",
+        "{please}follow {player_name} (but stay|and keep) {follow_dist} blocks (back|behind|away)",
+    ],
+    "goToCoordinates": [
+        "{please}(go|head|walk|travel) to {x} {y} {z}",
+        "{please}(go|head) to (x |){x}, (y |){y}, (z |){z}",
+        "{please}(go to|get to) (coordinates|coords) {x}, {y}, {z}( and stop within {closeness} blocks|)",
+    ],
+    "searchForBlock": [
+        "{please}(find|look for|search for|locate|go find|go to) (some |the nearest |the closest |){type}( nearby| around here|)",
+        "{please}(find|search for|look for) {type} within {search_range} blocks",
+        "where('s| is) the (nearest|closest) {type}",
+        "(is there|are there) any {type} (nearby|around here)",
+    ],
+    "searchForEntity": [
+        "{please}(find|look for|search for|go find|track down|locate) {type:a}( nearby| around here|)",
+        "{please}(find|search for|look for) {type:a} within {search_range} blocks",
+        "where('s| is) the (nearest|closest) {type}",
+    ],
+    "moveAway": [
+        "{please}(move|go|get|back) away( from here|)",
+        "{please}(move|go|get) {distance} blocks away",
+        "back (off|up) {distance} blocks",
+        "(give me|I need) some space",
+    ],
+    "stay": [
+        "{please}(stay|stay here|stay put|don't move|wait here|hold (your|this) position)",
+        "{please}(stay|wait) (here|put) for {type} seconds",
+        "{please}(stay|wait) here forever{type=-1}",
+    ],
+    "rememberHere": [
+        "{please}(remember|save|mark) this (place|spot|location) as {name}",
+        "{please}(call|name) this (place|spot) {name}",
+        "{please}remember (here|this spot) as (my |our |){name}",
+    ],
+    "goToRememberedPlace": [
+        "{please}(go|head|go back|head back) to (the |my |our |){name}",
+        "(let's go|take me) (back |)to (the |our |){name}",
+    ],
+    "givePlayer": [
+        "{please}(give|hand|pass|toss) me {num} {item_name:plural}",
+        "{please}(give|hand|bring) {player_name} {num} {item_name:plural}",
+        "{please}(give|hand|pass) me {item_name:a}",
+        "can I (have|get) {num} {item_name:plural}",
+        "{please}(give|send) {num} {item_name:plural} to {player_name}",
+    ],
+    "consume": [
+        "{please}(eat|consume|have) {item_name:a}",
+        "{please}(eat|munch on|snack on) (some |the |your |){item_name}",
+        "(you're hungry|you look hungry)(,|) eat (some |){item_name}",
+    ],
+    "equip": [
+        "{please}(equip|hold|wield|use|switch to|grab) (the |your |){item_name}",
+        "{please}(take out|pull out|get out) (the |your |){item_name}",
+    ],
+    "discard": [
+        "{please}(drop|discard|throw away|toss|get rid of) {num} {item_name:plural}",
+        "{please}(drop|discard|throw away|get rid of) (the |your |){item_name}",
+    ],
+    "putInChest": [
+        "{please}(put|store|stash|deposit) {num} {item_name:plural} (in|into) the chest",
+        "{please}(put|store|stash) (the |your |){item_name} (in|into) the chest",
+    ],
+    "takeFromChest": [
+        "{please}(take|grab|get|fetch) {num} {item_name:plural} (from|out of) the chest",
+        "{please}(take|grab|get) (the |){item_name} (from|out of) the chest",
+    ],
+    "viewChest": [
+        "(what's|what is) in (the|this|that) chest",
+        "{please}(check|look in|open|view) the chest",
+        "{please}(show me|tell me) what's in the (nearest |)chest",
+    ],
+    "collectBlocks": [
+        "{please}(collect|gather|mine|get|harvest|chop) {num} {type:plural}",
+        "{please}(collect|gather|mine|get) {type:a}( for me|)",
+        "I need {num} {type:plural}(,|) (collect|gather|mine) them",
+    ],
+    "craftRecipe": [
+        "{please}(craft|make) {num} {recipe_name:plural}",
+        "{please}(craft|make) (me |){recipe_name:a}",
+        "can you craft {recipe_name:a}",
+    ],
+    "smeltItem": [
+        "{please}(smelt|cook) {num} {item_name:plural}",
+        "{please}(smelt|cook) (the |my |){item_name}( in the furnace|)",
+    ],
+    "clearFurnace": [
+        "{please}(empty|clear|clean out) the furnace",
+        "{please}(take|get|grab) (everything|the items|all the stuff) out of the furnace",
+    ],
+    "placeHere": [
+        "{please}(place|put|set) {type:a} (here|down|right here)",
+        "{please}(place|put down) {type:a}( at your feet| where you are|)",
+    ],
+    "attack": [
+        "{please}(attack|kill|fight|slay|take out|go after) (the |that |){type}",
+        "there's {type:a}(,|) (kill|attack) it",
+    ],
+    "attackPlayer": [
+        "{please}(attack|kill|fight|go after|take out) {player_name}",
+        "{player_name} is (griefing|trolling) us(,|) (attack|kill) them",
+    ],
+    "goToBed": [
+        "{please}(go to|head to|hop in|get in) (bed|the bed)",
+        "(go to sleep|sleep|get some sleep)((,|) it's (night|late)|)",
+    ],
+    "activate": [
+        "{please}(activate|use|toggle|interact with) the (nearest |closest |){type}",
+    ],
+    "setMode": [
+        "{please}(turn on{on=true}|enable{on=true}|activate{on=true}|turn off{on=false}|disable{on=false}) (the |){mode_name} mode",
+        "{please}(set|switch) {mode_name} (mode |)(on{on=true}|off{on=false})",
+    ],
+    "endGoal": [
+        "(you're done|that's enough|stop working on (the|your) goal|end (the|your) goal|goal complete|you can stop now)",
+    ],
+    "endConversation": [
+        "{please}(stop talking to|end (the|your) conversation with|stop chatting with) {player_name}",
+    ],
+}
+
+ADDRESS_TEMPLATE = "((hey |yo |ok |){bot}(,|) |)"
+# What {please} stands for at the start of a request that is an instruction
+POLITE_GRAMMAR = "((can|could|would) you |please |)"
+# Share of samples drawn from seed phrasings when a command has any
+SEED_SHARE = 0.3
+BOT_REPLIES = ["{call}", "On it! {call}", "Sure thing! {call}", "Okay! {call}", "Got it. {call}", "Will do! {call}"]
+THINKING_TEMPLATES = [
+    "{speaker}'s request calls for !{command} ({description}).{args}",
+    "This is a job for !{command}: {description}.{args}",
+]
+
+# ---------------------------------------------------------------------------
+# Grammar
+
+class TemplateError(ValueError):
+    """A template that doesn't parse or doesn't cover its command's parameters"""
+
+def _parse_sequence(text, pos, depth):
+    """Parse text[pos:] up to an unmatched | or ) -> (parts, pos)"""
+    parts = []
+    literal = []
+    while pos < len(text):
+        char = text[pos]
+        if char in "|)" and depth:
+            break
+        if char == ")":
+            raise TemplateError(f"unbalanced ) in {text!r}")
+        if char in "({":
+            if literal:
+                parts.append("".join(literal))
+                literal = []
+        if char == "(":
+            alternatives = []
+            pos += 1
+            while True:
+                alternative, pos = _parse_sequence(text, pos, depth + 1)
+                alternatives.append(alternative)
+                if pos >= len(text):
+                    raise TemplateError(f"unclosed ( in {text!r}")
+                pos += 1
+                if text[pos - 1] == ")":
+                    break
+            parts.append(("alt", alternatives))
+        elif char == "{":
+            end = text.find("}", pos)
+            if end < 0:
+                raise TemplateError(f"unclosed {{ in {text!r}")
+            spec = text[pos + 1:end]
+            if "=" in spec:
+                name, value = spec.split("=", 1)
+                parts.append(("set", name, value))
+            else:
+                name, _, form = spec.partition(":")
+                parts.append(("slot", name, form))
+            pos = end + 1
+        else:
+            literal.append(char)
+            pos += 1
+    if literal:
+        parts.append("".join(literal))
+    return parts, pos
+
+def _count(parts):
+    total = 1
+    for part in parts:
+        if isinstance(part, tuple) and part[0] == "alt":
+            total *= sum(_count(alternative) for alternative in part[1])
+    return total
+
+def _collect(parts, key):
+    found = set()
+    for part in parts:
+        if isinstance(part, tuple):
+            if part[0] == "alt":
+                for alternative in part[1]:
+                    found |= _collect(alternative, key)
+            elif part[0] == key:
+                found.add(part[1])
+    return found
+
+class Template:
+    """One compiled paraphrase grammar (seed=True for phrasings taken from LLM samples)"""
+
+    def __init__(self, text, seed=False):
+        self.text = text
+        self.seed = seed
+        self.parts, _ = _parse_sequence(text.replace("{please}", POLITE_GRAMMAR), 0, 0)
+        self.combinations = _count(self.parts)
+        self.slots = _collect(self.parts, "slot")
+        self.assigned = _collect(self.parts, "set")
+
+    def expand(self, rng):
+        """Pick one alternative everywhere -> (tokens, assignments); slots stay unfilled"""
+        tokens = []
+        assignments = {}
+        stack = [iter(self.parts)]
+        while stack:
+            part = next(stack[-1], None)
+            if part is None:
+                stack.pop()
+            elif isinstance(part, str):
+                tokens.append(part)
+            elif part[0] == "alt":
+                stack.append(iter(rng.choice(part[1])))
+            elif part[0] == "set":
+                assignments[part[1]] = part[2]
+            else:
+                tokens.append(part)
+        return tokens, assignments
+
+# ---------------------------------------------------------------------------
+# Vocabulary
+
+def to_id(title):
+    """Wiki title -> Minecraft id: "Cooked Porkchop" -> "cooked_porkchop", "Steak" -> "cooked_beef" """
+    if title in TITLE_IDS:
+        return TITLE_IDS[title]
+    return re.sub(r"[^a-z0-9]+", "_", title.lower().replace("'", "")).strip("_")
+
+def to_display(name_id):
+    return name_id.replace("_", " ")
+
+def pluralize(word):
+    if word.endswith("s"):
+        return word  # already plural (boots, leggings) or a mass noun (glass)
+    if re.search(r"(x|z|ch|sh)$", word):
+        return word + "es"
+    if re.search(r"[^aeiou]y$", word):
+        return word[:-1] + "ies"
+    return word + "s"
+
+def with_article(word):
+    return ("an " if word[:1].lower() in "aeiou" else "a ") + word
+
+def _in_game_articles(raw_dir, name):
+    """Articles from raw_data/<name>.json about one thing that exists in the current game"""
+    path = os.path.join(raw_dir, f"{name}.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        articles = json.load(f)
+    kept = {}
+    for article in articles:
+        title, head = article.get("title", ""), article.get("content", "")[:500]
+        if re.search(r"[:/()]", title) or title.startswith("Invalid Data Value") or title in GENERIC_TITLES:
+            continue
+        if _NOT_IN_GAME_RE.search(head):
+            continue
+        # The page's own infobox must follow its title (redirected pages describe another mob/item)
+        if not re.search(re.escape(title) + r".{0,80}?\b(Rarity|Renewable|Health)\b", head, re.DOTALL):
+            continue
+        kept.setdefault(title, head)
+    return list(kept.items())
+
+def load_vocabulary(raw_dir=RAW_DATA_DIR):
+    """Vocabulary name -> sorted list of ids, from the wiki scrape plus the BASE_* lists
+
+    Names that aren't IDs in the game (generic pages like "Door", education-only items,
+    jockeys) are dropped by checking them against game_ids.py's ID list.
+    """
+    items = _in_game_articles(raw_dir, "items")
+    mechanics = _in_game_articles(raw_dir, "mechanics")
+    mobs = _in_game_articles(raw_dir, "mobs")
+
+    equipment = {f"{material}_{tool}" for material in TOOL_MATERIALS for tool in TOOLS}
+    equipment |= {f"{material}_{piece}" for material in ARMOR_MATERIALS for piece in ARMOR}
+    equipment |= {to_id(title) for title, head in items if "Durability" in head}
+    blocks = set(BASE_BLOCKS) | {to_id(title) for title, head in items + mechanics if "Hardness" in head}
+    food = {to_id(title) for title, head in items if "Restores" in head}
+
+    vocabulary = {
+        "items": {to_id(title) for title, _ in items} | equipment | set(BASE_CRAFTABLE),
+        "blocks": blocks,
+        "mobs": set(BASE_MOBS) | {to_id(title) for title, _ in mobs},
+        "food": food,
+        "equipment": equipment,
+        "craftable": equipment | set(BASE_CRAFTABLE),
+        # Raw food is the food with a cooked_ version (beef -> cooked_beef)
+        "smeltable": set(BASE_SMELTABLE) | {name for name in food if f"cooked_{name}" in food},
+        "activatable": set(BASE_ACTIVATABLE) | {to_id(title) for title, head in mechanics
+                                                 if "Hardness" in head and _ACTIVATABLE_RE.search(title)},
+        "players": set(PLAYER_NAMES),
+        "places": set(PLACE_NAMES),
+        "modes": set(MODE_NAMES),
+    }
+    game_ids = load_game_ids(os.path.join(raw_dir, "minecraft_ids.json"))
+    if game_ids is not None:
+        for name, kind in GAME_ID_KINDS.items():
+            vocabulary[name] &= game_ids[kind]
+    return {name: sorted(values) for name, values in vocabulary.items()}
+
+def _lookup(table, cmd_name, param):
+    return table.get((cmd_name, param), table.get(param))
+
+# ---------------------------------------------------------------------------
+# Samples
+
+def param_kind(cmd_name, param):
+    """"string", "number", "bool" or None for free text the templates can't fill"""
+    if param == "on":
+        return "bool"
+    if _lookup(NUMBER_CHOICES, cmd_name, param) is not None or param in ("x", "y", "z"):
+        return "number"
+    if _lookup(PARAM_VOCABULARY, cmd_name, param) is not None:
+        return "string"
+    return None
+
+def format_call(cmd_name, params, values):
+    args = []
+    for param in params:
+        value = values[param]
+        args.append(json.dumps(value) if isinstance(value, str) else str(value).lower())
+    return f"!{cmd_name}({', '.join(args)})" if args else f"!{cmd_name}"
+
+class CommandTemplates:
+    """The compiled templates of one command and how to fill its parameters"""
+
+    def __init__(self, cmd_name, cmd_info, templates, vocabulary):
+        self.cmd_name = cmd_name
+        self.cmd_info = cmd_info
+        self.params = list(cmd_info.get("params", {}))
+        self.vocabulary = vocabulary
+        self.templates = []
+        self.seed_templates = []
+        for text in templates:
+            self.add(Template(text))
+
+    def add(self, template):
+        """Add a compiled template; raises TemplateError if it can't fill every parameter"""
+        for param in self.params:
+            if param_kind(self.cmd_name, param) is None:
+                raise TemplateError(f"!{self.cmd_name} parameter {param} is free text")
+            covered = param in template.slots or param in template.assigned
+            if not covered and _lookup(DEFAULT_VALUES, self.cmd_name, param) is None:
+                raise TemplateError(f"template {template.text!r} never mentions {param}")
+        unknown = (template.slots | template.assigned) - set(self.params) - {"bot", "speaker"}
+        if unknown:
+            raise TemplateError(f"template {template.text!r} has unknown slots {sorted(unknown)}")
+        (self.seed_templates if template.seed else self.templates).append(template)
+
+    @property
+    def combinations(self):
+        return sum(template.combinations for template in self.templates + self.seed_templates)
+
+    def _value(self, param, rng):
+        kind = param_kind(self.cmd_name, param)
+        if kind == "bool":
+            return rng.random() < 0.5
+        if param in ("x", "z"):
+            return rng.randint(-2000, 2000)
+        if param == "y":
+            return rng.randint(-60, 250)
+        if kind == "number":
+            return rng.choice(_lookup(NUMBER_CHOICES, self.cmd_name, param))
+        return rng.choice(self.vocabulary[_lookup(PARAM_VOCABULARY, self.cmd_name, param)])
+
+    def sample(self, rng, bot_name, speaker):
+        """One (request, values, template); values are the call's arguments in parameter order"""
+        if self.seed_templates and (not self.templates or rng.random() < SEED_SHARE):
+            template = rng.choice(self.seed_templates)
+        else:
+            template = rng.choice(self.templates)
+        tokens, assignments = template.expand(rng)
+        values = {}
+        for param in self.params:
+            if param in assignments:
+                value = assignments[param]
+                values[param] = {"true": True, "false": False}.get(value, value)
+                if isinstance(values[param], str) and re.fullmatch(r"-?\d+", value):
+                    values[param] = int(value)
+            elif param in template.slots:
+                values[param] = self._value(param, rng)
+            else:
+                values[param] = _lookup(DEFAULT_VALUES, self.cmd_name, param)
+            if values[param] == "@speaker":
+                values[param] = speaker
+
+        text = []
+        for token in tokens:
+            if isinstance(token, str):
+                text.append(token)
+                continue
+            _, name, form = token
+            if name == "bot":
+                text.append(bot_name)
+            elif name == "speaker":
+                text.append(speaker)
+            else:
+                value = values[name]
+                word = to_display(value) if isinstance(value, str) and name != "player_name" else str(value)
+                if form == "plural" and values.get("num", 2) != 1:
+                    word = pluralize(word)
+                elif form == "a":
+                    word = with_article(word)
+                text.append(word)
+        return "".join(text), values, template
+
+def build_command_templates(commands, vocabulary, templates=COMMAND_TEMPLATES):
+    """cmd_name -> CommandTemplates for every command in the table that has templates"""
+    built = {}
+    for cmd_name, cmd_info in commands.items():
+        if cmd_name in templates:
+            built[cmd_name] = CommandTemplates(cmd_name, cmd_info, templates[cmd_name], vocabulary)
+    return built
+
+_ARG_RE = re.compile(r'"([^"]*)"|\'([^\']*)\'|(-?\d+)|(true|false)')
+_SPEAKER_PREFIX_RE = re.compile(r"^(\w+):\s*")
+# Minecraft usernames; seeds that call a player "I" or "me" would turn those words into slots
+_PLAYER_NAME_RE = re.compile(r"[A-Za-z0-9_]{3,16}")
+NOT_PLAYER_NAMES = {"you", "him", "her", "them", "they", "she", "me", "myself", "player", "someone", "everyone",
+                    "anyone", "the_player", "username", "name"}
+
+def template_from_seed(sample, command_templates):
+    """Turn an LLM-written sample into a template by replacing the values its request mentions
+
+    Returns None unless the bot's call passes the command validator, names real players,
+    and each string argument (other than the speaker's own name) appears in the
+    player's request.
+    """
+    cmd_name = sample.get("command_used")
+    if cmd_name not in command_templates:
+        return None
+    templates = command_templates[cmd_name]
+    error, _ = get_validator().check(sample.get("output", ""), cmd_name)
+    if error:
+        return None
+    call = identify_command_in_response(sample.get("output", ""), cmd_name)
+    args_text = call[len(cmd_name) + 2:-1] if call and call.endswith(")") else ""
+    args = [next(group for group in match.groups() if group is not None) for match in _ARG_RE.finditer(args_text)]
+    if len(args) != len(templates.params):
+        return None
+
+    text = sample.get("instruction", "").strip()
+    speaker_match = _SPEAKER_PREFIX_RE.match(text)
+    speaker = speaker_match.group(1) if speaker_match else None
+    if speaker_match:
+        text = text[speaker_match.end():]
+    if not text or len(text) > 120 or re.search(r"[(){}|]|![A-Za-z]", text):
+        return None
+
+    for param, value in zip(templates.params, args):
+        kind = param_kind(cmd_name, param)
+        if _lookup(PARAM_VOCABULARY, cmd_name, param) == "players":
+            if not _PLAYER_NAME_RE.fullmatch(value) or value.lower() in NOT_PLAYER_NAMES:
+                return None
+        if param == "player_name" and value == speaker:
+            continue
+        if kind == "string":
+            pattern = re.compile(r"\b" + re.escape(to_display(value)) + r"\b", re.IGNORECASE)
+        else:
+            pattern = re.compile(r"(?<![\w-])" + re.escape(value) + r"\b")
+        text, found = pattern.subn("{" + param + "}", text, count=1)
+        if not found and kind == "string":
+            return None
+    try:
+        template = Template(text, seed=True)
+        templates.add(template)
+    except TemplateError:
+        return None
+    return template
+
+def make_sample(cmd_templates, rng, bot_name, address):
+    speaker = rng.choice(PLAYER_NAMES)
+    request, values, template = cmd_templates.sample(rng, bot_name, speaker)
+    if not template.seed:
+        # Seed phrasings already read like chat; built-in ones get an address and punctuation
+        prefix, _ = address.expand(rng)
+        request = "".join(bot_name if token == ("slot", "bot", "") else token for token in prefix) + request
+        if rng.random() < 0.5:
+            request = request[0].upper() + request[1:]
+        question = re.match(r"(hey |yo |ok )?(\w+, )?(can|could|would|where|is|are|what)\b", request, re.IGNORECASE)
+        request += rng.choice(["", "?"] if question else ["", "", "!", "."])
+    # Requests about the speaker need the chat's "name: message" prefix to be answerable
+    if speaker in values.values() or rng.random() < 0.5:
+        request = f"{speaker}: {request}"
+
+    cmd_name = cmd_templates.cmd_name
+    call = format_call(cmd_name, cmd_templates.params, values)
+    args = ", ".join(f"{param} {json.dumps(value) if isinstance(value, str) else str(value).lower()}"
+                     for param, value in values.items())
+    description = cmd_templates.cmd_info.get("description", "").split(". ")[0].rstrip(".")
+    thinking = rng.choice(THINKING_TEMPLATES).format(
+        speaker=speaker, command=cmd_name, description=description[:1].lower() + description[1:],
+        args=f" Arguments: {args}." if args else "")
+    return {
+        "instruction": request,
+        "input": "",
+        "output": rng.choice(BOT_REPLIES).format(call=call),
+        "thinking": thinking,
+        "conversation_type": command_category(cmd_name) or "general_conversation",
+        "command_used": cmd_name
+    }
+
+TEMPLATE_STATS = {"generated": 0, "duplicates": 0, "seconds": 0.0, "per_command": {}}
+
+def generate_template_samples(command_templates, per_command, store, seed=0, bot_name="andy", seen=None):
+    """Append up to per_command new samples per command to store; returns how many were added
+
+    seen holds instructions to treat as duplicates besides those already in store
+    (e.g. the LLM-generated dataset).
+    """
+    rng = random.Random(seed)
+    address = Template(ADDRESS_TEMPLATE)
+    seen = seen if seen is not None else set()
+    started = time.perf_counter()
+    added = 0
+    for cmd_name, cmd_templates in command_templates.items():
+        generated = duplicates = streak = 0
+        while generated < per_command and streak < MAX_DUPLICATE_STREAK:
+            sample = make_sample(cmd_templates, rng, bot_name, address)
+            key = sample["instruction"].lower()
+            if key in seen or sample["instruction"] in store:
+                duplicates += 1
+                streak += 1
+                continue
+            seen.add(key)
+            store.append(sample)
+            generated += 1
+            streak = 0
+        TEMPLATE_STATS["per_command"][cmd_name] = {"generated": generated, "requested": per_command,
+                                                   "duplicates": duplicates,
+                                                   "templates": len(cmd_templates.templates),
+                                                   "seeds": len(cmd_templates.seed_templates),
+                                                   "combinations": cmd_templates.combinations}
+        TEMPLATE_STATS["generated"] += generated
+        TEMPLATE_STATS["duplicates"] += duplicates
+        added += generated
+    store.flush()
+    TEMPLATE_STATS["seconds"] += time.perf_counter() - started
+    return added
+
+def print_template_stats():
+    s = TEMPLATE_STATS
+    rate = s["generated"] / s["seconds"] if s["seconds"] else 0.0
+    print(f"Template samples: {s['generated']} generated in {s['seconds']:.2f}s ({rate:.0f}/s), "
+          f"{s['duplicates']} duplicates skipped")
+    for cmd_name, c in s["per_command"].items():
+        exhausted = " (phrasings exhausted)" if c["generated"] < c["requested"] else ""
+        print(f"  {cmd_name}: {c['generated']} from {c['templates']} templates and {c['seeds']} seeds "
+              f"({c['combinations']} phrasings before slot values){exhausted}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate command-intent samples from phrase templates (no LLM)')
+    parser.add_argument('--per-command', type=int, default=200, help='New samples per command')
+    parser.add_argument('--output', default=TEMPLATE_JSONL_FILE, help='JSONL dataset to append to')
+    parser.add_argument('--seeds', nargs='*', default=[],
+                        help='LLM-generated JSONL datasets whose requests become extra templates')
+    parser.add_argument('--dedup-against', nargs='*', default=[JSONL_OUTPUT_FILE],
+                        help='Datasets whose instructions are not generated again')
+    parser.add_argument('--commands', nargs='*', help='Only these commands (default: all with templates)')
+    parser.add_argument('--raw-data', default=RAW_DATA_DIR, help='Wiki scrape directory for item, block and mob names')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    commands = load_bot_commands()
+    if args.commands:
+        commands = {name: info for name, info in commands.items() if name in args.commands}
+    vocabulary = load_vocabulary(args.raw_data)
+    print("Vocabulary: " + ", ".join(f"{len(values)} {name}" for name, values in vocabulary.items()))
+    command_templates = build_command_templates(commands, vocabulary)
+    skipped = sorted(set(commands) - set(command_templates))
+    if skipped:
+        print(f"No templates (free-text parameters) for: {', '.join(skipped)}")
+
+    for path in args.seeds:
+        adopted = sum(template_from_seed(record, command_templates) is not None for record in iter_jsonl(path))
+        print(f"Adopted {adopted} seed phrasings from {path}")
+
+    seen = set()
+    for path in args.dedup_against:
+        if os.path.exists(path) and os.path.abspath(path) != os.path.abspath(args.output):
+            seen.update(record.get("instruction", "").lower() for record in iter_jsonl(path))
+
+    store = JsonlSampleStore(args.output, json_path=os.path.splitext(args.output)[0] + ".json")
+    generate_template_samples(command_templates, args.per_command, store, seed=args.seed,
+                              bot_name=load_bot_profile()["name"], seen=seen)
+    store.close()
+    store.materialize_json()
+    print_template_stats()
+    print(f"Total dataset size: {len(store)} samples in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Grammar check for the command calls in bot responses.
+
+bot-commands-summary.md is compiled once into a typed registry: every parameter
+gets the type (string, number or bool) the template generator fills it with, and
+string parameters that take an item, block, mob or mode get the set of names they
+accept: the game's IDs (game_ids.py) for items, blocks and mobs, and the bot's
+modes. CommandValidator parses the first !command(...) in a response with a small
+scanner and checks it against the registry: the command exists, is the one the
+sample is about, has the right number of arguments, and each argument has the
+right type, range and a known name.
+
+The command-intent generator validates inline; existing datasets are re-checked in
+parallel with per-command error counts:
+
+    python command_validation.py training_data/minecraft_command_intent_dataset.jsonl --rejected-dir rejected
+"""
+import argparse
+import json
+import os
+import re
+import time
+from multiprocessing import Pool
+from game_ids import load_game_ids
+from sample_store import from_jsonl_record
+
+ERROR_MESSAGES = {
+    "no_command": "No command call in the response",
+    "unknown_command": "Calls a command that doesn't exist",
+    "wrong_command": "Calls a different command than the sample is about",
+    "syntax": "Malformed argument list",
+    "arity": "Wrong number of arguments",
+    "type": "Argument has the wrong type",
+    "unknown_name": "Unknown item, block or mob name",
+    "out_of_range": "Number out of range",
+}
+ACCEPTED_MESSAGE = "Command call is valid"
+
+# Smallest value a numeric parameter accepts (!stay takes -1 for forever)
+NUMBER_MINIMUMS = {("stay", "type"): -1, "num": 1, "search_range": 1, "closeness": 0, "follow_dist": 0, "distance": 1}
+# Name set a string argument is checked against, by template vocabulary; players and
+# places are whatever the world has, so any string goes
+NAME_SETS = {"items": "items", "blocks": "items", "food": "items", "equipment": "items", "craftable": "items",
+             "smeltable": "items", "activatable": "items", "mobs": "mobs", "modes": "modes"}
+
+_COMMAND_RE = re.compile(r"!(\w+)")
+_EMPTY_ARGS_RE = re.compile(r"\s*\)")
+_TOKEN_RE = re.compile(r"""\s*(?:"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)'|(-?\d+(?:\.\d+)?)(?![\w.])|(true|false)\b|([^,)\s][^,)]*?))\s*([,)])""")
+
+def compile_registry(commands):
+    """load_bot_commands() output -> command name -> [(param, spec), ...]
+
+    Parameter types are the ones the template generator fills them with
+    (command_templates.param_kind); parameters it can't fill are free text.
+    """
+    # Imported here: command_templates imports the generator, which imports this module
+    from command_templates import PARAM_VOCABULARY, _lookup, param_kind
+    registry = {}
+    for cmd_name, info in commands.items():
+        params = []
+        for param in info.get("params", {}):
+            kind = param_kind(cmd_name, param) or "string"
+            spec = {"type": kind}
+            if kind == "number":
+                spec["min"] = _lookup(NUMBER_MINIMUMS, cmd_name, param)
+            elif kind == "string":
+                spec["names"] = NAME_SETS.get(_lookup(PARAM_VOCABULARY, cmd_name, param))
+            params.append((param, spec))
+        registry[cmd_name] = params
+    return registry
+
+def name_sets(vocabulary, game_ids=None):
+    """The name sets of NAME_SETS
+
+    Items and mobs are every ID in the game (game_ids.load_game_ids()), not just the
+    ones the templates use, so real names like "water" or "cooked_beef" pass. Without
+    the ID list they fall back to the template vocabulary (command_templates.load_vocabulary()).
+    """
+    sets = {}
+    for kind, group in NAME_SETS.items():
+        sets.setdefault(group, set()).update(vocabulary.get(kind, []))
+    if game_ids is not None:
+        sets["items"] = game_ids["items"] | game_ids["blocks"]
+        sets["mobs"] = set(game_ids["mobs"])
+    return sets
+
+def parse_call(text, known=None):
+    """First command call in text -> (name, args, error); args are str/int/float/bool
+
+    With known (a set of command names), "!word" without an argument list is only a
+    call if word is a known command, so "Sure!Here" isn't mistaken for one. A bare
+    word where a value belongs (e.g. !attack(zombie)) comes back as a ("bare", word)
+    tuple so the caller can report it as a type error.
+    """
+    for match in _COMMAND_RE.finditer(text):
+        if known is None or match.group(1) in known or text.startswith("(", match.end()):
+            break
+    else:
+        return None, [], "no_command"
+    name = match.group(1)
+    pos = match.end()
+    if pos >= len(text) or text[pos] != "(":
+        return name, [], None
+    pos += 1
+    args = []
+    if _EMPTY_ARGS_RE.match(text, pos):
+        return name, args, None
+    while True:
+        token = _TOKEN_RE.match(text, pos)
+        if not token:
+            return name, args, "syntax"
+        double, single, number, boolean, bare, end = token.groups()
+        if double is not None or single is not None:
+            args.append(double if double is not None else single)
+        elif number is not None:
+            args.append(float(number) if "." in number else int(number))
+        elif boolean is not None:
+            args.append(boolean == "true")
+        else:
+            args.append(("bare", bare))
+        pos = token.end()
+        if end == ")":
+            return name, args, None
+
+class CommandValidator:
+    """Checks command calls against the compiled registry and counts errors per command"""
+
+    def __init__(self, registry, names):
+        self.registry = registry
+        self.names = names
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.checked = 0
+        self.accepted = 0
+        self.errors = {}       # error id -> count
+        self.per_command = {}  # command -> {"checked": n, error id: count}
+
+    def check(self, response, expected_command=None):
+        """(error id, detail) for the first command call in response; (None, None) if it is valid"""
+        name, args, error = parse_call(response, self.registry)
+        if error == "no_command":
+            return error, None
+        if name not in self.registry:
+            return "unknown_command", name
+        if expected_command and name != expected_command:
+            return "wrong_command", name
+        if error:
+            return error, None
+        params = self.registry[name]
+        if len(args) != len(params):
+            return "arity", f"{len(args)} for {len(params)}"
+        for value, (param, spec) in zip(args, params):
+            kind = spec["type"]
+            if kind == "number":
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    return "type", f"{param} must be a number"
+                if spec["min"] is not None and value < spec["min"]:
+                    return "out_of_range", f"{param}={value}"
+            elif kind == "bool":
+                if not isinstance(value, bool):
+                    return "type", f"{param} must be true or false"
+            elif not isinstance(value, str):
+                return "type", f"{param} must be a quoted string"
+            elif value not in self.names.get(spec["names"], (value,)) and self.names[spec["names"]]:
+                # An empty set means raw_data wasn't available, so names aren't checked
+                return "unknown_name", f"{param}={value!r}"
+        return None, None
+
+    def validate(self, response, expected_command=None):
+        """Return (is_valid, message) and record the result under the command"""
+        error, detail = self.check(response, expected_command)
+        command = expected_command
+        if command is None and error != "no_command":
+            command = parse_call(response, self.registry)[0]
+        self.checked += 1
+        counts = self.per_command.setdefault(command or "(none)", {"checked": 0})
+        counts["checked"] += 1
+        if error is None:
+            self.accepted += 1
+            return True, ACCEPTED_MESSAGE
+        self.errors[error] = self.errors.get(error, 0) + 1
+        counts[error] = counts.get(error, 0) + 1
+        message = ERROR_MESSAGES[error]
+        return False, f"{message} ({detail})" if detail else message
+
+    def stats(self):
+        return {"checked": self.checked, "accepted": self.accepted, "errors": dict(self.errors),
+                "per_command": {cmd: dict(counts) for cmd, counts in self.per_command.items()}}
+
+    def merge_stats(self, other):
+        self.checked += other["checked"]
+        self.accepted += other["accepted"]
+        for error, count in other["errors"].items():
+            self.errors[error] = self.errors.get(error, 0) + count
+        for cmd, counts in other["per_command"].items():
+            mine = self.per_command.setdefault(cmd, {"checked": 0})
+            for key, count in counts.items():
+                mine[key] = mine.get(key, 0) + count
+
+    def print_stats(self):
+        if not self.checked:
+            return
+        print(f"Command calls: {self.accepted}/{self.checked} valid ({self.accepted / self.checked:.1%})")
+        for error, count in sorted(self.errors.items(), key=lambda kv: -kv[1]):
+            print(f"  {error}: {count} ({ERROR_MESSAGES[error]})")
+        print("By command:")
+        for cmd, counts in sorted(self.per_command.items(), key=lambda kv: -kv[1]["checked"]):
+            errors = {key: count for key, count in counts.items() if key != "checked"}
+            invalid = sum(errors.values())
+            detail = ", ".join(f"{key} {count}" for key, count in sorted(errors.items(), key=lambda kv: -kv[1]))
+            print(f"  {cmd}: {invalid}/{counts['checked']} invalid" + (f" ({detail})" if detail else ""))
+
+_default_validator = None
+
+def get_validator(commands=None):
+    """Validator for the command table and wiki scrape, compiled once per process
+
+    commands (load_bot_commands() output) is only read by the first call; without it
+    the command table is loaded from the generator's BOT_COMMANDS_FILE.
+    """
+    global _default_validator
+    if _default_validator is None:
+        # Imported here, like in compile_registry: the generator imports this module
+        from command_templates import load_vocabulary
+        if commands is None:
+            from command_intent_dataset_generator import load_bot_commands
+            commands = load_bot_commands()
+        registry = compile_registry(commands)
+        _default_validator = CommandValidator(registry, name_sets(load_vocabulary(), load_game_ids()))
+    return _default_validator
+
+def _response_text(record):
+    """The bot's reply without its thinking block (which may mention other commands)"""
+    return from_jsonl_record(record).get("output", "")
+
+def _validate_batch(lines):
+    """Worker: validate a chunk of JSONL lines, returning (results, stats)"""
+    validator = get_validator()
+    validator.reset_stats()
+    results = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            results.append((line, False, "Invalid JSON"))
+            continue
+        is_valid, message = validator.validate(_response_text(record), record.get("command_used"))
+        results.append((line, is_valid, message))
+    return results, validator.stats()
+
+def revalidate_jsonl(input_file, accepted_file=None, rejected_file=None, workers=None, batch_size=500):
+    """Stream a command-intent JSONL dataset through the validator across worker processes"""
+    from response_validation import _read_batches
+    validator = CommandValidator({}, {})
+    accepted_out = open(accepted_file, 'w', encoding='utf-8') if accepted_file else None
+    rejected_out = open(rejected_file, 'w', encoding='utf-8') if rejected_file else None
+    started = time.time()
+
+    try:
+        with Pool(processes=workers or os.cpu_count()) as pool:
+            for results, stats in pool.imap(_validate_batch, _read_batches(input_file, batch_size)):
+                validator.merge_stats(stats)
+                for line, is_valid, _ in results:
+                    out = accepted_out if is_valid else rejected_out
+                    if out:
+                        out.write(line + "\n")
+    finally:
+        if accepted_out:
+            accepted_out.close()
+        if rejected_out:
+            rejected_out.close()
+
+    elapsed = time.time() - started
+    print(f"Validated {validator.checked} command calls from {input_file} in {elapsed:.2f}s "
+          f"({validator.checked / elapsed if elapsed else 0:.0f} samples/s)")
+    validator.print_stats()
+    return validator.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the command calls in command-intent JSONL datasets')
+    parser.add_argument('input_files', nargs='+', help='Input JSONL file paths')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=500, help='Lines per worker batch')
+    parser.add_argument('--accepted-dir', help='Write samples with a valid call to this directory')
+    parser.add_argument('--rejected-dir', help='Write samples with an invalid call to this directory')
+    args = parser.parse_args()
+
+    for input_file in args.input_files:
+        base_name = os.path.basename(input_file)
+        accepted_file = rejected_file = None
+        if args.accepted_dir:
+            os.makedirs(args.accepted_dir, exist_ok=True)
+            accepted_file = os.path.join(args.accepted_dir, base_name)
+        if args.rejected_dir:
+            os.makedirs(args.rejected_dir, exist_ok=True)
+            rejected_file = os.path.join(args.rejected_dir, base_name)
+        revalidate_jsonl(input_file, accepted_file, rejected_file, args.workers, args.batch_size)
+
+if __name__ == "__main__":
+    main()
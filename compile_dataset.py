@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Compile the generated datasets into shuffled, deduplicated train/test shards.
+
+The JSONL datasets are streamed into sorted runs on disk, keyed by a seeded hash of
+each example's normalized instruction, and the runs are merged back with a k-way
+merge. Sorting on a hash is a shuffle, and it puts examples with the same
+instruction next to each other, so duplicates are dropped during the merge (the
+first one in input order wins) without an in-memory set. Only one run is held in
+memory at a time, so millions of examples compile in a fixed memory budget.
+
+Train/test membership is a second hash of the instruction that doesn't depend on the
+seed: an example stays in the same split across reshuffles and recompiles, and
+duplicates can't leak from train into test. Each split is written as gzipped JSONL
+shards, with a manifest listing the shards, their counts and checksums.
+
+    python compile_dataset.py
+    python compile_dataset.py --test-fraction 0.05 --shard-size 50000 --seed 1
+    python compile_dataset.py extra.jsonl --output-dir training_data/compiled_extra
+"""
+import argparse
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+DATASET_SOURCES = [
+    os.path.join("training_data", "unified_minecraft_dataset.jsonl"),
+    os.path.join("training_data", "minecraft_command_intent_dataset.jsonl"),
+]
+COMPILED_DIR = os.path.join("training_data", "compiled")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+TEST_FRACTION = 0.05
+SHARD_SIZE = 50000       # examples per output shard
+RUN_MEMORY_MB = 64       # JSON text buffered per sorted run
+MAX_MERGE_FANIN = 64     # runs merged at once; more runs are merged in several passes
+SPLIT_SALT = "split-v1"  # changing this reassigns every example's split
+
+def normalize_instruction(example):
+    """Text two examples must share to count as duplicates"""
+    text = example.get("instruction", "") + "\n" + example.get("input", "")
+    return " ".join(text.lower().split())
+
+def shuffle_key(normalized, seed):
+    return hashlib.blake2b(f"{seed}\0{normalized}".encode("utf-8"), digest_size=8).hexdigest()
+
+def split_of(normalized, test_fraction):
+    """"train" or "test", from a hash of the normalized instruction"""
+    digest = hashlib.blake2b(f"{SPLIT_SALT}\0{normalized}".encode("utf-8"), digest_size=8).digest()
+    return "test" if int.from_bytes(digest, "big") / 2 ** 64 < test_fraction else "train"
+
+def _run_line(key, source_index, line_number, text):
+    # Fixed-width fields, so plain string order is (key, source, line) order
+    return f"{key}\t{source_index:04d}\t{line_number:012d}\t{text}\n"
+
+def _write_run(lines, tmp_dir, runs):
+    lines.sort()
+    path = os.path.join(tmp_dir, f"run-{len(runs):06d}.txt")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    runs.append(path)
+
+def write_sorted_runs(sources, tmp_dir, seed, run_memory_mb=RUN_MEMORY_MB, stats=None):
+    """Stream the sources into sorted run files; returns their paths"""
+    stats = stats if stats is not None else {}
+    budget = run_memory_mb * 1024 * 1024
+    runs = []
+    lines = []
+    buffered = 0
+    for source_index, path in enumerate(sources):
+        source_stats = stats.setdefault("sources", {}).setdefault(path, {"read": 0, "invalid": 0})
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    example = json.loads(line)
+                except json.JSONDecodeError:
+                    source_stats["invalid"] += 1
+                    continue
+                if not example.get("instruction") or not example.get("output"):
+                    source_stats["invalid"] += 1
+                    continue
+                source_stats["read"] += 1
+                key = shuffle_key(normalize_instruction(example), seed)
+                # Re-encoded so the text is guaranteed to be on one line
+                lines.append(_run_line(key, source_index, line_number, json.dumps(example, ensure_ascii=False)))
+                buffered += len(line)
+                if buffered >= budget:
+                    _write_run(lines, tmp_dir, runs)
+                    lines, buffered = [], 0
+    if lines:
+        _write_run(lines, tmp_dir, runs)
+    return runs
+
+def merge_runs(runs, tmp_dir, max_fanin=MAX_MERGE_FANIN):
+    """Merge sorted runs down to at most max_fanin, returning the remaining run paths"""
+    generation = 0
+    while len(runs) > max_fanin:
+        merged = []
+        for i in range(0, len(runs), max_fanin):
+            group = runs[i:i + max_fanin]
+            path = os.path.join(tmp_dir, f"merge-{generation:03d}-{len(merged):06d}.txt")
+            files = [open(run, 'r', encoding='utf-8') for run in group]
+            try:
+                with open(path, 'w', encoding='utf-8') as out:
+                    out.writelines(heapq.merge(*files))
+            finally:
+                for f in files:
+                    f.close()
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+        generation += 1
+    return runs
+
+def iter_unique(runs, stats):
+    """Merged examples in shuffled order, dropping all but the first with the same instruction"""
+    files = [open(run, 'r', encoding='utf-8') for run in runs]
+    try:
+        previous_key = previous_normalized = None
+        for line in heapq.merge(*files):
+            key, _, _, text = line.rstrip("\n").split("\t", 3)
+            example = json.loads(text)
+            # Equal keys are equal instructions unless the 64-bit hash collides, so compare the text too
+            normalized = normalize_instruction(example)
+            if key == previous_key and normalized == previous_normalized:
+                stats["duplicates"] = stats.get("duplicates", 0) + 1
+                continue
+            previous_key, previous_normalized = key, normalized
+            yield example, normalized
+    finally:
+        for f in files:
+            f.close()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ShardWriter:
+    """Gzipped JSONL shards of one split, rolling over every shard_size examples"""
+
+    def __init__(self, output_dir, split, shard_size=SHARD_SIZE):
+        self.output_dir = output_dir
+        self.split = split
+        self.shard_size = shard_size
+        self.shards = []
+        self._file = None
+        self._count = 0
+
+    def write(self, example):
+        if self._file is None or self._count >= self.shard_size:
+            self._roll()
+        self._file.write(json.dumps(example, ensure_ascii=False) + "\n")
+        self._count += 1
+
+    def _roll(self):
+        self._finish()
+        name = f"{self.split}-{len(self.shards):05d}.jsonl.gz"
+        self._path = os.path.join(self.output_dir, name)
+        # mtime=0 keeps the gzip header, and so the checksum, the same on every compile
+        self._raw = open(self._path, 'wb')
+        self._file = io.TextIOWrapper(gzip.GzipFile(fileobj=self._raw, mode='wb', mtime=0), encoding='utf-8')
+        self._count = 0
+
+    def _finish(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._raw.close()
+        self.shards.append({"path": os.path.basename(self._path), "examples": self._count,
+                            "bytes": os.path.getsize(self._path), "sha256": file_sha256(self._path)})
+        self._file = None
+
+    def close(self):
+        self._finish()
+        return self.shards
+
+def load_manifest(output_dir=COMPILED_DIR):
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def shard_paths(manifest, output_dir, split):
+    """Absolute paths of a split's shards, in order"""
+    return [os.path.join(output_dir, shard["path"]) for shard in manifest["splits"][split]["shards"]]
+
+def compile_dataset(sources=None, output_dir=COMPILED_DIR, test_fraction=TEST_FRACTION, shard_size=SHARD_SIZE,
+                    seed=0, run_memory_mb=RUN_MEMORY_MB):
+    """Compile sources into output_dir and return the manifest
+
+    Shards from an earlier compile are replaced; the output is built in a temporary
+    directory next to output_dir and swapped in at the end.
+    """
+    sources = list(sources or DATASET_SOURCES)
+    for path in sources:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Dataset {path} not found")
+    started = time.time()
+    stats = {}
+    parent = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".compile-", dir=parent)
+    try:
+        run_dir = os.path.join(build_dir, "runs")
+        os.makedirs(run_dir)
+        runs = write_sorted_runs(sources, run_dir, seed, run_memory_mb, stats)
+        stats["runs"] = len(runs)
+        runs = merge_runs(runs, run_dir)
+
+        writers = {split: ShardWriter(build_dir, split, shard_size) for split in ("train", "test")}
+        for example, normalized in iter_unique(runs, stats):
+            writers[split_of(normalized, test_fraction)].write(example)
+        shutil.rmtree(run_dir)
+
+        splits = {}
+        for split, writer in writers.items():
+            shards = writer.close()
+            splits[split] = {"examples": sum(s["examples"] for s in shards), "shards": shards}
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+            "test_fraction": test_fraction,
+            "split_salt": SPLIT_SALT,
+            "shard_size": shard_size,
+            "sources": stats.get("sources", {}),
+            "duplicates": stats.get("duplicates", 0),
+            "splits": splits,
+        }
+        with open(os.path.join(build_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(build_dir, output_dir)
+    finally:
+        if os.path.exists(build_dir):
+            shutil.rmtree(build_dir)
+
+    print_compile_stats(manifest, output_dir, stats["runs"], time.time() - started)
+    return manifest
+
+def print_compile_stats(manifest, output_dir, runs, elapsed):
+    read = sum(s["read"] for s in manifest["sources"].values())
+    print(f"Compiled {read} examples from {len(manifest['sources'])} datasets into {output_dir} in {elapsed:.1f}s "
+          f"({runs} sorted runs, {manifest['duplicates']} duplicates dropped)")
+    for path, s in manifest["sources"].items():
+        print(f"  {path}: {s['read']} examples" + (f", {s['invalid']} invalid lines skipped" if s["invalid"] else ""))
+    for split, info in manifest["splits"].items():
+        size_mb = sum(shard["bytes"] for shard in info["shards"]) / 1e6
+        print(f"  {split}: {info['examples']} examples in {len(info['shards'])} shards ({size_mb:.1f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge, deduplicate, shuffle and split the datasets into shards')
+    parser.add_argument('sources', nargs='*', help=f'JSONL datasets (default: {", ".join(DATASET_SOURCES)})')
+    parser.add_argument('--output-dir', default=COMPILED_DIR, help='Directory for the shards and manifest')
+    parser.add_argument('--test-fraction', type=float, default=TEST_FRACTION, help='Share of instructions held out')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='Examples per shard')
+    parser.add_argument('--seed', type=int, default=0, help='Shuffle seed (the split does not depend on it)')
+    parser.add_argument('--memory-mb', type=int, default=RUN_MEMORY_MB, help='JSON text held in memory per sorted run')
+    args = parser.parse_args()
+
+    compile_dataset(args.sources, args.output_dir, args.test_fraction, args.shard_size, args.seed, args.memory_mb)
+
+if __name__ == "__main__":
+    main()
@@ -8,32 +8,88 @@ Original file is located at
 """
 
 # Import libraries
+import sys
 import torch
 from unsloth import FastLanguageModel
-from datasets import load_dataset
-from transformers import TrainingArguments
-from trl import SFTTrainer
+from transformers import Trainer, TrainingArguments
+
+REPO_DIR = '/content/drive/MyDrive/minecraft-llm-finetune'
+sys.path.insert(0, REPO_DIR)
+from token_cache import HFTokenizer, build_token_cache
+from sequence_packing import pack_split, print_packing_stats
 
 # Set model and training parameters
 MODEL_NAME = "mistralai/Ministral-8B-Instruct-2410"  # You can also try "meta-llama/Llama-3.1-8B"
 MICRO_BATCH_SIZE = 1  # Start small to avoid OOM errors
+GRADIENT_ACCUMULATION_STEPS = 4
 EPOCHS = 3
+MAX_SEQ_LENGTH = 2048
 
-# Load the dataset
-dataset = load_dataset('json', data_files='/content/drive/MyDrive/minecraft-llm-finetune/training_data/minecraft_dataset.jsonl')
-dataset = dataset['train'].train_test_split(test_size=0.05)
-
-# Check dataset format
-print(dataset['train'][0])
+# Output of compile_dataset.py (train/test fixed by a hash of each instruction) and
+# the token cache built from it by token_cache.py
+COMPILED_DIR = f'{REPO_DIR}/training_data/compiled'
+TOKEN_CACHE_DIR = f'{REPO_DIR}/training_data/token_cache'
 
-# Initialize the model with Unsloth optimizations
+# Initialize the model with Unsloth optimizations. Unsloth picks its own attention
+# (flash-attn varlen, xformers or SDPA, whichever is installed) and ignores
+# attn_implementation; every one of them keeps packed examples apart when the batch
+# carries packed_seq_lengths (see collate). Checked against unsloth==2026.10.5
 model, tokenizer = FastLanguageModel.from_pretrained(
     model_name=MODEL_NAME,
-    max_seq_length=2048,
+    max_seq_length=MAX_SEQ_LENGTH,
     dtype=torch.float16,
     load_in_4bit=True,
     device_map="auto"
 )
+try:
+    from unsloth.utils.attention_dispatch import select_attention_backend
+except ImportError:
+    raise RuntimeError("Packed training needs an Unsloth with packed-sequence attention (packed_seq_lengths), "
+                       "pip install --upgrade unsloth")
+print(f"Packed attention: {select_attention_backend(use_varlen=True)}")
+
+# Load the pre-tokenized dataset; it is only tokenized when the data, tokenizer or
+# chat template changed, otherwise the cached arrays are memory-mapped
+token_cache = build_token_cache(HFTokenizer(tokenizer), COMPILED_DIR, TOKEN_CACHE_DIR)
+
+class PackedDataset(torch.utils.data.Dataset):
+    """Packed sequences of a token cache split (sequence_packing.py)"""
+
+    def __init__(self, packed):
+        self.packed = packed
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __getitem__(self, i):
+        sequence = self.packed[i]
+        item = {key: torch.tensor(sequence[key], dtype=torch.long)
+                for key in ("input_ids", "labels", "position_ids")}
+        item["seq_lengths"] = torch.tensor(sequence["cu_seqlens"], dtype=torch.int32).diff()
+        return item
+
+def collate(batch):
+    """Flatten a batch of packed sequences into one row without padding
+
+    packed_seq_lengths holds the length of every example in the row, which Unsloth's
+    attention uses to keep each example's attention to itself, and position_ids
+    restart at every example; the first token of every example is a prompt token,
+    so no label crosses an example boundary.
+    """
+    flat = {key: torch.cat([item[key] for item in batch]).unsqueeze(0)
+            for key in ("input_ids", "labels", "position_ids")}
+    flat["packed_seq_lengths"] = torch.cat([item["seq_lengths"] for item in batch])
+    return flat
+
+# Bin-pack examples into MAX_SEQ_LENGTH sequences without splitting any of them
+train_packed = pack_split(token_cache.split("train"), MAX_SEQ_LENGTH)
+eval_packed = pack_split(token_cache.split("test"), MAX_SEQ_LENGTH)
+print_packing_stats(train_packed.stats, MICRO_BATCH_SIZE, GRADIENT_ACCUMULATION_STEPS)
+train_dataset = PackedDataset(train_packed)
+eval_dataset = PackedDataset(eval_packed)
+
+# Check dataset format
+print(tokenizer.decode(train_dataset[0]["input_ids"]))
 
 # Add LoRA adapters for efficient fine-tuning
 model = FastLanguageModel.get_peft_model(
@@ -52,11 +108,14 @@ training_args = TrainingArguments(
     output_dir="/content/drive/MyDrive/minecraft-llm-finetune/model",
     num_train_epochs=EPOCHS,
     per_device_train_batch_size=MICRO_BATCH_SIZE,
-    gradient_accumulation_steps=4,
+    gradient_accumulation_steps=GRADIENT_ACCUMULATION_STEPS,
     gradient_checkpointing=True,
     optim="adamw_torch",
     logging_steps=10,
     save_strategy="epoch",
+    eval_strategy="epoch",
+    per_device_eval_batch_size=MICRO_BATCH_SIZE,
+    remove_unused_columns=False,  # keep packed_seq_lengths, it isn't a named forward() argument
     learning_rate=2e-4,
     warmup_ratio=0.05,
     lr_scheduler_type="cosine",
@@ -65,21 +124,14 @@ training_args = TrainingArguments(
     push_to_hub=False,
 )
 
-# Prepare training function
-def formatting_func(example):
-    # Adjust format based on your model (this is for Mistral Instruct)
-    text = f"<s>[INST] {example['instruction']} [/INST] {example['output']}</s>"
-    return text
-
-# Create SFT trainer
-trainer = SFTTrainer(
+# Create trainer (the chat template is rendered by token_cache.py; adjust
+# PROMPT_TEMPLATE/RESPONSE_TEMPLATE there for other models)
+trainer = Trainer(
     model=model,
-    tokenizer=tokenizer,
-    train_dataset=dataset["train"],
-    eval_dataset=dataset["test"],
+    train_dataset=train_dataset,
+    eval_dataset=eval_dataset,
     args=training_args,
-    packing=True,
-    formatting_func=formatting_func)
+    data_collator=collate)
 
 # Start training
 trainer.train()
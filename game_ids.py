@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""The item, block and mob IDs of the Minecraft version the bot plays.
+
+Names that go into command calls (!collectBlocks("oak_log", 8), !attack("zombie"))
+have to be the game's IDs, not wiki titles ("Steak" is cooked_beef). The IDs are
+kept in raw_data/minecraft_ids.json. It is built from the minecraft_data package
+(PrismarineJS data, pip install minecraft_data), whose newest version is DATA_VERSION,
+plus the IDs added between that and GAME_VERSION, which are listed below.
+
+    python game_ids.py            # rebuild raw_data/minecraft_ids.json
+    python game_ids.py --check    # print how many IDs each list has
+"""
+import argparse
+import json
+import os
+
+GAME_VERSION = "1.21.1"
+DATA_VERSION = "1.19.2"
+GAME_IDS_FILE = os.path.join("raw_data", "minecraft_ids.json")
+
+# minecraft_data entity types that are mobs (the rest are projectiles, vehicles, etc.)
+MOB_ENTITY_TYPES = {"hostile", "animal", "mob", "water_creature", "passive", "ambient"}
+
+_WOODS = ["oak", "spruce", "birch", "jungle", "acacia", "dark_oak", "mangrove", "crimson", "warped", "cherry", "bamboo"]
+_OXIDATION = ["", "exposed_", "weathered_", "oxidized_"]
+_SHERDS = ["angler", "archer", "arms_up", "blade", "brewer", "burn", "danger", "explorer", "flow", "friend", "guster",
+           "heart", "heartbreak", "howl", "miner", "mourner", "plenty", "prize", "scrape", "sheaf", "shelter", "skull",
+           "snort"]
+_TRIMS = ["bolt", "coast", "dune", "eye", "flow", "host", "raiser", "rib", "sentry", "shaper", "silence", "snout",
+          "spire", "tide", "vex", "ward", "wayfinder", "wild"]
+_CHERRY = ["cherry_log", "cherry_wood", "stripped_cherry_log", "stripped_cherry_wood", "cherry_planks", "cherry_stairs",
+           "cherry_slab", "cherry_fence", "cherry_fence_gate", "cherry_door", "cherry_trapdoor", "cherry_pressure_plate",
+           "cherry_button", "cherry_sign", "cherry_wall_sign", "cherry_sapling", "potted_cherry_sapling", "cherry_leaves",
+           "cherry_boat", "cherry_chest_boat"]
+_BAMBOO = ["bamboo_block", "stripped_bamboo_block", "bamboo_planks", "bamboo_mosaic", "bamboo_stairs",
+           "bamboo_mosaic_stairs", "bamboo_slab", "bamboo_mosaic_slab", "bamboo_fence", "bamboo_fence_gate",
+           "bamboo_door", "bamboo_trapdoor", "bamboo_pressure_plate", "bamboo_button", "bamboo_sign", "bamboo_wall_sign",
+           "bamboo_raft", "bamboo_chest_raft"]
+_TUFF = ["tuff_stairs", "tuff_slab", "tuff_wall", "chiseled_tuff", "polished_tuff", "polished_tuff_stairs",
+         "polished_tuff_slab", "polished_tuff_wall", "tuff_bricks", "tuff_brick_stairs", "tuff_brick_slab",
+         "tuff_brick_wall", "chiseled_tuff_bricks"]
+
+# Items and blocks added in 1.19.3-1.21.1 (Trails & Tales, Tricky Trials)
+ADDED_ITEMS_AND_BLOCKS = sorted(set(
+    _CHERRY + _BAMBOO + _TUFF
+    + [f"{wood}_hanging_sign" for wood in _WOODS] + [f"{wood}_wall_hanging_sign" for wood in _WOODS]
+    + [f"{sherd}_pottery_sherd" for sherd in _SHERDS]
+    + [f"{trim}_armor_trim_smithing_template" for trim in _TRIMS] + ["netherite_upgrade_smithing_template"]
+    + [f"{waxed}{stage}{block}" for waxed in ("", "waxed_") for stage in _OXIDATION
+       for block in ("copper_door", "copper_trapdoor", "copper_bulb", "copper_grate")]
+    + [f"{waxed}{stage}chiseled_copper" for waxed in ("", "waxed_") for stage in _OXIDATION]
+    + [f"{mob}_spawn_egg" for mob in ("camel", "sniffer", "armadillo", "breeze", "bogged", "ender_dragon",
+                                      "iron_golem", "snow_golem", "wither")]
+    + ["pink_petals", "chiseled_bookshelf", "decorated_pot", "suspicious_sand", "suspicious_gravel", "sniffer_egg",
+       "torchflower", "torchflower_seeds", "torchflower_crop", "potted_torchflower", "pitcher_plant", "pitcher_pod",
+       "pitcher_crop", "calibrated_sculk_sensor", "piglin_head", "piglin_wall_head", "brush", "music_disc_relic",
+       "armadillo_scute", "wolf_armor", "crafter", "trial_spawner", "vault", "heavy_core", "mace", "breeze_rod",
+       "wind_charge", "trial_key", "ominous_trial_key", "ominous_bottle", "flow_banner_pattern",
+       "guster_banner_pattern", "music_disc_creator", "music_disc_creator_music_box", "music_disc_precipice"]
+))
+ADDED_MOBS = ["camel", "sniffer", "armadillo", "breeze", "bogged"]
+# IDs renamed since DATA_VERSION
+RENAMED_IDS = {"grass": "short_grass", "scute": "turtle_scute"}
+
+def build_game_ids(data_version=DATA_VERSION):
+    """{"version", "items", "blocks", "mobs"} from minecraft_data plus the additions above"""
+    try:
+        import minecraft_data
+    except ImportError:
+        raise ValueError("Building the ID list needs the minecraft_data package (pip install minecraft_data)")
+    data = minecraft_data(data_version)
+    blocks = {RENAMED_IDS.get(block["name"], block["name"]) for block in data.blocks_list}
+    items = {RENAMED_IDS.get(item["name"], item["name"]) for item in data.items_list}
+    mobs = {entity["name"] for entity in data.entities_list if entity.get("type") in MOB_ENTITY_TYPES}
+    return {
+        "version": GAME_VERSION,
+        "source": f"minecraft_data {data_version} + additions up to {GAME_VERSION}",
+        "items": sorted(items | set(ADDED_ITEMS_AND_BLOCKS)),
+        "blocks": sorted(blocks | set(ADDED_ITEMS_AND_BLOCKS)),
+        "mobs": sorted(mobs | set(ADDED_MOBS)),
+    }
+
+_game_ids = {}
+
+def load_game_ids(path=GAME_IDS_FILE):
+    """{"items", "blocks", "mobs"} -> set of IDs, or None if the ID file is missing"""
+    if path not in _game_ids:
+        if not os.path.exists(path):
+            _game_ids[path] = None
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            _game_ids[path] = {kind: set(data[kind]) for kind in ("items", "blocks", "mobs")}
+    return _game_ids[path]
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Build the Minecraft {GAME_VERSION} item, block and mob ID list')
+    parser.add_argument('--output', default=GAME_IDS_FILE, help='ID list to write')
+    parser.add_argument('--data-version', default=DATA_VERSION, help='minecraft_data version to start from')
+    parser.add_argument('--check', action='store_true', help='Print the counts of the existing list and exit')
+    args = parser.parse_args()
+
+    if args.check:
+        ids = load_game_ids(args.output)
+        if ids is None:
+            parser.error(f"{args.output} not found")
+        print(", ".join(f"{len(ids[kind])} {kind}" for kind in ("items", "blocks", "mobs")))
+        return
+    try:
+        game_ids = build_game_ids(args.data_version)
+    except ValueError as e:
+        parser.error(str(e))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(game_ids, f, indent=1)
+    print(f"Wrote {len(game_ids['items'])} items, {len(game_ids['blocks'])} blocks and {len(game_ids['mobs'])} mobs "
+          f"for Minecraft {GAME_VERSION} to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Per-call token and timing telemetry for the dataset generators.
+
+Every LLM call made while generating a dataset is appended as one JSON line to a
+sidecar next to the dataset (e.g. unified_minecraft_dataset.metrics.jsonl) with its
+outcome, conversation type or command, source article and the server's token counts
+and timings. The report turns that into cost per accepted example and shows which
+prompt types and articles waste the most tokens.
+
+    python generation_telemetry.py training_data/unified_minecraft_dataset.metrics.jsonl
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+ACCEPTED = "accepted"
+
+def telemetry_path(dataset_path):
+    """Sidecar path for a dataset: foo.json -> foo.metrics.jsonl"""
+    return os.path.splitext(dataset_path)[0] + ".metrics.jsonl"
+
+class TelemetryLog:
+    """Append-only JSONL log of generation calls"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, entry):
+        """Log one call: a dict with an "outcome" ("accepted" or a short rejection reason),
+        whatever describes the request, and the llm_client telemetry fields"""
+        entry = dict(entry, time=round(time.time(), 3))
+        entry.setdefault("outcome", "error")
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(entry) + "\n")
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def load_records(path):
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+def spent_tokens(record):
+    """Tokens the server actually processed for this call (0 for cache hits)"""
+    if record.get("cached"):
+        return 0
+    return (record.get("prompt_tokens") or 0) + (record.get("eval_tokens") or 0)
+
+def _summarize(records):
+    summary = {"calls": 0, "accepted": 0, "cached": 0, "tokens": 0, "wasted_tokens": 0,
+               "server_ms": 0.0, "load_ms": 0.0}
+    for r in records:
+        tokens = spent_tokens(r)
+        summary["calls"] += 1
+        summary["cached"] += 1 if r.get("cached") else 0
+        summary["tokens"] += tokens
+        if r["outcome"] == ACCEPTED:
+            # A cascade draft shares its verdict with the verify call, which is the one counted
+            if not r.get("verified"):
+                # Batched calls can yield several samples
+                summary["accepted"] += r.get("accepted_samples", 1)
+        else:
+            summary["wasted_tokens"] += tokens
+        if not r.get("cached"):
+            summary["server_ms"] += r.get("total_ms") or r.get("wall_ms") or 0.0
+            summary["load_ms"] += r.get("load_ms") or 0.0
+    return summary
+
+def _per_accepted(value, summary):
+    return value / summary["accepted"] if summary["accepted"] else float("inf")
+
+def _group(records, key):
+    groups = {}
+    for r in records:
+        groups.setdefault(r.get(key) or "(none)", []).append(r)
+    return {name: _summarize(rs) for name, rs in groups.items()}
+
+def print_report(records, top=10):
+    if not records:
+        print("No telemetry records")
+        return
+    total = _summarize(records)
+    print(f"{total['calls']} LLM calls, {total['accepted']} accepted ({total['accepted'] / total['calls']:.1%}), "
+          f"{total['cached']} served from cache")
+    print(f"Tokens: {total['tokens']} processed, {total['wasted_tokens']} on rejected calls "
+          f"({total['wasted_tokens'] / total['tokens'] if total['tokens'] else 0:.1%})")
+    print(f"Cost per accepted example: {_per_accepted(total['tokens'], total):.0f} tokens, "
+          f"{_per_accepted(total['server_ms'], total) / 1000:.2f}s server time "
+          f"(model loading {total['load_ms'] / 1000:.1f}s in total)")
+
+    if any("tier" in r for r in records):
+        print("By tier:")
+        for tier, s in sorted(_group(records, "tier").items()):
+            print(f"  {tier}: {s['calls']} calls, {s['tokens']} tokens "
+                  f"({s['tokens'] / total['tokens'] if total['tokens'] else 0:.1%}), "
+                  f"{s['server_ms'] / 1000:.1f}s server time, "
+                  f"{_per_accepted(s['tokens'], total):.0f} tokens per accepted example")
+
+    outcomes = {}
+    for r in records:
+        if r.get("verified"):
+            continue  # counted by its verify call
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    print("Outcomes:")
+    for outcome, count in sorted(outcomes.items(), key=lambda kv: -kv[1]):
+        print(f"  {outcome}: {count}")
+
+    # Unified records carry a conversation_type, command-intent records a command
+    group_key = "conversation_type" if any("conversation_type" in r for r in records) else "command"
+    print(f"By {group_key} (most wasted tokens first):")
+    groups = _group(records, group_key)
+    for name, s in sorted(groups.items(), key=lambda kv: -kv[1]["wasted_tokens"]):
+        print(f"  {name}: {s['accepted']}/{s['calls']} accepted, {_per_accepted(s['tokens'], s):.0f} tokens/accepted, "
+              f"{s['wasted_tokens']} wasted")
+
+    if any("article" in r for r in records):
+        articles = _group([r for r in records if "article" in r], "article")
+        wasteful = sorted(articles.items(), key=lambda kv: -kv[1]["wasted_tokens"])[:top]
+        chars = {r["article"]: r.get("article_chars") for r in records if "article" in r}
+        print(f"Articles wasting the most tokens (top {len(wasteful)}):")
+        for name, s in wasteful:
+            print(f"  {name} ({chars.get(name) or '?'} chars): {s['accepted']}/{s['calls']} accepted, "
+                  f"{s['wasted_tokens']} wasted")
+
+def main():
+    parser = argparse.ArgumentParser(description='Report token cost per accepted example from generation telemetry')
+    parser.add_argument('metrics_files', nargs='+', help='Telemetry sidecar files (*.metrics.jsonl)')
+    parser.add_argument('--top', type=int, default=10, help='Number of wasteful articles to list')
+    args = parser.parse_args()
+
+    for path in args.metrics_files:
+        print(f"\n{path}")
+        print_report(load_records(path), top=args.top)
+
+if __name__ == "__main__":
+    main()
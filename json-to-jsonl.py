@@ -1,59 +1,322 @@
 #!/usr/bin/env python3
+"""Convert between JSON array datasets and JSONL, streaming in constant memory.
+
+Items are parsed one at a time from the input array (iter_json_array) and written
+straight out, so peak memory is bounded by the largest item rather than the file.
+--reverse turns JSONL back into an indented JSON array the same way. Outputs ending
+in .gz or .zst are compressed (zstd needs the zstandard package), compressed inputs
+are read transparently, and several input files are converted in parallel.
+
+    python json-to-jsonl.py training_data/unified_minecraft_dataset.json
+    python json-to-jsonl.py training_data/*.json --output-dir out --compress gzip --workers 4
+    python json-to-jsonl.py training_data/minecraft_command_intent_dataset.jsonl --reverse
+    python json-to-jsonl.py --benchmark 200000
+"""
 import json
 import os
 import argparse
+import gzip
+import io
+import re
+import resource
+import tempfile
+import time
+import multiprocessing
 from tqdm import tqdm
 
-def convert_json_to_jsonl(input_file, output_file=None):
+# Characters read from the input per refill; an item larger than this is read in
+# doubling chunks until it parses
+CHUNK_SIZE = 1 << 20
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_VALUE_END = " \t\n\r,]"
+
+def compression_of(path):
+    """"gzip", "zstd" or None, from the file extension"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+def open_text(path, mode, compression=None):
+    """Open a text file for "r" or "w", (de)compressing by extension unless compression is given"""
+    compression = compression or compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    if compression == "zstd":
+        zstandard = _zstandard()
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """Yield the items of the JSON array in text file f one at a time
+
+    Only the item being parsed and one chunk of lookahead are held in memory.
+    Raises ValueError if the input isn't a JSON array or is cut off.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size)
+    pos = _WHITESPACE_RE.match(buf).end()
+    # Leading whitespace may run past the first chunk
+    while pos == len(buf):
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buf, pos = chunk, _WHITESPACE_RE.match(chunk).end()
+    if buf[pos:pos + 1] != "[":
+        raise ValueError("Input must contain a JSON array")
+    pos += 1
+    state = "first"  # "first" (value or ]), "value" (after a comma) or "separator" (, or ])
+    read_size = chunk_size
+    eof = False
+    while True:
+        pos = _WHITESPACE_RE.match(buf, pos).end()
+        if pos == len(buf):
+            chunk = "" if eof else f.read(chunk_size)
+            if not chunk:
+                raise ValueError("Unexpected end of input inside the JSON array")
+            buf, pos = chunk, 0
+            continue
+        c = buf[pos]
+        if state == "separator" or (state == "first" and c == "]"):
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"Expected ',' or ']' in the JSON array, got {c!r}")
+            pos += 1
+            state = "value"
+            continue
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f"Invalid item in the JSON array: {e}")
+            item, end = None, None
+        # Inside an array a value is followed by whitespace, "," or "]"; anything else (or
+        # nothing) means it may continue in the next chunk, e.g. a number cut off at "1."
+        if end is None or (not eof and (end == len(buf) or buf[end] not in _VALUE_END)):
+            chunk = f.read(read_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            read_size *= 2
+            continue
+        yield item
+        read_size = chunk_size
+        pos = end
+        state = "separator"
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+def iter_jsonl_lines(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+def _output_path(input_file, reverse=False, compression=None, output_dir=None):
+    """foo.json -> foo.jsonl (foo.jsonl -> foo.json with reverse), plus the compression suffix"""
+    base = input_file
+    if compression_of(base):
+        base = base[:-len(COMPRESSION_SUFFIXES[compression_of(base)])]
+    base = os.path.splitext(base)[0] + (".json" if reverse else ".jsonl")
+    if compression:
+        base += COMPRESSION_SUFFIXES[compression]
+    if output_dir:
+        base = os.path.join(output_dir, os.path.basename(base))
+    return base
+
+def _progress(input_file, f, enabled):
+    """tqdm over the bytes read from the input (compressed bytes for compressed inputs)"""
+    raw = f.buffer if hasattr(f, "buffer") else None
+    if not enabled or raw is None or compression_of(input_file):
+        return None
+    return tqdm(total=os.path.getsize(input_file), unit="B", unit_scale=True, desc="Converting")
+
+def convert_json_to_jsonl(input_file, output_file=None, compression=None, show_progress=True):
     """
     Convert a JSON file (containing an array of objects) to JSONL format.
-    
+
     Args:
-        input_file (str): Path to the input JSON file
-        output_file (str, optional): Path to the output JSONL file. If None, 
+        input_file (str): Path to the input JSON file (.gz/.zst inputs are decompressed)
+        output_file (str, optional): Path to the output JSONL file. If None,
                                      will replace .json with .jsonl
-    
+        compression (str, optional): "gzip" or "zstd"; by default taken from the
+                                     output file's extension
+
     Returns:
         str: Path to the output file
     """
     if output_file is None:
-        output_file = input_file.replace('.json', '.jsonl')
-    
+        output_file = _output_path(input_file, compression=compression)
+    compression = compression or compression_of(output_file)
+
+    print(f"Converting {input_file} to {output_file}...")
+
+    # Written to a temporary file first, so a failed or interrupted run leaves no partial output
+    tmp_file = output_file + ".tmp"
+    count = 0
+    try:
+        with open_text(input_file, 'r') as f, open_text(tmp_file, 'w', compression) as out:
+            bar = _progress(input_file, f, show_progress)
+            for item in iter_json_array(f):
+                out.write(json.dumps(item, ensure_ascii=False) + '\n')
+                count += 1
+                if bar is not None and count % 1000 == 0:
+                    bar.update(f.buffer.tell() - bar.n)
+            if bar is not None:
+                bar.update(bar.total - bar.n)
+                bar.close()
+    except ValueError as e:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise ValueError(f"Input file {input_file}: {e}")
+    os.replace(tmp_file, output_file)
+
+    print(f"Conversion complete! Wrote {count} lines to {output_file}")
+    return output_file
+
+def convert_jsonl_to_json(input_file, output_file=None, compression=None, indent=2):
+    """The reverse of convert_json_to_jsonl: JSONL -> a JSON array, one item at a time"""
+    if output_file is None:
+        output_file = _output_path(input_file, reverse=True, compression=compression)
+    compression = compression or compression_of(output_file)
+
     print(f"Converting {input_file} to {output_file}...")
-    
-    # Read the JSON file
+
+    tmp_file = output_file + ".tmp"
+    count = 0
+    try:
+        with open_text(input_file, 'r') as f, open_text(tmp_file, 'w', compression) as out:
+            out.write("[")
+            for item in iter_jsonl_lines(f):
+                text = json.dumps(item, ensure_ascii=False, indent=indent)
+                if indent:
+                    text = text.replace("\n", "\n" + " " * indent)
+                out.write((",\n" if count else "\n") + " " * (indent or 0) + text)
+                count += 1
+            out.write("\n]" if count else "]")
+    except ValueError as e:
+        # json.JSONDecodeError is a ValueError
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise ValueError(f"Input file {input_file}: {e}")
+    os.replace(tmp_file, output_file)
+
+    print(f"Conversion complete! Wrote {count} items to {output_file}")
+    return output_file
+
+def _convert(job):
+    input_file, output_file, reverse, compression, show_progress = job
+    if reverse:
+        return convert_jsonl_to_json(input_file, output_file, compression)
+    return convert_json_to_jsonl(input_file, output_file, compression, show_progress)
+
+def convert_files(input_files, output_dir=None, reverse=False, compression=None, workers=None):
+    """Convert several files, one worker process per file (up to workers at a time)"""
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count(), len(input_files))
+    jobs = [(input_file, _output_path(input_file, reverse, compression, output_dir), reverse, compression,
+             workers == 1)
+            for input_file in input_files]
+    if workers == 1:
+        return [_convert(job) for job in jobs]
+    with multiprocessing.Pool(processes=workers) as pool:
+        return pool.map(_convert, jobs, chunksize=1)
+
+# ---------------------------------------------------------------------------
+# Benchmark
+
+def _load_and_convert(input_file, output_file):
+    """The old conversion: json.load the whole array, then write it out"""
     with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    
-    # Verify it's a list/array
-    if not isinstance(data, list):
-        raise ValueError(f"Input file {input_file} must contain a JSON array")
-    
-    # Write each object as a separate line in the JSONL file
     with open(output_file, 'w', encoding='utf-8') as f:
-        for item in tqdm(data, desc="Converting"):
-            json_line = json.dumps(item, ensure_ascii=False)
-            f.write(json_line + '\n')
-    
-    print(f"Conversion complete! Wrote {len(data)} lines to {output_file}")
-    return output_file
+        for item in data:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+def _benchmark_child(method, input_file, output_file, results):
+    started = time.perf_counter()
+    if method == "json.load":
+        _load_and_convert(input_file, output_file)
+    elif method == "reverse":
+        convert_jsonl_to_json(input_file, output_file)
+    else:
+        convert_json_to_jsonl(input_file, output_file, show_progress=False)
+    # ru_maxrss is in KiB on Linux; the child is spawned fresh, so this is the conversion's own peak
+    results.put((time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+def _write_benchmark_dataset(path, samples):
+    """A JSON array of training-sample-like items, written incrementally"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for i in range(samples):
+            sample = {"instruction": f"Player {i}: how do I craft a stone pickaxe? ({i % 97})",
+                      "input": "",
+                      "output": "<thinking>\nThey need the recipe.\n</thinking>\n\n"
+                                + "Three cobblestone across the top, two sticks down the middle. " * (1 + i % 4),
+                      "conversation_type": "crafting_help"}
+            f.write((",\n  " if i else "\n  ") + json.dumps(sample, indent=2).replace("\n", "\n  "))
+        f.write("\n]")
+
+def benchmark(samples):
+    """Time and measure the peak memory of each conversion method in a fresh process"""
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="json_to_jsonl_") as work_dir:
+        json_file = os.path.join(work_dir, "dataset.json")
+        _write_benchmark_dataset(json_file, samples)
+        size_mb = os.path.getsize(json_file) / 1e6
+        print(f"Benchmark dataset: {samples} items, {size_mb:.1f} MB")
+        runs = [("json.load", json_file, os.path.join(work_dir, "loaded.jsonl")),
+                ("stream", json_file, os.path.join(work_dir, "streamed.jsonl")),
+                ("stream+gzip", json_file, os.path.join(work_dir, "streamed.jsonl.gz")),
+                ("reverse", os.path.join(work_dir, "streamed.jsonl"), os.path.join(work_dir, "reversed.json"))]
+        for method, input_file, output_file in runs:
+            results = ctx.Queue()
+            child = ctx.Process(target=_benchmark_child, args=(method, input_file, output_file, results))
+            child.start()
+            seconds, peak_mb = results.get()
+            child.join()
+            input_mb = os.path.getsize(input_file) / 1e6
+            print(f"  {method:<12} {seconds:6.2f}s  {input_mb / seconds:7.1f} MB/s  "
+                  f"{samples / seconds:9.0f} items/s  peak RSS {peak_mb:7.1f} MB  "
+                  f"output {os.path.getsize(output_file) / 1e6:.1f} MB")
 
 def main():
     parser = argparse.ArgumentParser(description='Convert JSON files to JSONL format')
-    parser.add_argument('input_files', nargs='+', help='Input JSON file paths')
+    parser.add_argument('input_files', nargs='*', help='Input JSON file paths')
     parser.add_argument('--output-dir', help='Output directory (optional)')
-    
+    parser.add_argument('--reverse', action='store_true', help='Convert JSONL files to JSON arrays instead')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_SUFFIXES), help='Compress the output files')
+    parser.add_argument('--workers', type=int, default=None, help='Files converted at once (default: CPU count)')
+    parser.add_argument('--benchmark', type=int, metavar='ITEMS',
+                        help='Measure conversion throughput on a synthetic dataset of this many items')
+
     args = parser.parse_args()
-    
-    for input_file in args.input_files:
-        if args.output_dir:
-            base_name = os.path.basename(input_file).replace('.json', '.jsonl')
-            output_file = os.path.join(args.output_dir, base_name)
-            os.makedirs(args.output_dir, exist_ok=True)
-        else:
-            output_file = None
-            
-        convert_json_to_jsonl(input_file, output_file)
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if not args.input_files:
+        parser.error("no input files given")
+    if args.compress == "zstd":
+        try:
+            _zstandard()
+        except ValueError as e:
+            parser.error(str(e))
+    convert_files(args.input_files, args.output_dir, args.reverse, args.compress, args.workers)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
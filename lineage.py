@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Lineage index linking generated examples to the wiki article content they came from.
+
+A sidecar next to the dataset (e.g. unified_minecraft_dataset.lineage.json) maps each
+example's id to its source article key and the hash of that article's content at
+generation time. After a re-scrape, examples whose article changed or disappeared
+can be found and regenerated without touching the rest of the dataset.
+
+    python lineage.py --backfill      # adopt existing examples against the current scrape (once)
+    python lineage.py                 # report stale examples after a re-scrape
+    python lineage.py --regenerate    # invalidate and regenerate only the stale examples
+"""
+import argparse
+import hashlib
+import json
+import os
+from article_sampler import article_key, source_to_key
+
+LINEAGE_VERSION = 1
+
+def lineage_path(dataset_path):
+    """Sidecar path for a dataset: foo.json -> foo.lineage.json"""
+    return os.path.splitext(dataset_path)[0] + ".lineage.json"
+
+def example_id(example):
+    """Stable id for an example, from the text that makes it unique"""
+    text = example.get("instruction", "") + "\0" + example.get("output", "")
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def content_hash(article):
+    return hashlib.sha256(article.get("content", "").encode("utf-8")).hexdigest()[:16]
+
+def corpus_hashes(wiki_data):
+    """Article key -> content hash for a scrape"""
+    return {article_key(category, a): content_hash(a) for category, articles in wiki_data.items() for a in articles or []}
+
+class LineageIndex:
+    """Example id -> {"article": key, "content_hash": hash}, persisted as JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get("examples", {})
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Error loading lineage index {path}, starting empty: {e}")
+
+    def record(self, example, key, article):
+        self.entries[example_id(example)] = {"article": key, "content_hash": content_hash(article)}
+
+    def get(self, example):
+        return self.entries.get(example_id(example))
+
+    def forget(self, example):
+        self.entries.pop(example_id(example), None)
+
+    def prune(self, examples):
+        """Drop entries for examples no longer in the dataset"""
+        ids = {example_id(e) for e in examples}
+        self.entries = {k: v for k, v in self.entries.items() if k in ids}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": LINEAGE_VERSION, "examples": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def backfill(self, examples, wiki_data):
+        """Assume examples without lineage came from the current scrape of their `source` article"""
+        articles = {article_key(c, a): a for c, articles in wiki_data.items() for a in articles or []}
+        added = 0
+        for example in examples:
+            if self.get(example) is not None:
+                continue
+            key = source_to_key(example.get("source"))
+            if key in articles:
+                self.record(example, key, articles[key])
+                added += 1
+        return added
+
+    def classify(self, examples, hashes):
+        """Split dataset positions into unchanged, changed (article edited), deleted and untracked"""
+        status = {"unchanged": [], "changed": [], "deleted": [], "untracked": []}
+        for i, example in enumerate(examples):
+            entry = self.get(example)
+            if entry is None:
+                status["untracked"].append(i)
+            elif entry["article"] not in hashes:
+                status["deleted"].append(i)
+            elif hashes[entry["article"]] != entry["content_hash"]:
+                status["changed"].append(i)
+            else:
+                status["unchanged"].append(i)
+        return status
+
+def print_status(status, lineage=None, examples=None, top=10):
+    total = sum(len(v) for v in status.values())
+    print(f"Lineage: {total} examples - {len(status['unchanged'])} unchanged, {len(status['changed'])} from edited "
+          f"articles, {len(status['deleted'])} from deleted articles, {len(status['untracked'])} untracked")
+    if lineage is None or examples is None:
+        return
+    stale = {}
+    for i in status["changed"] + status["deleted"]:
+        key = lineage.get(examples[i])["article"]
+        stale[key] = stale.get(key, 0) + 1
+    for key, count in sorted(stale.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {key}: {count} stale examples")
+
+def main():
+    parser = argparse.ArgumentParser(description='Track which wiki article version each generated example came from')
+    parser.add_argument('--dataset', default=os.path.join("training_data", "unified_minecraft_dataset.json"),
+                        help='Dataset to check')
+    parser.add_argument('--wiki-data', default=os.path.join("raw_data", "all_minecraft_data.json"),
+                        help='Current scrape')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Record untracked examples against the current scrape (run before re-scraping)')
+    parser.add_argument('--regenerate', action='store_true',
+                        help='Replace examples from edited articles and drop those from deleted ones')
+    parser.add_argument('--model', default="llama3.2:latest", help='Model for regeneration')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for regeneration')
+    parser.add_argument('--structured', action='store_true', help='Regenerate with schema-constrained JSON output')
+    parser.add_argument('--verify-model', default=None, help='Review regenerated examples with this model')
+    parser.add_argument('--verify-mode', choices=["review", "rewrite"], default="review",
+                        help='Cascade mode for --verify-model')
+    args = parser.parse_args()
+
+    with open(args.wiki_data, 'r') as f:
+        wiki_data = json.load(f)
+    with open(args.dataset, 'r') as f:
+        examples = json.load(f)
+
+    lineage = LineageIndex(lineage_path(args.dataset))
+    if args.backfill:
+        added = lineage.backfill(examples, wiki_data)
+        lineage.save()
+        print(f"Backfilled lineage for {added} examples")
+
+    if args.regenerate:
+        from unified_dataset import regenerate_stale_examples
+        regenerate_stale_examples(args.dataset, wiki_data, model=args.model, seed=args.seed,
+                                  structured=args.structured, verify_model=args.verify_model,
+                                  verify_mode=args.verify_mode)
+    else:
+        print_status(lineage.classify(examples, corpus_hashes(wiki_data)), lineage, examples)
+
+if __name__ == "__main__":
+    main()
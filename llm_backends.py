@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Default connection pool size per backend (roughly the max number of in-flight requests)
+POOL_SIZE = 16
+# (connect, read) timeouts in seconds; for streams the read timeout is the max gap between chunks
+DEFAULT_TIMEOUT = (10, 300)
+# How long Ollama keeps a model resident after a request (its own default is 5m);
+# sent with every request so an idle gap between batches doesn't unload the model
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+# Failure taxonomy used for retry decisions
+FAILURE_TIMEOUT = "timeout"
+FAILURE_CONNECTION = "connection"
+FAILURE_OVERLOAD = "overload"          # 429/503: the server is saturated, back off
+FAILURE_SERVER_ERROR = "server_error"  # other 5xx
+FAILURE_CLIENT_ERROR = "client_error"  # 4xx: retrying won't help
+FAILURE_PARSE_ERROR = "parse_error"    # the server answered but the body was unusable
+
+class LLMBackendError(Exception):
+    """Raised when a backend call fails (status_code is None for connection errors)"""
+
+    def __init__(self, message, status_code=None, kind=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.kind = kind or classify_status(status_code)
+
+def classify_status(status_code):
+    if status_code is None:
+        return FAILURE_CONNECTION
+    if status_code in (429, 503):
+        return FAILURE_OVERLOAD
+    if status_code >= 500:
+        return FAILURE_SERVER_ERROR
+    return FAILURE_CLIENT_ERROR
+
+def classify_exception(e):
+    if isinstance(e, requests.Timeout):
+        return FAILURE_TIMEOUT
+    if isinstance(e, (ValueError, requests.exceptions.ChunkedEncodingError)):
+        return FAILURE_PARSE_ERROR
+    return FAILURE_CONNECTION
+
+class LLMBackend:
+    """Base class for text generation backends.
+
+    generate() returns a dict with:
+        text:    the generated text
+        metrics: whatever timing/token counters the server reported
+        aborted: True if on_chunk asked us to stop early
+        chunks:  number of streamed chunks received (~tokens for Ollama)
+        ttft:    seconds until the first token arrived (whole call when not streaming)
+    """
+
+    name = "base"
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT, pool_size=POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # One pooled session per backend so keep-alive connections are reused across calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, model, prompt, temperature=None, max_tokens=None, options=None,
+                 stream=False, on_chunk=None, format=None, keep_alive=None):
+        """Generate a completion for prompt.
+
+        options uses Ollama option names (num_ctx, seed, stop, ...); each backend maps
+        them to its own request format. When streaming, on_chunk(text_so_far) is called
+        after every chunk and may return False to cancel the request. format is an
+        optional JSON schema the output must follow. keep_alive is how long the server
+        should keep the model loaded afterwards (ignored by single-model servers).
+        """
+        raise NotImplementedError
+
+    def load_model(self, model, keep_alive=None):
+        """Load model without generating; returns the load time in ms, or None if the server can't say"""
+        return None
+
+    def unload_model(self, model):
+        pass
+
+    def _post(self, path, payload, stream):
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, stream=stream, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise LLMBackendError(f"{self.name} request failed: {e}", kind=classify_exception(e)) from e
+
+        if response.status_code != 200:
+            body = response.text[:500]
+            response.close()
+            raise LLMBackendError(f"{self.name} returned {response.status_code}: {body}", status_code=response.status_code)
+        return response
+
+    def _json(self, response):
+        try:
+            return response.json()
+        except ValueError as e:
+            raise LLMBackendError(f"{self.name} returned invalid JSON: {e}", kind=FAILURE_PARSE_ERROR) from e
+
+    def _read_stream(self, response, parse_line, on_chunk, started):
+        """Accumulate streamed chunks, stopping early if on_chunk returns False"""
+        ttft = None
+        text = ""
+        metrics = {}
+        aborted = False
+        chunks = 0
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                piece, done, line_metrics = parse_line(line.decode("utf-8"))
+                metrics.update(line_metrics)
+                if piece:
+                    if ttft is None:
+                        ttft = time.time() - started
+                    text += piece
+                    chunks += 1
+                    if on_chunk is not None and on_chunk(text) is False:
+                        aborted = True
+                        break
+                if done:
+                    break
+        except requests.RequestException as e:
+            raise LLMBackendError(f"{self.name} stream failed: {e}", kind=classify_exception(e)) from e
+        finally:
+            # Closing the response drops the connection, which cancels generation server-side
+            response.close()
+        return {"text": text, "metrics": metrics, "aborted": aborted, "chunks": chunks,
+                "ttft": ttft if ttft is not None else time.time() - started}
+
+class OllamaBackend(LLMBackend):
+    """Ollama /api/generate"""
+
+    name = "ollama"
+
+    def generate(self, model, prompt, temperature=None, max_tokens=None, options=None,
+                 stream=False, on_chunk=None, format=None, keep_alive=None):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": dict(options or {}),
+            "keep_alive": keep_alive if keep_alive is not None else DEFAULT_KEEP_ALIVE
+        }
+        # Ollama only reads sampling settings and the output limit from options
+        if temperature is not None:
+            payload["options"]["temperature"] = temperature
+        if max_tokens is not None:
+            payload["options"]["num_predict"] = max_tokens
+        if format is not None:
+            payload["format"] = format
+
+        started = time.time()
+        response = self._post("/api/generate", payload, stream)
+        if not stream:
+            data = self._json(response)
+            metrics = _ollama_metrics(data)
+            return {"text": data.get("response", ""), "metrics": metrics, "aborted": False,
+                    "chunks": metrics.get("eval_count", 0), "ttft": time.time() - started}
+
+        def parse_line(line):
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON from line: {line[:100]}")
+                return "", False, {}
+            done = data.get("done", False)
+            return data.get("response", ""), done, _ollama_metrics(data) if done else {}
+
+        return self._read_stream(response, parse_line, on_chunk, started)
+
+    def load_model(self, model, keep_alive=None):
+        # A request without a prompt only loads the model (and refreshes its keep_alive)
+        payload = {"model": model, "keep_alive": keep_alive if keep_alive is not None else DEFAULT_KEEP_ALIVE}
+        data = self._json(self._post("/api/generate", payload, False))
+        return round(data.get("load_duration", 0) / 1e6, 1)
+
+    def unload_model(self, model):
+        self._post("/api/generate", {"model": model, "keep_alive": 0}, False).close()
+
+def _ollama_metrics(data):
+    keys = ["prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration",
+            "load_duration", "total_duration", "done_reason"]
+    return {k: data[k] for k in keys if k in data}
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI-compatible /v1/completions (llama.cpp server, vLLM, ...)"""
+
+    name = "openai"
+
+    # Ollama option names -> OpenAI request fields
+    OPTION_MAP = {
+        "seed": "seed",
+        "stop": "stop",
+        "top_p": "top_p",
+        "num_predict": "max_tokens",
+        "temperature": "temperature",
+        "repeat_penalty": "repetition_penalty",
+    }
+
+    def generate(self, model, prompt, temperature=None, max_tokens=None, options=None,
+                 stream=False, on_chunk=None, format=None, keep_alive=None):
+        payload = {"model": model, "prompt": prompt, "stream": stream}
+        for key, value in (options or {}).items():
+            if key in self.OPTION_MAP:
+                payload[self.OPTION_MAP[key]] = value
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if format is not None:
+            # Grammar-constrained decoding: llama.cpp reads json_schema, vLLM reads guided_json
+            payload["json_schema"] = format
+            payload["guided_json"] = format
+
+        started = time.time()
+        response = self._post("/v1/completions", payload, stream)
+        if not stream:
+            data = self._json(response)
+            choice = (data.get("choices") or [{}])[0]
+            metrics = _openai_metrics(data, choice)
+            return {"text": choice.get("text", ""), "metrics": metrics, "aborted": False,
+                    "chunks": metrics.get("eval_count", 0), "ttft": time.time() - started}
+
+        def parse_line(line):
+            if not line.startswith("data:"):
+                return "", False, {}
+            body = line[len("data:"):].strip()
+            if body == "[DONE]":
+                return "", True, {}
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON from line: {body[:100]}")
+                return "", False, {}
+            choice = (data.get("choices") or [{}])[0]
+            return choice.get("text", ""), False, _openai_metrics(data, choice)
+
+        return self._read_stream(response, parse_line, on_chunk, started)
+
+def _openai_metrics(data, choice):
+    metrics = {}
+    usage = data.get("usage") or {}
+    if "prompt_tokens" in usage:
+        metrics["prompt_eval_count"] = usage["prompt_tokens"]
+    if "completion_tokens" in usage:
+        metrics["eval_count"] = usage["completion_tokens"]
+    if choice.get("finish_reason"):
+        metrics["done_reason"] = choice["finish_reason"]
+    return metrics
+
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "openai": OpenAIBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def split_api_url(api_url):
+    """Turn a full endpoint URL into (kind, base_url), e.g. .../api/generate -> ollama"""
+    url = api_url.rstrip("/")
+    for suffix, kind in [("/api/generate", "ollama"), ("/v1/completions", "openai"), ("/v1", "openai")]:
+        if url.endswith(suffix):
+            return kind, url[:-len(suffix)]
+    return "ollama", url
+
+def get_backend(api_url, kind=None):
+    """Return a shared (connection-pooled) backend for api_url"""
+    inferred_kind, base_url = split_api_url(api_url)
+    kind = kind or inferred_kind
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{kind}', expected one of {list(BACKENDS)}")
+
+    with _backends_lock:
+        key = (kind, base_url)
+        if key not in _backends:
+            _backends[key] = BACKENDS[kind](base_url)
+        return _backends[key]
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Default cache location and limits (override with environment variables)
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite"))
+LLM_CACHE_MODE = os.environ.get("LLM_CACHE_MODE", "readwrite")  # readwrite, replay or off
+LLM_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "512"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "200000"))
+
+CACHE_MODES = ("readwrite", "replay", "off")
+
+def cache_key(model, prompt, options=None, seed=None):
+    """Content hash of everything that determines a generation"""
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "options": options or {},
+        "seed": seed
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """Disk-backed LLM response cache with LRU eviction.
+
+    Modes:
+        readwrite: serve hits, store misses (default)
+        replay:    serve hits only, never write; misses must not reach the LLM
+        off:       every lookup is a miss and nothing is stored
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, mode=LLM_CACHE_MODE, max_mb=LLM_CACHE_MAX_MB,
+                 max_entries=LLM_CACHE_MAX_ENTRIES):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+
+        self.path = path
+        self.mode = mode
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if mode == "off":
+            return
+
+        if mode == "replay":
+            if not os.path.exists(path):
+                print(f"Warning: replay mode but no cache found at {path}, every call will miss")
+                return
+            # Open read-only so a replay can never change the cache
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @property
+    def replay(self):
+        return self.mode == "replay"
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        if self._conn is None:
+            self.misses += 1
+            return None
+
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if self.mode == "readwrite":
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, key, value, model=""):
+        """Store a JSON-serialisable value under key (no-op unless in readwrite mode)"""
+        if self.mode != "readwrite" or self._conn is None:
+            return
+
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data.encode("utf-8")), now, now)
+            )
+            self.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until we are back under the limits"""
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        to_delete = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            count -= 1
+            total -= size
+
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self.evictions += len(to_delete)
+
+    def stats(self):
+        """Return hit/miss counters plus current cache size"""
+        entries, size = 0, 0
+        if self._conn is not None:
+            with self._lock:
+                entries, size = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_mb": size / (1024 * 1024)
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"LLM cache ({s['mode']}): {s['hits']} hits, {s['misses']} misses "
+              f"({s['hit_rate']:.1%} hit rate), {s['writes']} writes, {s['evictions']} evictions, "
+              f"{s['entries']} entries / {s['size_mb']:.1f} MB")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# Shared cache used by both generators
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Return the process-wide cache configured from the LLM_CACHE_* settings"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
+
+def cached_generate(generate_fn, model, prompt, options=None, seed=None, cache=None, telemetry=None):
+    """Look up a generation in the cache, calling generate_fn() only on a miss.
+
+    generate_fn takes no arguments and returns the response text (or None/"" on failure).
+    Failed generations are not cached. In replay mode a miss returns None without
+    calling generate_fn. If a telemetry dict is given, generate_fn fills it on a miss and
+    it is stored with the response; a hit restores it with "cached" set.
+
+    Only seeded calls are cached: without a seed, a repeated prompt is meant to get a
+    fresh sample, so the cache is bypassed (and replay mode has nothing to serve).
+    """
+    cache = cache or get_llm_cache()
+    if seed is None:
+        if cache.replay:
+            print("Replay mode: unseeded calls are never cached, skipping LLM call")
+            return None
+        response = generate_fn()
+        if telemetry is not None:
+            telemetry.setdefault("cached", False)
+        return response
+    key = cache_key(model, prompt, options, seed)
+
+    cached = cache.get(key)
+    if cached is not None:
+        if telemetry is not None:
+            telemetry.update(cached.get("telemetry", {}), cached=True)
+        return cached["response"]
+
+    if cache.replay:
+        print(f"Replay mode: no cached response for key {key[:12]}, skipping LLM call")
+        return None
+
+    response = generate_fn()
+    if telemetry is not None:
+        telemetry.setdefault("cached", False)
+    if response:
+        value = {"response": response}
+        if telemetry:
+            value["telemetry"] = {k: v for k, v in telemetry.items() if k != "cached"}
+        cache.put(key, value, model=model)
+    return response
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or clear the LLM response cache')
+    parser.add_argument('--path', default=LLM_CACHE_PATH, help='Cache database path')
+    parser.add_argument('--clear', action='store_true', help='Delete every cached response')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No cache found at {args.path}")
+        return
+
+    if args.clear:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+        print(f"Deleted cache at {args.path}")
+        return
+
+    cache = LLMCache(path=args.path, mode="replay")
+    cache.print_stats()
+    with cache._lock:
+        rows = cache._conn.execute(
+            "SELECT model, COUNT(*), SUM(size) FROM responses GROUP BY model ORDER BY COUNT(*) DESC"
+        ).fetchall()
+    for model, count, size in rows:
+        print(f"  {model or '(unknown)'}: {count} responses, {size / 1024:.1f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import threading
+import time
+from llm_backends import LLMBackendError, get_backend
+from llm_cache import cached_generate
+from llm_resilience import ResilientBackend
+from model_residency import get_residency
+
+# Counters for streamed generations that were cancelled early by a stream_check
+STREAM_STATS = {
+    "streamed_calls": 0,
+    "aborted_calls": 0,
+    "tokens_streamed": 0,
+    "tokens_saved": 0,  # upper bound: unused part of the max_tokens/num_predict budget
+    "abort_reasons": {}
+}
+_stats_lock = threading.Lock()
+
+# One resilient wrapper (retries, breaker, AIMD limit) per pooled backend
+_resilient_backends = {}
+_resilient_lock = threading.Lock()
+
+def get_resilient_backend(api_url, kind=None):
+    backend = get_backend(api_url, kind=kind)
+    with _resilient_lock:
+        if id(backend) not in _resilient_backends:
+            _resilient_backends[id(backend)] = ResilientBackend(backend)
+        return _resilient_backends[id(backend)]
+
+def get_backend_stats():
+    """Client-side call statistics summed over every backend used in this process"""
+    with _resilient_lock:
+        backends = list(_resilient_backends.values())
+    totals = {"calls": 0, "attempts": 0, "retries": 0, "succeeded": 0, "failed": 0,
+              "short_circuited": 0, "backoff_seconds": 0.0}
+    for backend in backends:
+        stats = backend.snapshot_stats()
+        for key in totals:
+            totals[key] += stats[key]
+    return totals
+
+def print_backend_stats():
+    with _resilient_lock:
+        backends = list(_resilient_backends.values())
+    for backend in backends:
+        backend.print_stats()
+
+def call_telemetry(result, started):
+    """Token counts and timings for one backend call, durations in milliseconds"""
+    metrics = result["metrics"]
+    telemetry = {
+        "prompt_tokens": metrics.get("prompt_eval_count"),
+        # An aborted stream never gets the server's final counters, so count the tokens received
+        "eval_tokens": metrics.get("eval_count", result["chunks"]),
+        "ttft_ms": round(result["ttft"] * 1000, 1) if result.get("ttft") is not None else None,
+        "wall_ms": round((time.time() - started) * 1000, 1),
+        "done_reason": metrics.get("done_reason"),
+    }
+    for key in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+        if key in metrics:
+            telemetry[key.replace("_duration", "_ms")] = round(metrics[key] / 1e6, 1)
+    return telemetry
+
+def generate(api_url, model, prompt, temperature=None, max_tokens=None, options=None, seed=None,
+             stream=False, stream_check=None, format=None, kind=None, telemetry=None, keep_alive=None):
+    """Shared generation path for both dataset generators.
+
+    Looks the request up in the LLM response cache and only calls the backend behind
+    api_url on a miss; calls without a seed always go to the backend. Returns the
+    generated text, or None if the call failed.
+
+    stream_check(text_so_far) may return a rejection reason; the generation is then
+    streamed and cancelled as soon as the check fires, and None is returned.
+
+    format is an optional JSON schema to constrain the output to. keep_alive overrides
+    how long the server keeps the model loaded (DEFAULT_KEEP_ALIVE).
+
+    If a telemetry dict is passed it is filled with the call's token counts and timings
+    (see call_telemetry), plus "cached", "aborted" and "error". Cache hits report the
+    counters of the call that produced the cached response.
+    """
+    options = dict(options or {})
+    if seed is not None:
+        options["seed"] = seed
+
+    backend = get_resilient_backend(api_url, kind=kind)
+    residency = get_residency(api_url, kind=kind)
+    budget = max_tokens or options.get("num_predict")
+
+    def _call_backend():
+        abort_reason = []
+        started = time.time()
+
+        def on_chunk(text):
+            reason = stream_check(text)
+            if reason:
+                abort_reason.append(reason)
+                return False
+            return True
+
+        try:
+            result = backend.generate(model, prompt, temperature=temperature, max_tokens=max_tokens,
+                                      options=options, stream=stream or stream_check is not None,
+                                      on_chunk=on_chunk if stream_check else None, format=format,
+                                      keep_alive=keep_alive)
+        except LLMBackendError as e:
+            print(f"Error from {backend.name} backend ({e.kind}): {e}")
+            if telemetry is not None:
+                telemetry["error"] = e.kind
+            return None
+
+        load_duration = result["metrics"].get("load_duration")
+        residency.observe(model, load_duration / 1e6 if load_duration is not None else None)
+        if telemetry is not None:
+            telemetry.update(call_telemetry(result, started), aborted=result["aborted"])
+        if stream_check is not None:
+            _record_stream(result, abort_reason[0] if abort_reason else None, budget)
+        if result["aborted"]:
+            print(f"Aborted generation after {result['chunks']} tokens: {abort_reason[0]}")
+            return None
+        return result["text"]
+
+    cache_options = dict(options, temperature=temperature, max_tokens=max_tokens)
+    if format is not None:
+        cache_options["format"] = format
+    return cached_generate(_call_backend, model, prompt, options=cache_options, seed=seed, telemetry=telemetry)
+
+def _record_stream(result, abort_reason, budget):
+    with _stats_lock:
+        STREAM_STATS["streamed_calls"] += 1
+        STREAM_STATS["tokens_streamed"] += result["chunks"]
+        if abort_reason:
+            STREAM_STATS["aborted_calls"] += 1
+            STREAM_STATS["abort_reasons"][abort_reason] = STREAM_STATS["abort_reasons"].get(abort_reason, 0) + 1
+            if budget:
+                STREAM_STATS["tokens_saved"] += max(0, budget - result["chunks"])
+
+def print_stream_stats():
+    with _stats_lock:
+        s = dict(STREAM_STATS, abort_reasons=dict(STREAM_STATS["abort_reasons"]))
+    if not s["streamed_calls"]:
+        return
+    print(f"Streaming: {s['aborted_calls']}/{s['streamed_calls']} generations aborted early, "
+          f"{s['tokens_streamed']} tokens streamed, ~{s['tokens_saved']} tokens saved")
+    for reason, count in sorted(s["abort_reasons"].items(), key=lambda kv: -kv[1]):
+        print(f"  {reason}: {count}")
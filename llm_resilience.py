@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+from llm_backends import (
+    FAILURE_CLIENT_ERROR, FAILURE_CONNECTION, FAILURE_OVERLOAD, FAILURE_PARSE_ERROR,
+    FAILURE_SERVER_ERROR, FAILURE_TIMEOUT, POOL_SIZE, LLMBackendError
+)
+
+# Failures worth retrying; client errors (bad request, unknown model) never are
+RETRYABLE_FAILURES = {FAILURE_TIMEOUT, FAILURE_CONNECTION, FAILURE_OVERLOAD, FAILURE_SERVER_ERROR, FAILURE_PARSE_ERROR}
+
+class CircuitOpenError(LLMBackendError):
+    """Raised without calling the server while the circuit breaker is open"""
+
+    def __init__(self, message):
+        super().__init__(message, kind="circuit_open")
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, kind=None):
+        """Seconds to sleep before retry number `attempt` (1-based)"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        if kind == FAILURE_OVERLOAD:
+            # Give a saturated server longer to drain its queue
+            cap = min(self.max_delay, cap * 2)
+        return random.uniform(0, cap)
+
+class CircuitBreaker:
+    """Stops sending requests after repeated failures, then probes with one request.
+
+    closed -> open after failure_threshold consecutive failures
+    open -> half_open after reset_timeout seconds
+    half_open -> closed on success, back to open on failure
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def cancel_probe(self):
+        """Forget a half-open probe whose outcome says nothing about the server"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.time()
+                self._probe_in_flight = False
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease concurrency limit driven by latency.
+
+    The limit grows by 1/limit per healthy call (so +1 per "round") and is halved
+    when a call times out, the server reports overload, or latency rises above
+    latency_tolerance x the best latency seen recently. Latency is time to first
+    token, which is where server-side queueing shows up regardless of how long the
+    output is. Callers beyond the limit wait here instead of piling onto the
+    server's queue.
+    """
+
+    def __init__(self, initial=2, min_limit=1, max_limit=POOL_SIZE, latency_tolerance=2.0, decrease_factor=0.5):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.decreases = 0
+        self.baseline_drift = 0.001
+        self._last_decrease = 0.0
+        self._last_observed = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, overloaded=False):
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self._decrease()
+            elif latency is not None:
+                self._observe(latency)
+            self._cond.notify_all()
+
+    def _observe(self, latency):
+        now = time.time()
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+        else:
+            # Slowly forget the best latency (~0.1%/s) so the baseline can follow model/prompt changes
+            drift = 1 + self.baseline_drift * (now - self._last_observed)
+            self.baseline_latency = min(latency, self.baseline_latency * drift)
+        self._last_observed = now
+
+        if latency > self.baseline_latency * self.latency_tolerance:
+            self._decrease()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        # At most one decrease per baseline latency, so one burst of slow calls halves once
+        now = time.time()
+        if now - self._last_decrease < (self.baseline_latency or 0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        self.decreases += 1
+
+class ResilientBackend:
+    """Wraps a backend with retries, a circuit breaker and AIMD concurrency control"""
+
+    def __init__(self, backend, retry_policy=None, breaker=None, limiter=None):
+        self.backend = backend
+        self.name = backend.name
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AIMDLimiter()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "succeeded": 0, "failed": 0,
+                      "short_circuited": 0, "backoff_seconds": 0.0, "failures": {}}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, failure_kind=None):
+        with self._stats_lock:
+            self.stats[key] += 1
+            if failure_kind:
+                self.stats["failures"][failure_kind] = self.stats["failures"].get(failure_kind, 0) + 1
+
+    def generate(self, *args, **kwargs):
+        self._count("calls")
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                raise CircuitOpenError(f"{self.name} circuit breaker is open, not calling the server")
+
+            self.limiter.acquire()
+            started = time.time()
+            try:
+                self._count("attempts")
+                result = self.backend.generate(*args, **kwargs)
+            except LLMBackendError as e:
+                self.limiter.release(overloaded=e.kind in (FAILURE_OVERLOAD, FAILURE_TIMEOUT))
+                retry = e.kind in RETRYABLE_FAILURES and attempt < self.retry_policy.max_attempts
+                self._count("retries" if retry else "failed", e.kind)
+                if e.kind == FAILURE_CLIENT_ERROR:
+                    # A bad request says nothing against the server: it answered, which also
+                    # settles a half-open probe
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                if not retry:
+                    raise
+                delay = self.retry_policy.delay(attempt, e.kind)
+                print(f"{self.name} call failed ({e.kind}), retry {attempt}/{self.retry_policy.max_attempts - 1} in {delay:.1f}s")
+                with self._stats_lock:
+                    self.stats["backoff_seconds"] += delay
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Neither a response nor a server failure (a decode error, an exception from
+                # on_chunk): give the slot back and let the next call probe
+                self.limiter.release()
+                self.breaker.cancel_probe()
+                raise
+
+            self.limiter.release(latency=result.get("ttft", time.time() - started))
+            self.breaker.record_success()
+            self._count("succeeded")
+            return result
+
+    def snapshot_stats(self):
+        with self._stats_lock:
+            return dict(self.stats, failures=dict(self.stats["failures"]))
+
+    def print_stats(self):
+        s = self.snapshot_stats()
+        print(f"{self.name} client: {s['succeeded']}/{s['calls']} calls succeeded, {s['retries']} retries, "
+              f"{s['failed']} failed, {s['short_circuited']} short-circuited, "
+              f"concurrency limit {self.limiter.limit:.1f}, breaker {self.breaker.state} "
+              f"(opened {self.breaker.times_opened}x)")
+        for kind, count in sorted(s["failures"].items(), key=lambda kv: -kv[1]):
+            print(f"  {kind}: {count}")
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""Deterministic local mock of an Ollama / OpenAI-compatible inference server.
+
+Emits well-formed outputs for the prompts used by unified_dataset.py and
+command_intent_dataset_generator.py, with configurable latency, token rate and
+injected failure rate, so the generators can be load-tested and benchmarked on a
+CPU-only box. With --load-time and --max-loaded-models it also simulates Ollama's
+model residency (loads, keep_alive expiry, LRU eviction) for mixed-model runs.
+num_predict/max_tokens and stop sequences are honoured, and --ramble-rate makes a
+fraction of outputs run on (repeating themselves) the way real models sometimes do.
+
+    python mock_llm_server.py --port 11435 --latency 0.2 --tokens-per-sec 80 --failure-rate 0.05
+    python mock_llm_server.py --load-time 2 --max-loaded-models 1
+    OLLAMA_API=http://localhost:11435/api/generate python unified_dataset.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 11435
+
+QUESTION_TEMPLATES = [
+    "how do i get {title} in survival?",
+    "whats the fastest way to deal with {title}?",
+    "any tips for {title}? kinda stuck",
+    "is {title} worth the effort early game?",
+    "where do i even start with {title}",
+    "what should i know about {title} before i try it",
+]
+
+RESPONSE_OPENERS = ["tbh", "honestly", "imo", "afaik", "fwiw", "basically"]
+
+RESPONSE_STEPS = [
+    "first you need a decent pickaxe, iron at least",
+    "then craft a few torches so you don't get jumped in the dark",
+    "next find a spot near your base and just use what you have",
+    "you should bring food and a bucket of water",
+    "after that place a crafting table nearby to save trips",
+    "avoid fighting in the open if you can, run and build a quick pillar",
+    "finally check the recipe grid, it's pretty simple once you see the pattern",
+    "start with wood and stone tools, it's not worth wasting iron yet",
+]
+
+RESPONSE_CLOSERS = ["ymmv", "works for me every time", "gl", "not rocket science lol", "easy once you've done it once"]
+
+USER_TEMPLATES = [
+    "hey can you {action}",
+    "{action} pls",
+    "yo {name}, {action}",
+    "could you {action} real quick",
+    "need you to {action}",
+]
+
+BOT_TEMPLATES = ["On it! {call}", "Sure thing. {call}", "Got it. {call}", "Okay! {call}", "Yep, {call}"]
+
+SAMPLE_ARGS = {
+    "player_name": ["steve", "alex", "zoe"],
+    "item_name": ["oak_log", "torch", "bread", "cobblestone"],
+    "recipe_name": ["torch", "crafting_table", "stone_pickaxe"],
+    "type": ["iron_ore", "oak_log", "stone", "sand"],
+    "name": ["base", "mine", "farm"],
+    "mode_name": ["hunting", "self_defense"],
+    "selfPrompt": ["build a small house", "collect 10 oak logs"],
+    "prompt": ["build a small house", "mine some iron"],
+    "message": ["hi there", "want to go mining?"],
+}
+# Commands whose "type" is a mob rather than a block; !stay's is a number of seconds
+SAMPLE_MOBS = ["zombie", "skeleton", "cow", "villager"]
+ENTITY_COMMANDS = {"searchForEntity", "attack"}
+
+DEFAULT_KEEP_ALIVE_SECONDS = 300.0  # Ollama's default
+
+def parse_keep_alive(value):
+    """Ollama keep_alive ("5m", "30s", "1h", seconds as a number, negative = forever) -> seconds"""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE_SECONDS
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = re.fullmatch(r"\s*(-?[\d.]+)\s*(ms|s|m|h)?\s*", str(value))
+        if not match:
+            return DEFAULT_KEEP_ALIVE_SECONDS
+        seconds = float(match.group(1)) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+class MockConfig:
+    def __init__(self, latency=0.05, tokens_per_sec=200.0, seed=0, failure_rate=0.0, failure_status=503,
+                 model_slowdown=None, load_time=0.0, max_loaded_models=0, ramble_rate=0.0):
+        self.latency = latency                # seconds before the first token (prefill)
+        self.tokens_per_sec = tokens_per_sec  # decode rate; 0 disables the per-token delay
+        self.seed = seed
+        self.model_slowdown = model_slowdown or {}  # model -> latency/decode multiplier, e.g. a big verify model
+        self.failure_rate = failure_rate      # fraction of generate requests answered with failure_status
+        self.failure_status = failure_status
+        self.ramble_rate = ramble_rate        # fraction of outputs that keep going after the answer
+        self.load_time = load_time                  # seconds to load a model that isn't resident
+        self.max_loaded_models = max_loaded_models  # 0 = unlimited
+        self._loaded = {}  # model -> expiry time, in least- to most-recently used order
+        self._load_lock = threading.Lock()
+        self._failure_rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "failures": 0, "busy_seconds": 0.0, "loads": 0, "load_seconds": 0.0,
+                      "eval_tokens": 0, "prompt_tokens": 0}
+        self._generation_seconds = []
+
+    def should_fail(self):
+        with self._lock:
+            return self.failure_rate > 0 and self._failure_rng.random() < self.failure_rate
+
+    def ensure_loaded(self, model, keep_alive):
+        """Load model if it isn't resident (evicting the least recently used one if full); returns load seconds"""
+        if self.load_time <= 0:
+            return 0.0
+        with self._load_lock:
+            now = time.time()
+            self._loaded = {m: expiry for m, expiry in self._loaded.items() if expiry > now}
+            load_seconds = 0.0
+            if model in self._loaded:
+                del self._loaded[model]
+            else:
+                if self.max_loaded_models and len(self._loaded) >= self.max_loaded_models:
+                    del self._loaded[next(iter(self._loaded))]
+                load_seconds = self.load_time * self.model_slowdown.get(model, 1.0)
+                time.sleep(load_seconds)
+                with self._lock:
+                    self.stats["loads"] += 1
+                    self.stats["load_seconds"] += load_seconds
+            self._loaded[model] = time.time() + parse_keep_alive(keep_alive)
+            return load_seconds
+
+    def unload(self, model):
+        with self._load_lock:
+            self._loaded.pop(model, None)
+
+    def record(self, seconds, failed=False, eval_tokens=None, prompt_tokens=0):
+        """Count one request; eval_tokens (tokens actually sent) marks it as a generation"""
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["busy_seconds"] += seconds
+            if failed:
+                self.stats["failures"] += 1
+            if eval_tokens is not None:
+                self.stats["eval_tokens"] += eval_tokens
+                self.stats["prompt_tokens"] += prompt_tokens
+                self._generation_seconds.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            durations = sorted(self._generation_seconds)
+            p95 = durations[min(len(durations) - 1, int(0.95 * len(durations)))] if durations else 0.0
+            return dict(self.stats, p95_generation_seconds=p95)
+
+def _rng_for(model, prompt, options, config):
+    """Same model + prompt + seed always produces the same output"""
+    key = json.dumps([model, prompt, (options or {}).get("seed"), config.seed], sort_keys=True)
+    return random.Random(int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:16], 16))
+
+def mock_unified_response(prompt, rng, structured=False):
+    """PLAYER_QUESTION / THINKING / ASSISTANT_RESPONSE output for unified_dataset prompts
+
+    structured=True returns the same content as a JSON object (schema-constrained mode).
+    """
+    title_match = re.search(r"ARTICLE TITLE:\s*(.+)", prompt)
+    title = title_match.group(1).strip() if title_match else "this"
+    question = rng.choice(QUESTION_TEMPLATES).format(title=title.lower())
+    steps = rng.sample(RESPONSE_STEPS, 3)
+    answer = f"{rng.choice(RESPONSE_OPENERS)}, {title.lower()} is pretty manageable. " + ". ".join(steps) + f". {rng.choice(RESPONSE_CLOSERS)}."
+
+    thinking = None
+    if "THINKING: [" in prompt or '"thinking"' in prompt:
+        thinking = f"The player is asking about {title}. The article covers how it is obtained and used, so I'll walk through the practical steps."
+
+    if structured:
+        data = {"player_question": question}
+        if thinking:
+            data["thinking"] = thinking
+        data["assistant_response"] = answer
+        return json.dumps(data)
+
+    parts = [f"PLAYER_QUESTION: {question}"]
+    if thinking:
+        parts.append(f"THINKING: {thinking}")
+    parts.append(f"ASSISTANT_RESPONSE: {answer}")
+    return "\n\n".join(parts)
+
+def mock_command_response(prompt, rng):
+    """USER / THINKING / BOT output for command_intent_dataset_generator prompts
+
+    Batched prompts ("Generate 5 realistic, diverse conversations") get that many
+    conversations, each under a "CONVERSATION n:" header.
+    """
+    count_match = re.search(r"Generate (\d+) realistic", prompt)
+    count = int(count_match.group(1)) if count_match else 1
+    if count == 1:
+        return mock_command_conversation(prompt, rng)
+    return "\n\n".join(f"CONVERSATION {n}:\n{mock_command_conversation(prompt, rng)}" for n in range(1, count + 1))
+
+def mock_command_conversation(prompt, rng):
+    cmd_name = re.search(r"focusing specifically on the !(\w+) command", prompt).group(1)
+    bot_match = re.search(r"the bot named (\w+)", prompt)
+    bot_name = bot_match.group(1) if bot_match else "andy"
+    params_block = prompt.split("Parameters:", 1)[1].split("\n\n", 1)[0] if "Parameters:" in prompt else ""
+    params = re.findall(r"^- (\w+):", params_block, re.MULTILINE)
+
+    args = []
+    for param in params:
+        if param == "type" and cmd_name in ENTITY_COMMANDS:
+            args.append(f'"{rng.choice(SAMPLE_MOBS)}"')
+        elif param == "on":
+            args.append(rng.choice(["true", "false"]))
+        elif param in SAMPLE_ARGS and cmd_name != "stay":
+            args.append(f'"{rng.choice(SAMPLE_ARGS[param])}"')
+        else:
+            args.append(str(rng.randint(1, 32)))
+    call = f"!{cmd_name}({', '.join(args)})" if args else f"!{cmd_name}"
+
+    action = re.sub(r"(?<!^)([A-Z])", r" \1", cmd_name).lower()
+    if args:
+        action += " " + args[0].strip('"').replace("_", " ")
+    user = rng.choice(USER_TEMPLATES).format(action=action, name=bot_name)
+    return (f"USER: {user}\n"
+            f"THINKING: The player wants me to {action}, so !{cmd_name} is the right command here.\n"
+            f"BOT: {rng.choice(BOT_TEMPLATES).format(call=call)}")
+
+def mock_verification_response(prompt, rng):
+    """JSON verdict for unified_dataset verification prompts: a score and the response echoed back"""
+    response_match = re.search(r"ASSISTANT RESPONSE: (.*?)\n\nINSTRUCTION:", prompt, re.DOTALL)
+    response = response_match.group(1).strip() if response_match else ""
+    score = rng.randint(3, 10)
+    issues = "" if score >= 8 else "Leaves out how the item is actually obtained."
+    return json.dumps({"score": score, "issues": issues, "revised_response": response})
+
+RAMBLE_REPEATS = 8
+
+def ramble(text, rng, structured=False):
+    """Run-on output: the answer repeated (a second pair, conversation, ...) or, for JSON, an overlong response"""
+    if structured:
+        data = json.loads(text)
+        key = "assistant_response" if "assistant_response" in data else "revised_response"
+        data[key] += " " + " ".join(rng.choice(RESPONSE_STEPS) + "." for _ in range(RAMBLE_REPEATS * 6))
+        return json.dumps(data)
+    return "\n\n".join([text] * RAMBLE_REPEATS)
+
+def mock_completion(model, prompt, options, config, structured=False):
+    rng = _rng_for(model, prompt, options, config)
+    if "You are reviewing a question and answer pair" in prompt:
+        text = mock_verification_response(prompt, rng)
+        structured = True
+    elif "focusing specifically on the !" in prompt:
+        text = mock_command_response(prompt, rng)
+    elif "PLAYER_QUESTION:" in prompt or '"player_question"' in prompt:
+        text = mock_unified_response(prompt, rng, structured=structured)
+    else:
+        text = " ".join(rng.choice(RESPONSE_STEPS) for _ in range(3))
+    if config.ramble_rate > 0 and rng.random() < config.ramble_rate:
+        text = ramble(text, rng, structured=structured)
+    return text
+
+def apply_limits(text, stop=None, num_predict=None):
+    """Cut text at the first stop sequence (excluded, as Ollama does) and at num_predict tokens
+
+    Returns (tokens, done_reason).
+    """
+    if isinstance(stop, str):
+        stop = [stop]
+    cuts = [text.find(s) for s in stop or [] if s and s in text]
+    if cuts:
+        text = text[:min(cuts)]
+    tokens = tokenize(text)
+    if num_predict is not None and 0 <= num_predict < len(tokens):
+        return tokens[:num_predict], "length"
+    return tokens, "stop"
+
+def tokenize(text):
+    """Rough word-level tokens, keeping whitespace attached so they join back exactly"""
+    return re.findall(r"\S+\s*|\s+", text)
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path in ("/api/tags", "/v1/models"):
+            self._send_json(200, {"models": [], "data": []})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path == "/api/generate":
+            self._handle_generate(body, openai=False)
+        elif self.path == "/v1/completions":
+            self._handle_generate(body, openai=True)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _handle_generate(self, body, openai):
+        config = self.config
+        model = body.get("model", "mock")
+        prompt = body.get("prompt", "")
+        options = body.get("options") or {}
+        if openai:
+            options = dict(options, **{k: body[k] for k in ("seed", "stop") if k in body})
+            if "max_tokens" in body:
+                options["num_predict"] = body["max_tokens"]
+
+        started = time.time()
+        if not openai and not prompt:
+            # Ollama loads (or with keep_alive 0, unloads) the model when there's no prompt
+            if body.get("keep_alive") in (0, "0"):
+                config.unload(model)
+                self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "unload"})
+                return
+            load_seconds = config.ensure_loaded(model, body.get("keep_alive"))
+            self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "load",
+                                  "load_duration": int(load_seconds * 1e9)})
+            config.record(time.time() - started)
+            return
+
+        if config.should_fail():
+            time.sleep(config.latency)
+            self._send_json(config.failure_status, {"error": "injected failure"})
+            config.record(time.time() - started, failed=True)
+            return
+
+        structured = any(body.get(key) for key in ("format", "json_schema", "guided_json"))
+        text = mock_completion(model, prompt, options, config, structured=structured)
+        tokens, done_reason = apply_limits(text, options.get("stop"), options.get("num_predict"))
+        text = "".join(tokens)
+        prompt_tokens = len(tokenize(prompt))
+
+        load_seconds = config.ensure_loaded(model, body.get("keep_alive"))
+        slowdown = config.model_slowdown.get(model, 1.0)
+        time.sleep(config.latency * slowdown)
+        prefill_done = time.time()
+        token_delay = slowdown / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+
+        if not body.get("stream", False):
+            time.sleep(token_delay * len(tokens))
+            self._send_json(200, self._final_body(openai, model, text, prompt_tokens, len(tokens), started, prefill_done,
+                                                  load_seconds, done_reason))
+            config.record(time.time() - started, eval_tokens=len(tokens), prompt_tokens=prompt_tokens)
+            return
+
+        sent = 0
+        try:
+            self._start_stream("text/event-stream" if openai else "application/x-ndjson")
+            for token in tokens:
+                if token_delay:
+                    time.sleep(token_delay)
+                if openai:
+                    chunk = {"object": "text_completion", "model": model, "choices": [{"index": 0, "text": token, "finish_reason": None}]}
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                else:
+                    chunk = {"model": model, "response": token, "done": False}
+                    self._write_chunk((json.dumps(chunk) + "\n").encode("utf-8"))
+                sent += 1
+
+            final = self._final_body(openai, model, "", prompt_tokens, len(tokens), started, prefill_done,
+                                     load_seconds, done_reason)
+            if openai:
+                self._write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            else:
+                self._write_chunk((json.dumps(final) + "\n").encode("utf-8"))
+            self._end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the generation
+            self.close_connection = True
+        config.record(time.time() - started, eval_tokens=sent, prompt_tokens=prompt_tokens)
+
+    def _final_body(self, openai, model, text, prompt_tokens, eval_tokens, started, prefill_done, load_seconds=0.0,
+                    done_reason="stop"):
+        now = time.time()
+        if openai:
+            return {
+                "object": "text_completion",
+                "model": model,
+                "choices": [{"index": 0, "text": text, "finish_reason": done_reason}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": eval_tokens,
+                          "total_tokens": prompt_tokens + eval_tokens}
+            }
+        return {
+            "model": model,
+            "response": text,
+            "done": True,
+            "done_reason": done_reason,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": eval_tokens,
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_duration": int((prefill_done - started - load_seconds) * 1e9),
+            "eval_duration": int((now - prefill_done) * 1e9),
+            "total_duration": int((now - started) * 1e9)
+        }
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.05, tokens_per_sec=200.0, seed=0,
+                      failure_rate=0.0, failure_status=503, model_slowdown=None, load_time=0.0,
+                      max_loaded_models=0, ramble_rate=0.0):
+    """Start the mock server on a background thread; returns (server, base_url)
+
+    Request counts and busy time are available from server.RequestHandlerClass.config.snapshot().
+    """
+    config = MockConfig(latency=latency, tokens_per_sec=tokens_per_sec, seed=seed,
+                        failure_rate=failure_rate, failure_status=failure_status, model_slowdown=model_slowdown,
+                        load_time=load_time, max_loaded_models=max_loaded_models, ramble_rate=ramble_rate)
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a deterministic mock Ollama/OpenAI-compatible LLM server')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds before the first token')
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0, help='Decode rate (0 = instant)')
+    parser.add_argument('--seed', type=int, default=0, help='Base seed mixed into every output')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of generate requests that fail')
+    parser.add_argument('--failure-status', type=int, default=503, help='HTTP status returned for injected failures')
+    parser.add_argument('--slow-model', action='append', default=[], metavar='MODEL=FACTOR',
+                        help='Make a model FACTOR times slower, e.g. a large verify model (repeatable)')
+    parser.add_argument('--load-time', type=float, default=0.0,
+                        help='Seconds to load a model that is not resident (scaled by --slow-model, 0 = always resident)')
+    parser.add_argument('--max-loaded-models', type=int, default=0,
+                        help='Models held in memory at once before the least recently used is evicted (0 = unlimited)')
+    parser.add_argument('--ramble-rate', type=float, default=0.0,
+                        help='Fraction of outputs that run on past the answer until stopped or cut off')
+    args = parser.parse_args()
+
+    model_slowdown = {}
+    for spec in args.slow_model:
+        name, _, factor = spec.rpartition("=")
+        model_slowdown[name] = float(factor)
+    server, base_url = start_mock_server(args.host, args.port, args.latency, args.tokens_per_sec, args.seed,
+                                         args.failure_rate, args.failure_status, model_slowdown,
+                                         args.load_time, args.max_loaded_models, args.ramble_rate)
+    print(f"Mock LLM server listening on {base_url} (Ollama: {base_url}/api/generate, OpenAI: {base_url}/v1)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
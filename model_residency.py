@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Model residency tracking and model-grouped scheduling of LLM requests.
+
+Ollama serves several models from one server but only keeps a few in memory, so
+alternating between models (e.g. the draft and verify models of the cascade) can pay
+a full model load on every switch. ModelScheduler runs queued requests grouped by
+model, pre-warming each model before its group, and every request sets keep_alive so
+resident models aren't unloaded between batches. Loads are detected from the
+load_duration the server reports and summarised by print_residency_stats().
+"""
+import threading
+from llm_backends import LLMBackendError, get_backend
+
+# A reported load_duration above this (ms) means the model was loaded for the call
+COLD_LOAD_MS = 100.0
+
+def normalize_model_name(model):
+    """Ollama treats "llama3.2" and "llama3.2:latest" as the same model"""
+    return model if ":" in model else f"{model}:latest"
+
+class ModelResidency:
+    """Model loads and switches seen on one server, and how much time went into loading"""
+
+    def __init__(self, api_url, kind=None):
+        self.api_url = api_url
+        self.backend = get_backend(api_url, kind=kind)
+        self.stats = {"warmups": 0, "cold_loads": 0, "load_ms": 0.0, "switches": 0, "per_model": {}}
+        self._last_model = None
+        self._lock = threading.Lock()
+
+    def _model_stats(self, model):
+        return self.stats["per_model"].setdefault(model, {"calls": 0, "cold_loads": 0, "load_ms": 0.0})
+
+    def observe(self, model, load_ms):
+        """Record one generate call's reported load time (ms, None if the server doesn't report it)"""
+        model = normalize_model_name(model)
+        with self._lock:
+            if self._last_model not in (None, model):
+                self.stats["switches"] += 1
+            self._last_model = model
+            per_model = self._model_stats(model)
+            per_model["calls"] += 1
+            if load_ms is not None and load_ms >= COLD_LOAD_MS:
+                self.stats["cold_loads"] += 1
+                self.stats["load_ms"] += load_ms
+                per_model["cold_loads"] += 1
+                per_model["load_ms"] += load_ms
+
+    def warm(self, model, keep_alive=None):
+        """Load model ahead of a batch so the first request of the batch doesn't stall"""
+        name = normalize_model_name(model)
+        try:
+            load_ms = self.backend.load_model(model, keep_alive=keep_alive)
+        except LLMBackendError as e:
+            print(f"Could not pre-warm {model}: {e}")
+            return None
+        if load_ms is None:
+            return None  # single-model server, nothing to load
+        with self._lock:
+            self.stats["warmups"] += 1
+            if load_ms:
+                self.stats["load_ms"] += load_ms
+                self._model_stats(name)["load_ms"] += load_ms
+        return load_ms
+
+    def snapshot_stats(self):
+        with self._lock:
+            return dict(self.stats, per_model={m: dict(s) for m, s in self.stats["per_model"].items()})
+
+    def print_stats(self):
+        s = self.snapshot_stats()
+        if not s["per_model"]:
+            return
+        print(f"Model residency ({self.api_url}): {s['cold_loads']} cold loads during generation, "
+              f"{s['warmups']} pre-warms, {s['switches']} model switches, {s['load_ms'] / 1000:.1f}s loading models")
+        for model, m in sorted(s["per_model"].items()):
+            print(f"  {model}: {m['calls']} calls, {m['cold_loads']} cold loads, {m['load_ms'] / 1000:.1f}s loading")
+
+_residencies = {}
+_residencies_lock = threading.Lock()
+
+def get_residency(api_url, kind=None):
+    with _residencies_lock:
+        if api_url not in _residencies:
+            _residencies[api_url] = ModelResidency(api_url, kind=kind)
+        return _residencies[api_url]
+
+def print_residency_stats():
+    with _residencies_lock:
+        residencies = list(_residencies.values())
+    for residency in residencies:
+        residency.print_stats()
+
+class ModelScheduler:
+    """Queue of LLM requests that run grouped by model.
+
+        scheduler = ModelScheduler(api_url)
+        scheduler.submit("small-model", draft_fn, prompt)
+        scheduler.submit("big-model", verify_fn, other)
+        results = scheduler.run()  # in submission order
+
+    Groups run in the order their model was first submitted and keep submission order
+    within a group. Each model is warmed before its group, so at most one load per
+    model per run() instead of one per switch.
+    """
+
+    def __init__(self, api_url, kind=None, keep_alive=None, warm=True):
+        self.api_url = api_url
+        self.kind = kind
+        self.keep_alive = keep_alive
+        self.warm = warm
+        self._pending = []
+
+    def submit(self, model, fn, *args, **kwargs):
+        self._pending.append((model, fn, args, kwargs))
+        return len(self._pending) - 1
+
+    def run(self):
+        pending, self._pending = self._pending, []
+        groups = {}
+        for position, (model, fn, args, kwargs) in enumerate(pending):
+            groups.setdefault(normalize_model_name(model), []).append((position, model, fn, args, kwargs))
+
+        results = [None] * len(pending)
+        for requests in groups.values():
+            if self.warm:
+                get_residency(self.api_url, kind=self.kind).warm(requests[0][1], keep_alive=self.keep_alive)
+            for position, _, fn, args, kwargs in requests:
+                results[position] = fn(*args, **kwargs)
+        return results
+
+    def map(self, model, fn, items):
+        """Run fn(item) for each item under one model, warming it first"""
+        for item in items:
+            self.submit(model, fn, item)
+        return self.run()
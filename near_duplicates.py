@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import operator
+import re
+import zlib
+
+NUM_BINS = 64
+NUM_BANDS = 16          # 16 bands x 4 rows: pairs above ~0.6 Jaccard almost always share a band
+_HASH_MAX = 1 << 32
+
+def normalize_text(text):
+    text = re.sub(r"[^\w\s!]", "", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+def char_shingles(text, k=4):
+    """Character k-grams - robust for short, casually typed questions"""
+    text = normalize_text(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+def word_shingles(text, k=3):
+    """Word k-grams - cheaper for long answers"""
+    words = normalize_text(text).split()
+    if len(words) <= k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+class MinHashLSH:
+    """One-permutation MinHash signatures with LSH banding for one text field.
+
+    Each shingle is hashed once and lands in one of num_bins bins, keeping the minimum
+    per bin, so a signature costs O(shingles) instead of O(shingles x permutations).
+    Empty bins borrow from the next non-empty bin (rotation densification), which
+    keeps short texts comparable. Shingles are hashed with crc32 rather than Python's
+    per-process randomized str hash, so the same run always makes the same decisions.
+    """
+
+    def __init__(self, threshold=0.7, shingler=char_shingles, num_bins=NUM_BINS, num_bands=NUM_BANDS):
+        self.threshold = threshold
+        self.shingler = shingler
+        self.num_bins = num_bins
+        self.num_bands = num_bands
+        self.rows = num_bins // num_bands
+        self.buckets = [{} for _ in range(num_bands)]
+        self.signatures = []
+        self.labels = []
+
+    def signature(self, text):
+        n = self.num_bins
+        bins = [None] * n
+        for shingle in self.shingler(text):
+            h = zlib.crc32(shingle.encode("utf-8"))
+            b, v = h % n, h // n
+            if bins[b] is None or v < bins[b]:
+                bins[b] = v
+        if all(v is None for v in bins):
+            return None
+
+        # Densify: an empty bin takes the value of the next non-empty bin, offset by the distance
+        sig = list(bins)
+        for i in range(n):
+            if sig[i] is None:
+                j, distance = (i + 1) % n, 1
+                while bins[j] is None:
+                    j, distance = (j + 1) % n, distance + 1
+                sig[i] = bins[j] + distance * (_HASH_MAX // n)
+        return tuple(sig)
+
+    def _bands(self, sig):
+        r = self.rows
+        return [sig[i * r:(i + 1) * r] for i in range(self.num_bands)]
+
+    def query(self, text, sig=None):
+        """Return (label, estimated Jaccard) of the most similar indexed text above threshold, else None"""
+        if text is not None:
+            sig = self.signature(text)
+        if sig is None:
+            return None
+        candidates = set()
+        for bucket, band in zip(self.buckets, self._bands(sig)):
+            candidates.update(bucket.get(band, ()))
+
+        best = None
+        for idx in candidates:
+            other = self.signatures[idx]
+            similarity = sum(map(operator.eq, sig, other)) / self.num_bins
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self.labels[idx], similarity)
+        return best
+
+    def add(self, text, label=None, sig=None):
+        if text is not None:
+            sig = self.signature(text)
+        if sig is None:
+            return
+        idx = len(self.signatures)
+        self.signatures.append(sig)
+        self.labels.append(label)
+        for bucket, band in zip(self.buckets, self._bands(sig)):
+            bucket.setdefault(band, []).append(idx)
+
+    def __len__(self):
+        return len(self.signatures)
+
+class NearDuplicateIndex:
+    """Incremental near-duplicate detection over one or more example fields.
+
+    fields maps a field name to (threshold, shingler). An example is a near-duplicate
+    if any field is at least `threshold` similar (MinHash-estimated Jaccard) to an
+    already indexed example.
+    """
+
+    def __init__(self, fields=None):
+        fields = fields or {"instruction": (0.7, char_shingles), "output": (0.8, word_shingles)}
+        self.indexes = {name: MinHashLSH(threshold, shingler) for name, (threshold, shingler) in fields.items()}
+        self.checked = 0
+        self.rejected = 0
+
+    def _signatures(self, example):
+        return {name: index.signature(example.get(name, "")) for name, index in self.indexes.items()}
+
+    def check(self, example, signatures=None):
+        """Return a reason string if the example is a near-duplicate, else None"""
+        signatures = signatures or self._signatures(example)
+        self.checked += 1
+        for name, index in self.indexes.items():
+            match = index.query(None, sig=signatures[name])
+            if match:
+                self.rejected += 1
+                label, similarity = match
+                return f"near-duplicate {name} ({similarity:.0%} similar to {label!r})"
+        return None
+
+    def add(self, example, signatures=None):
+        signatures = signatures or self._signatures(example)
+        label = (example.get("instruction") or "")[:60]
+        for name, index in self.indexes.items():
+            index.add(None, label=label, sig=signatures[name])
+
+    def check_and_add(self, example):
+        """Check an example and index it if it's new, hashing it only once"""
+        signatures = self._signatures(example)
+        reason = self.check(example, signatures)
+        if reason is None:
+            self.add(example, signatures)
+        return reason
+
+    def load_examples(self, examples):
+        for example in examples:
+            self.add(example)
+
+    def __len__(self):
+        return max((len(index) for index in self.indexes.values()), default=0)
+
+    def print_stats(self):
+        print(f"Near-duplicate index: {len(self)} examples indexed, "
+              f"{self.rejected}/{self.checked} new examples rejected as near-duplicates")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Per-conversation-type output token budgets learned from generation telemetry.
+
+Responses over MAX_RESPONSE_CHARS are rejected anyway, so letting the server decode
+past the longest output that could still be accepted only adds tail latency and
+wasted tokens. Budgets are learned from the eval token counts of accepted calls in a
+telemetry sidecar (a high quantile plus a margin, separately with and without a
+thinking step), saved to OUTPUT_BUDGET_FILE and sent as num_predict. Types without
+enough samples use the defaults. Budgets only change when relearned, so reruns send
+the same limits and keep hitting the LLM response cache.
+
+    python output_budgets.py training_data/unified_minecraft_dataset.metrics.jsonl
+"""
+import argparse
+import json
+import math
+import os
+from generation_telemetry import ACCEPTED, load_records
+
+OUTPUT_BUDGET_FILE = os.path.join("training_data", "output_budgets.json")
+
+# Defaults for text mode: MAX_RESPONSE_CHARS (~570 tokens) plus the question and
+# section headers, and room for a reasoning step when thinking is requested
+DEFAULT_OUTPUT_BUDGET = 768
+DEFAULT_THINKING_BUDGET = 1152
+MIN_OUTPUT_BUDGET = 128
+MAX_OUTPUT_BUDGET = 2048
+
+BUDGET_QUANTILE = 0.99
+BUDGET_MARGIN = 1.2
+MIN_BUDGET_SAMPLES = 20
+
+def budget_variant(thinking):
+    return "thinking" if thinking else "plain"
+
+def quantile(values, q):
+    """Nearest-rank quantile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def accepted_lengths(records, key="conversation_type"):
+    """(group, variant) -> eval token counts of complete outputs that passed validation
+
+    Cascade drafts count whatever the verdict, since the verdict says nothing about
+    length; verify calls use a different prompt and are skipped, as are calls that
+    were cut off by their budget.
+    """
+    lengths = {}
+    for r in records:
+        if r.get("tier") == "verify" or "thinking" not in r or r.get(key) is None:
+            continue
+        if r["outcome"] != ACCEPTED and not r.get("verified"):
+            continue
+        if r.get("done_reason") == "length" or not r.get("eval_tokens"):
+            continue
+        lengths.setdefault((r[key], budget_variant(r["thinking"])), []).append(r["eval_tokens"])
+    return lengths
+
+class OutputBudgets:
+    """num_predict per conversation type (and thinking variant), persisted as JSON"""
+
+    def __init__(self, path=OUTPUT_BUDGET_FILE):
+        self.path = path
+        self.budgets = {}
+        self.settings = {"quantile": BUDGET_QUANTILE, "margin": BUDGET_MARGIN}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.budgets = data.get("budgets", {})
+                self.settings = {k: data.get(k, v) for k, v in self.settings.items()}
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Error loading output budgets {path}, using defaults: {e}")
+
+    def get(self, conversation_type, thinking=False):
+        learned = self.budgets.get(conversation_type, {}).get(budget_variant(thinking))
+        if learned:
+            return learned
+        return DEFAULT_THINKING_BUDGET if thinking else DEFAULT_OUTPUT_BUDGET
+
+    def learn(self, records, key="conversation_type", q=BUDGET_QUANTILE, margin=BUDGET_MARGIN,
+              min_samples=MIN_BUDGET_SAMPLES):
+        """Replace the budgets of every group with at least min_samples accepted outputs"""
+        learned = {}
+        self.settings = {"quantile": q, "margin": margin}
+        for (group, variant), lengths in accepted_lengths(records, key).items():
+            if len(lengths) < min_samples:
+                continue
+            budget = int(math.ceil(quantile(lengths, q) * margin))
+            self.budgets.setdefault(group, {})[variant] = min(MAX_OUTPUT_BUDGET, max(MIN_OUTPUT_BUDGET, budget))
+            learned[(group, variant)] = len(lengths)
+        return learned
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(dict(self.settings, budgets=self.budgets), f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Learn per-conversation-type output token budgets from telemetry')
+    parser.add_argument('metrics_files', nargs='+', help='Telemetry sidecar files (*.metrics.jsonl)')
+    parser.add_argument('--output', default=OUTPUT_BUDGET_FILE, help='Budget file to update')
+    parser.add_argument('--quantile', type=float, default=BUDGET_QUANTILE, help='Quantile of accepted lengths')
+    parser.add_argument('--margin', type=float, default=BUDGET_MARGIN, help='Multiplier on top of the quantile')
+    parser.add_argument('--min-samples', type=int, default=MIN_BUDGET_SAMPLES,
+                        help='Accepted outputs needed before a type gets its own budget')
+    args = parser.parse_args()
+
+    records = []
+    for path in args.metrics_files:
+        records.extend(load_records(path))
+    budgets = OutputBudgets(args.output)
+    learned = budgets.learn(records, q=args.quantile, margin=args.margin, min_samples=args.min_samples)
+    budgets.save()
+
+    print(f"Learned {len(learned)} budgets from {len(records)} records into {args.output}")
+    lengths = accepted_lengths(records)
+    for group in sorted(budgets.budgets):
+        for variant in ("plain", "thinking"):
+            samples = lengths.get((group, variant), [])
+            observed = f"p50 {quantile(samples, 0.5)}, max {max(samples)} over {len(samples)}" if samples else "no samples"
+            print(f"  {group} ({variant}): {budgets.get(group, variant == 'thinking')} tokens ({observed})")
+
+if __name__ == "__main__":
+    main()
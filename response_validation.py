@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import time
+from multiprocessing import Pool
+
+# Length limits for the assistant response
+MIN_RESPONSE_CHARS = 50
+MAX_RESPONSE_CHARS = 2000
+
+# Rules are checked in order; the first failing rule rejects the response.
+#   min_length / max_length:  compare len(response) with "limit"
+#   forbid_if_short:          reject if any term appears and the response is under "limit" chars
+#   require_any:              reject if none of the terms appear
+#   style:                    never rejects, only counted in the statistics
+# Terms are matched case-insensitively as substrings, like `term in response.lower()`.
+VALIDATION_RULES = [
+    {"id": "too_short", "kind": "min_length", "limit": MIN_RESPONSE_CHARS,
+     "message": "Response too short"},
+    {"id": "too_long", "kind": "max_length", "limit": MAX_RESPONSE_CHARS,
+     "message": "Response too long"},
+    {"id": "unhelpful", "kind": "forbid_if_short", "limit": 100,
+     "terms": ["i don't know", "i'm not sure"],
+     "message": "Response lacks helpful information"},
+    {"id": "crafting_pattern", "kind": "require_any", "conversation_types": ["crafting_and_recipes"],
+     "terms": ["need", "require", "use", "place", "craft", "recipe", "grid", "pattern", "shaped", "shapeless"],
+     "message": "Crafting response doesn't describe the recipe pattern"},
+    {"id": "survival_actionable", "kind": "require_any", "conversation_types": ["survival_scenarios"],
+     "terms": ["should", "could", "try", "do", "don't", "avoid", "use", "find", "craft", "build", "run", "hide", "fight"],
+     "message": "Survival response doesn't provide actionable advice"},
+    {"id": "resource_steps", "kind": "require_any", "conversation_types": ["resource_chains"],
+     "terms": ["first", "then", "next", "after", "finally", "step", "process", "start", "begin"],
+     "message": "Resource chain response doesn't provide sequential steps"},
+    # Internet-mature style: nice to have, but accuracy matters more so these never reject
+    {"id": "internet_style", "kind": "style",
+     "terms": ["tbh", "imo", "afaik", "fwiw", "btw", "iirc", "ymmv", "tl;dr"],
+     "message": "Uses internet shorthand"},
+    {"id": "casual_style", "kind": "style",
+     "terms": ["pretty", "basically", "actually", "just", "really", "honestly", "generally", "typically"],
+     "message": "Uses a casual tone"},
+]
+
+ACCEPTED_MESSAGE = "Response meets quality standards"
+
+def trie_regex(terms):
+    """Regex alternation factored into a prefix trie, e.g. do(?:n't)? - the longest term wins"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def convert(node):
+        alts = [re.escape(ch) + convert(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return convert(trie)
+
+class ValidationEngine:
+    """All rule terms compiled into one regex, scanned once per response.
+
+    The pattern is a trie-factored alternation inside a lookahead, so it reports the
+    longest term starting at every position (overlapping terms like "pretty"/"try"
+    are both found). Each term also credits the rules of any terms that are its
+    prefix, which makes the result identical to checking every term with `in`.
+    """
+
+    def __init__(self, rules=VALIDATION_RULES):
+        self.rules = rules
+        self.rule_bits = {rule["id"]: 1 << i for i, rule in enumerate(rules)}
+
+        term_rules = {}
+        for rule in rules:
+            for term in rule.get("terms", []):
+                term_rules[term.lower()] = term_rules.get(term.lower(), 0) | self.rule_bits[rule["id"]]
+
+        # Bitmask of rules credited by each term (its own plus those of its prefixes)
+        self.term_masks = {}
+        for term in term_rules:
+            mask = 0
+            for other, other_mask in term_rules.items():
+                if term.startswith(other):
+                    mask |= other_mask
+            self.term_masks[term] = mask
+
+        self.pattern = re.compile("(?=(" + trie_regex(term_rules) + "))") if term_rules else None
+        self._plans = {}
+        self.reset_stats()
+
+    def _plan(self, conversation_type):
+        """Rules that apply to a conversation type, precomputed once per type"""
+        plan = self._plans.get(conversation_type)
+        if plan is None:
+            plan = [(rule["kind"], rule.get("limit"), self.rule_bits[rule["id"]], rule["id"], rule["message"])
+                    for rule in self.rules
+                    if rule["kind"] != "style"
+                    and (not rule.get("conversation_types") or conversation_type in rule["conversation_types"])]
+            self._plans[conversation_type] = plan
+        return plan
+
+    def reset_stats(self):
+        self.checked = 0
+        self.accepted = 0
+        self.rule_failures = {rule["id"]: 0 for rule in self.rules}
+        self._mask_counts = {}  # matched-rules bitmask -> responses, expanded in stats()
+
+    def match_mask(self, response):
+        """Bitmask of rules with at least one term in the response"""
+        mask = 0
+        if self.pattern is not None:
+            term_masks = self.term_masks
+            for term in self.pattern.findall(response.lower()):
+                mask |= term_masks[term]
+        return mask
+
+    def matched_rules(self, response):
+        """Ids of rules with at least one term in the response"""
+        mask = self.match_mask(response)
+        return {rule_id for rule_id, bit in self.rule_bits.items() if mask & bit}
+
+    def validate(self, response, conversation_type):
+        """Return (is_valid, message) using the first failing rule"""
+        self.checked += 1
+        mask = self.match_mask(response)
+        self._mask_counts[mask] = self._mask_counts.get(mask, 0) + 1
+
+        length = len(response)
+        for kind, limit, bit, rule_id, message in self._plan(conversation_type):
+            if kind == "min_length":
+                failed = length < limit
+            elif kind == "max_length":
+                failed = length > limit
+            elif kind == "forbid_if_short":
+                failed = length < limit and mask & bit
+            else:  # require_any
+                failed = not mask & bit
+
+            if failed:
+                self.rule_failures[rule_id] += 1
+                return False, message
+
+        self.accepted += 1
+        return True, ACCEPTED_MESSAGE
+
+    @property
+    def rule_matches(self):
+        """Responses in which each rule had at least one term hit"""
+        matches = {rule["id"]: 0 for rule in self.rules}
+        for mask, count in self._mask_counts.items():
+            for rule_id, bit in self.rule_bits.items():
+                if mask & bit:
+                    matches[rule_id] += count
+        return matches
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "accepted": self.accepted,
+            "rule_failures": dict(self.rule_failures),
+            "rule_matches": self.rule_matches
+        }
+
+    def merge_stats(self, other):
+        self.checked += other["checked"]
+        self.accepted += other["accepted"]
+        for rule_id, count in other["rule_failures"].items():
+            self.rule_failures[rule_id] = self.rule_failures.get(rule_id, 0) + count
+        # Fold the other engine's per-rule matches in as single-rule masks
+        for rule_id, count in other["rule_matches"].items():
+            if count:
+                bit = self.rule_bits[rule_id]
+                self._mask_counts[bit] = self._mask_counts.get(bit, 0) + count
+
+    def print_stats(self):
+        if not self.checked:
+            return
+        print(f"Validation: {self.accepted}/{self.checked} accepted ({self.accepted / self.checked:.1%})")
+        matches = self.rule_matches
+        for rule in self.rules:
+            rule_id = rule["id"]
+            line = f"  {rule_id}: {matches[rule_id]} term hits"
+            if rule["kind"] != "style":
+                line += f", {self.rule_failures[rule_id]} rejections"
+            print(line)
+
+# Shared engine used inline by unified_dataset.validate_response_quality
+default_engine = ValidationEngine()
+
+def _validate_batch(lines):
+    """Worker: validate a chunk of JSONL lines, returning (results, stats)"""
+    engine = ValidationEngine()
+    results = []
+    for line in lines:
+        try:
+            example = json.loads(line)
+        except json.JSONDecodeError:
+            results.append((line, False, "Invalid JSON"))
+            continue
+        is_valid, message = engine.validate(example.get("output", ""), example.get("conversation_type", ""))
+        results.append((line, is_valid, message))
+    return results, engine.stats()
+
+def _read_batches(path, batch_size):
+    batch = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def revalidate_jsonl(input_file, accepted_file=None, rejected_file=None, workers=None, batch_size=500):
+    """Stream a JSONL dataset through the current rules across worker processes"""
+    engine = ValidationEngine()
+    reasons = {}
+    accepted_out = open(accepted_file, 'w', encoding='utf-8') if accepted_file else None
+    rejected_out = open(rejected_file, 'w', encoding='utf-8') if rejected_file else None
+    started = time.time()
+
+    try:
+        with Pool(processes=workers or os.cpu_count()) as pool:
+            # imap keeps input order and only holds a few batches in memory at once
+            for results, stats in pool.imap(_validate_batch, _read_batches(input_file, batch_size)):
+                engine.merge_stats(stats)
+                for line, is_valid, message in results:
+                    if is_valid:
+                        if accepted_out:
+                            accepted_out.write(line + "\n")
+                    else:
+                        reasons[message] = reasons.get(message, 0) + 1
+                        if rejected_out:
+                            rejected_out.write(line + "\n")
+    finally:
+        if accepted_out:
+            accepted_out.close()
+        if rejected_out:
+            rejected_out.close()
+
+    elapsed = time.time() - started
+    print(f"Re-validated {engine.checked} examples from {input_file} in {elapsed:.2f}s "
+          f"({engine.checked / elapsed if elapsed else 0:.0f} examples/s)")
+    engine.print_stats()
+    for message, count in sorted(reasons.items(), key=lambda kv: -kv[1]):
+        print(f"  rejected ({message}): {count}")
+    return engine.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-validate existing JSONL datasets against the current response rules')
+    parser.add_argument('input_files', nargs='+', help='Input JSONL file paths')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=500, help='Lines per worker batch')
+    parser.add_argument('--accepted-dir', help='Write examples that pass to this directory')
+    parser.add_argument('--rejected-dir', help='Write examples that fail to this directory')
+    args = parser.parse_args()
+
+    for input_file in args.input_files:
+        base_name = os.path.basename(input_file)
+        accepted_file = rejected_file = None
+        if args.accepted_dir:
+            os.makedirs(args.accepted_dir, exist_ok=True)
+            accepted_file = os.path.join(args.accepted_dir, base_name)
+        if args.rejected_dir:
+            os.makedirs(args.rejected_dir, exist_ok=True)
+            rejected_file = os.path.join(args.rejected_dir, base_name)
+        revalidate_jsonl(input_file, accepted_file, rejected_file, args.workers, args.batch_size)
+
+if __name__ == "__main__":
+    main()
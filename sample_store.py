@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Append-only JSONL sample store with a compact instruction index.
+
+The JSONL file is the source of truth. Each accepted sample is appended once through
+a buffered file handle, and a sidecar (foo.jsonl -> foo.index) gets one short line per
+sample: a hash of the instruction and the instruction itself. Starting up reads the
+sidecar instead of parsing the dataset, and the pretty-printed JSON copy is only
+written by materialize_json() at the end of a run.
+
+    python sample_store.py training_data/minecraft_command_intent_dataset.jsonl   # resync index, rewrite JSON
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+# Samples are flushed to disk after this many appends (and on flush()/close())
+FLUSH_EVERY = 50
+
+_THINKING_RE = re.compile(r"<thinking>\n(.*?)\n</thinking>\n\n(.*)", re.DOTALL)
+
+def index_path(jsonl_path):
+    """Sidecar path for a JSONL dataset: foo.jsonl -> foo.index"""
+    return os.path.splitext(jsonl_path)[0] + ".index"
+
+def instruction_hash(instruction):
+    return hashlib.sha1((instruction or "").encode("utf-8")).hexdigest()[:16]
+
+def to_jsonl_record(sample):
+    """JSONL layout: the thinking step is folded into the output as a <thinking> block"""
+    record = dict(sample)
+    if "thinking" in record:
+        thinking = record.pop("thinking")
+        key = "bot" if "bot" in record else "output"
+        if key in record:
+            record[key] = f"<thinking>\n{thinking}\n</thinking>\n\n{record[key]}"
+    return record
+
+def from_jsonl_record(record):
+    """Inverse of to_jsonl_record; records that already carry a thinking key are returned as-is"""
+    if "thinking" in record or "output" not in record:
+        return record
+    match = _THINKING_RE.fullmatch(record["output"])
+    if not match:
+        return record
+    sample = {}
+    for key, value in record.items():
+        if key == "output":
+            sample["output"] = match.group(2)
+            sample["thinking"] = match.group(1)
+        else:
+            sample[key] = value
+    return sample
+
+def iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def count_lines(path):
+    """Number of non-empty lines, counted on raw bytes without decoding JSON"""
+    count = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                count += 1
+    return count
+
+class JsonlSampleStore:
+    """Buffered appends to a JSONL dataset plus an exact-duplicate index of instructions"""
+
+    def __init__(self, jsonl_path, json_path=None, flush_every=FLUSH_EVERY):
+        self.jsonl_path = jsonl_path
+        self.json_path = json_path
+        self.index_path = index_path(jsonl_path)
+        self.flush_every = flush_every
+        self.hashes = set()
+        self.instructions = []
+        self.appended = 0
+        self._pending = 0
+        self._jsonl = None
+        self._index = None
+        os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.jsonl_path) and self.json_path and os.path.exists(self.json_path):
+            # Datasets from before the JSONL store only had a complete JSON copy
+            print(f"Creating {self.jsonl_path} from {self.json_path}")
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                samples = json.load(f)
+            with open(self.jsonl_path, 'w', encoding='utf-8') as f:
+                for sample in samples:
+                    f.write(json.dumps(to_jsonl_record(sample)) + '\n')
+
+        rows = count_lines(self.jsonl_path) if os.path.exists(self.jsonl_path) else 0
+        entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = [line.rstrip('\n').split('\t', 1) for line in f if line.strip()]
+        if len(entries) != rows or any(len(e) != 2 for e in entries):
+            # Missing or out of sync (e.g. an interrupted run): rebuild it from the dataset
+            print(f"Rebuilding sample index {self.index_path} from {rows} samples")
+            entries = self.rebuild_index()
+
+        for digest, instruction in entries:
+            self.hashes.add(digest)
+            self.instructions.append(json.loads(instruction))
+
+    def rebuild_index(self):
+        entries = []
+        if os.path.exists(self.jsonl_path):
+            entries = [self._index_entry(record.get("instruction", "")) for record in iter_jsonl(self.jsonl_path)]
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{digest}\t{instruction}\n" for digest, instruction in entries)
+        os.replace(tmp_path, self.index_path)
+        return entries
+
+    @staticmethod
+    def _index_entry(instruction):
+        # The instruction is stored JSON-encoded so tabs and newlines stay on one line
+        return instruction_hash(instruction), json.dumps(instruction, ensure_ascii=False)
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __contains__(self, instruction):
+        return instruction_hash(instruction) in self.hashes
+
+    def append(self, sample):
+        if self._jsonl is None:
+            self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8')
+            self._index = open(self.index_path, 'a', encoding='utf-8')
+        instruction = sample.get("instruction", "")
+        digest, encoded = self._index_entry(instruction)
+        self._jsonl.write(json.dumps(to_jsonl_record(sample)) + '\n')
+        self._index.write(f"{digest}\t{encoded}\n")
+        self.hashes.add(digest)
+        self.instructions.append(instruction)
+        self.appended += 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._jsonl is not None:
+            # A crash between these leaves the two out of sync, which the next load detects and repairs
+            self._jsonl.flush()
+            self._index.flush()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._index.close()
+            self._jsonl = self._index = None
+
+    def materialize_json(self, json_path=None):
+        """Write the whole dataset as an indented JSON array (thinking as its own key)"""
+        json_path = json_path or self.json_path
+        self.flush()
+        tmp_path = json_path + ".tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("[")
+            # A run that accepted nothing never creates the JSONL file
+            records = iter_jsonl(self.jsonl_path) if os.path.exists(self.jsonl_path) else []
+            for record in records:
+                f.write(",\n  " if count else "\n  ")
+                f.write(json.dumps(from_jsonl_record(record), indent=2).replace("\n", "\n  "))
+                count += 1
+            f.write("\n]" if count else "]")
+        os.replace(tmp_path, json_path)
+        return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Resync the instruction index and rewrite the JSON copy of a JSONL sample store')
+    parser.add_argument('jsonl_file', help='JSONL dataset')
+    parser.add_argument('--json', help='JSON copy to write (default: same name with .json)')
+    args = parser.parse_args()
+
+    store = JsonlSampleStore(args.jsonl_file)
+    json_path = args.json or os.path.splitext(args.jsonl_file)[0] + ".json"
+    print(f"Indexed {len(store)} samples, wrote {store.materialize_json(json_path)} to {json_path}")
+
+if __name__ == "__main__":
+    main()
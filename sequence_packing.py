@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Offline packing of tokenized examples into fixed-length training sequences.
+
+Examples from a token cache split (token_cache.py) are bin-packed into sequences of
+at most max_length tokens with best-fit decreasing: longest first, each into the
+fullest sequence that still has room. No example is ever split across two
+sequences. An example longer than max_length is truncated (or dropped with
+overflow="drop") and counted. A packing is stored next to its split as two arrays
+(the examples of each sequence, in order), so the tokens themselves aren't copied,
+and PackedSplit[i] rebuilds sequence i with position ids that restart at every
+example and the boundaries (cu_seqlens) variable-length attention needs.
+
+print_packing_stats() reports the fill rate and padding against one example per
+sequence. It also reports truncation, how many examples naive
+concatenate-and-chunk packing would have cut in two, and effective tokens per
+optimizer step.
+
+    python sequence_packing.py --tokenizer bytes --max-length 2048
+    python sequence_packing.py --tokenizer mistralai/Ministral-8B-Instruct-2410 --micro-batch 1 --grad-accum 4
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from array import array
+from token_cache import COMPILED_DIR, TOKEN_CACHE_DIR, build_token_cache, load_tokenizer, map_array, write_array
+
+MAX_LENGTH = 2048
+OVERFLOW_MODES = ("truncate", "drop")
+
+class _CapacityIndex:
+    """Open sequences bucketed by free space; finds the tightest one an example fits in
+
+    A segment tree over the free-space values 0..max_length (counts of sequences with
+    each value) answers "smallest free space >= n" in O(log max_length).
+    """
+
+    def __init__(self, max_length):
+        self.size = 1
+        while self.size < max_length + 1:
+            self.size *= 2
+        self.counts = [0] * (2 * self.size)
+        self.buckets = [[] for _ in range(max_length + 1)]
+
+    def _update(self, capacity, delta):
+        node = capacity + self.size
+        while node:
+            self.counts[node] += delta
+            node //= 2
+
+    def add(self, capacity, sequence):
+        self.buckets[capacity].append(sequence)
+        self._update(capacity, 1)
+
+    def take(self, needed):
+        """Remove and return (capacity, sequence) with the smallest capacity >= needed, or None"""
+        if needed >= self.size:
+            return None
+        node = needed + self.size
+        if not self.counts[node]:
+            # Climb until a right sibling has a sequence, then descend to its leftmost one
+            while node > 1 and not (node % 2 == 0 and self.counts[node + 1]):
+                node //= 2
+            if node == 1:
+                return None
+            node += 1
+            while node < self.size:
+                node = 2 * node if self.counts[2 * node] else 2 * node + 1
+        capacity = node - self.size
+        sequence = self.buckets[capacity].pop()
+        self._update(capacity, -1)
+        return capacity, sequence
+
+def pack_lengths(lengths, max_length=MAX_LENGTH, overflow="truncate"):
+    """Best-fit decreasing over example lengths; returns (sequences, stats)
+
+    sequences is a list of example index lists. Ties are broken by index, so the
+    same lengths always give the same packing.
+    """
+    stats = {"examples": len(lengths), "max_length": max_length, "truncated": 0, "dropped": 0,
+             "tokens_lost": 0, "tokens": 0}
+    order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+    index = _CapacityIndex(max_length)
+    sequences = []
+    for i in order:
+        length = lengths[i]
+        if length > max_length:
+            stats["tokens_lost"] += length - (0 if overflow == "drop" else max_length)
+            if overflow == "drop":
+                stats["dropped"] += 1
+                continue
+            stats["truncated"] += 1
+            length = max_length
+        if length == 0:
+            continue
+        stats["tokens"] += length
+        fit = index.take(length)
+        if fit is None:
+            capacity, sequence = max_length, len(sequences)
+            sequences.append([])
+        else:
+            capacity, sequence = fit
+        sequences[sequence].append(i)
+        if capacity - length:
+            index.add(capacity - length, sequence)
+    stats["sequences"] = len(sequences)
+    stats["fill_rate"] = stats["tokens"] / (len(sequences) * max_length) if sequences else 0.0
+    return sequences, stats
+
+def naive_split_examples(lengths, max_length=MAX_LENGTH):
+    """Examples concatenate-and-chunk packing cuts in two, and how many chunks it makes"""
+    split = 0
+    position = 0
+    for length in lengths:
+        start, end = position, position + length
+        if length and start // max_length != (end - 1) // max_length:
+            split += 1
+        position = end
+    return split, -(-position // max_length)
+
+def packing_path(split_path, max_length, overflow="truncate"):
+    return os.path.join(split_path, f"packed-{max_length}-{overflow}")
+
+def save_packing(path, sequences, stats):
+    """Sequences as (example ids in sequence order, offsets into them), plus the stats"""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    offsets = array("Q", [0])
+    examples = array("I")
+    for sequence in sequences:
+        examples.extend(sequence)
+        offsets.append(len(examples))
+    for name, arr in (("examples.bin", examples), ("offsets.bin", offsets)):
+        with open(os.path.join(tmp_path, name), 'wb') as f:
+            write_array(f, arr)
+    with open(os.path.join(tmp_path, "stats.json"), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp_path, path)
+
+class PackedSplit:
+    """Packed sequences over a TokenizedSplit; nothing but the example order is stored"""
+
+    def __init__(self, split, path):
+        self.split = split
+        self.path = path
+        self.examples = map_array(os.path.join(path, "examples.bin"), "I")
+        self.offsets = map_array(os.path.join(path, "offsets.bin"), "Q")
+        with open(os.path.join(path, "stats.json"), 'r', encoding='utf-8') as f:
+            self.stats = json.load(f)
+        self.max_length = self.stats["max_length"]
+
+    def __getstate__(self):
+        return {"split": self.split, "path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["split"], state["path"])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """{"input_ids", "labels", "position_ids", "cu_seqlens"} of sequence i, as lists
+
+        labels are -100 on prompt tokens; position_ids restart at 0 for every example
+        and cu_seqlens are the example boundaries, so attention can be kept within
+        examples.
+        """
+        input_ids, labels, position_ids, cu_seqlens = [], [], [], [0]
+        for example in self.examples[self.offsets[i]:self.offsets[i + 1]]:
+            tokens = self.split[example][:self.max_length].tolist()
+            prompt = min(self.split.prompt_length(example), len(tokens))
+            input_ids.extend(tokens)
+            labels.extend([-100] * prompt)
+            labels.extend(tokens[prompt:])
+            position_ids.extend(range(len(tokens)))
+            cu_seqlens.append(len(input_ids))
+        return {"input_ids": input_ids, "labels": labels, "position_ids": position_ids, "cu_seqlens": cu_seqlens}
+
+def pack_split(split, max_length=MAX_LENGTH, overflow="truncate"):
+    """Open the packing of a TokenizedSplit, computing and saving it on first use"""
+    if overflow not in OVERFLOW_MODES:
+        raise ValueError(f"overflow must be one of {OVERFLOW_MODES}, not {overflow!r}")
+    path = packing_path(split.path, max_length, overflow)
+    if not os.path.exists(os.path.join(path, "stats.json")):
+        started = time.time()
+        lengths = [split.length(i) for i in range(len(split))]
+        sequences, stats = pack_lengths(lengths, max_length, overflow)
+        stats["naive_split_examples"], stats["naive_sequences"] = naive_split_examples(lengths, max_length)
+        stats["padded_tokens_unpacked"] = len(lengths) * max_length
+        stats["pack_seconds"] = round(time.time() - started, 2)
+        save_packing(path, sequences, stats)
+    return PackedSplit(split, path)
+
+def print_packing_stats(stats, micro_batch=1, grad_accum=1):
+    """Fill rate, truncation and effective tokens per optimizer step of a packing"""
+    max_length = stats["max_length"]
+    sequences = stats["sequences"]
+    padding = sequences * max_length - stats["tokens"]
+    print(f"Packed {stats['examples']} examples into {sequences} sequences of {max_length} tokens "
+          f"in {stats.get('pack_seconds', 0)}s")
+    print(f"  fill rate: {stats['fill_rate']:.1%} ({padding} padding tokens)")
+    unpacked = stats["padded_tokens_unpacked"]
+    if unpacked:
+        print(f"  unpacked, one example per sequence: {stats['tokens'] / unpacked:.1%} of each "
+              f"{max_length}-token sequence used ({stats['examples']} sequences)")
+    print(f"  truncated: {stats['truncated']} examples, dropped: {stats['dropped']} "
+          f"({stats['tokens_lost']} tokens lost)")
+    print(f"  naive concatenate-and-chunk packing: {stats['naive_sequences']} sequences, "
+          f"{stats['naive_split_examples']} examples split across sequences")
+    per_step = micro_batch * grad_accum
+    steps = -(-sequences // per_step) if per_step else 0
+    print(f"  effective tokens/step: {stats['fill_rate'] * max_length * per_step:.0f} of {max_length * per_step} "
+          f"({steps} steps per epoch at micro batch {micro_batch} x {grad_accum} accumulation)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack a tokenized split into fixed-length training sequences')
+    parser.add_argument('--tokenizer', default="bytes", help='"bytes" or a transformers tokenizer name or path')
+    parser.add_argument('--compiled-dir', default=COMPILED_DIR, help='Output of compile_dataset.py')
+    parser.add_argument('--cache-dir', default=TOKEN_CACHE_DIR, help='Directory the token caches are kept in')
+    parser.add_argument('--max-length', type=int, default=MAX_LENGTH, help='Tokens per packed sequence')
+    parser.add_argument('--overflow', choices=OVERFLOW_MODES, default="truncate",
+                        help='What to do with examples longer than --max-length')
+    parser.add_argument('--micro-batch', type=int, default=1, help='Sequences per device batch (for tokens/step)')
+    parser.add_argument('--grad-accum', type=int, default=4, help='Gradient accumulation steps (for tokens/step)')
+    args = parser.parse_args()
+
+    cache = build_token_cache(load_tokenizer(args.tokenizer), args.compiled_dir, args.cache_dir)
+    for name, split in cache.splits.items():
+        print(f"{name}:")
+        packed = pack_split(split, args.max_length, args.overflow)
+        print_packing_stats(packed.stats, args.micro_batch, args.grad_accum)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Deterministic sharded generation of the unified dataset across several inference hosts.
+
+Articles are assigned to shards by a stable hash of their key, and every shard gets
+its own seed, output segment and sampler state. A shard therefore produces the same
+examples whether it runs alongside the others or alone on another machine. Shards
+are spread round-robin over the hosts, one worker process per host, and the merge
+step interleaves the segments in shard order and drops near-duplicates.
+
+    python sharded_generation.py --hosts http://box1:11434/api/generate,http://box2:11434/api/generate --examples 10000
+    python sharded_generation.py --shards 8 --shard 3 --hosts http://box1:11434/api/generate --examples 10000
+    python sharded_generation.py --shards 8 --merge
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import zlib
+from itertools import zip_longest
+from article_sampler import article_key
+from lineage import LineageIndex, lineage_path
+from near_duplicates import NearDuplicateIndex
+
+SHARD_DIR = os.path.join("training_data", "shards")
+UNIFIED_DATASET_PATH = os.path.join("training_data", "unified_minecraft_dataset.json")
+
+def shard_of(key, num_shards):
+    """Stable shard for an article key - the same on every host, run and Python version"""
+    return zlib.crc32(key.encode("utf-8")) % num_shards
+
+def shard_wiki_data(wiki_data, shard_index, num_shards):
+    """Only the articles that belong to this shard"""
+    return {category: [a for a in articles or [] if shard_of(article_key(category, a), num_shards) == shard_index]
+            for category, articles in wiki_data.items()}
+
+def shard_seed(seed, shard_index, num_shards):
+    """Seed for one shard; a single shard keeps the run's own seed so unsharded runs are unchanged"""
+    if seed is None or num_shards == 1:
+        return seed
+    return zlib.crc32(f"{seed}:{shard_index}:{num_shards}".encode("utf-8"))
+
+def shard_quota(num_examples, shard_index, num_shards):
+    return num_examples // num_shards + (1 if shard_index < num_examples % num_shards else 0)
+
+def shard_dataset_path(shard_index, num_shards):
+    return os.path.join(SHARD_DIR, f"unified_shard_{shard_index:03d}_of_{num_shards:03d}.json")
+
+def shard_sampler_state_path(shard_index, num_shards):
+    return os.path.join(SHARD_DIR, f"article_sampler_state_{shard_index:03d}_of_{num_shards:03d}.json")
+
+def _run_host(api_url, shard_indices, num_shards, num_examples, kwargs):
+    """Worker process: generate each assigned shard in turn against one host"""
+    import unified_dataset
+    unified_dataset.OLLAMA_API = api_url
+    for shard_index in shard_indices:
+        print(f"Shard {shard_index + 1}/{num_shards} on {api_url}")
+        unified_dataset.create_unified_dataset(num_examples=shard_quota(num_examples, shard_index, num_shards),
+                                               shard_index=shard_index, num_shards=num_shards, **kwargs)
+
+def generate_shards(hosts, num_examples, num_shards=None, shard_indices=None, **kwargs):
+    """Generate shards in parallel, one process per host; shards are assigned to hosts round-robin"""
+    num_shards = num_shards or len(hosts)
+    if shard_indices is None:
+        shard_indices = list(range(num_shards))
+
+    assignments = [(host, shard_indices[h::len(hosts)]) for h, host in enumerate(hosts)]
+    workers = []
+    for host, shards in assignments:
+        if not shards:
+            continue
+        worker = multiprocessing.Process(target=_run_host, args=(host, shards, num_shards, num_examples, kwargs))
+        worker.start()
+        workers.append((host, worker))
+
+    failed = []
+    for host, worker in workers:
+        worker.join()
+        if worker.exitcode != 0:
+            failed.append(host)
+    if failed:
+        print(f"Error: shard workers failed for {', '.join(failed)}; rerun their shards with --shard")
+    return not failed
+
+def merge_shards(num_shards, output_path=UNIFIED_DATASET_PATH):
+    """Interleave all shard segments into output_path in shard order, dropping near-duplicates.
+
+    Examples already in output_path stay first, so merging again is a no-op.
+    """
+    merged = []
+    if os.path.exists(output_path):
+        try:
+            with open(output_path, 'r') as f:
+                merged = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error loading {output_path}, merging into an empty dataset")
+
+    segments = []
+    lineage = LineageIndex(lineage_path(output_path))
+    for shard_index in range(num_shards):
+        path = shard_dataset_path(shard_index, num_shards)
+        if not os.path.exists(path):
+            print(f"Warning: missing shard segment {path}")
+            segments.append([])
+            continue
+        with open(path, 'r') as f:
+            segments.append(json.load(f))
+        lineage.entries.update(LineageIndex(lineage_path(path)).entries)
+
+    dedup_index = NearDuplicateIndex()
+    dedup_index.load_examples(merged)
+    existing = len(merged)
+    for row in zip_longest(*segments):
+        for example in row:
+            if example is not None and dedup_index.check_and_add(example) is None:
+                merged.append(example)
+
+    with open(output_path, 'w') as f:
+        json.dump(merged, f, indent=2)
+    lineage.prune(merged)
+    lineage.save()
+
+    total = sum(len(segment) for segment in segments)
+    print(f"Merged {len(merged) - existing} of {total} examples from {num_shards} shards into {output_path} "
+          f"({total - (len(merged) - existing)} duplicates dropped, {len(merged)} total)")
+    return merged
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the unified dataset in deterministic shards across several hosts')
+    parser.add_argument('--hosts', default=os.environ.get("OLLAMA_API", "http://localhost:11434/api/generate"),
+                        help='Comma-separated generate URLs (any /api/generate or OpenAI-compatible /v1 URL)')
+    parser.add_argument('--examples', type=int, default=10000, help='Examples to generate across all shards')
+    parser.add_argument('--shards', type=int, default=None, help='Number of shards (default: one per host)')
+    parser.add_argument('--shard', type=int, action='append', help='Only generate this shard (repeatable)')
+    parser.add_argument('--model', default="llama3.2:latest", help='Model to generate with')
+    parser.add_argument('--seed', type=int, default=42, help='Run seed; each shard derives its own from it')
+    parser.add_argument('--structured', action='store_true', help='Use schema-constrained JSON output')
+    parser.add_argument('--verify-model', help='Review drafts with this larger model (draft/verify cascade)')
+    parser.add_argument('--verify-mode', choices=["review", "rewrite"], default="review", help='Cascade verify mode')
+    parser.add_argument('--merge', action='store_true', help='Only merge existing shard segments')
+    parser.add_argument('--no-merge', action='store_true', help="Don't merge after generating")
+    parser.add_argument('--output', default=UNIFIED_DATASET_PATH, help='Merged dataset path')
+    args = parser.parse_args()
+
+    hosts = [h.strip() for h in args.hosts.split(",") if h.strip()]
+    num_shards = args.shards or len(hosts)
+
+    if not args.merge:
+        ok = generate_shards(hosts, args.examples, num_shards=num_shards, shard_indices=args.shard,
+                             model=args.model, seed=args.seed, structured=args.structured,
+                             verify_model=args.verify_model, verify_mode=args.verify_mode)
+        # A partial run (--shard) is merged later, once every shard exists
+        if not ok or args.no_merge or args.shard:
+            return
+    merge_shards(num_shards, args.output)
+
+if __name__ == "__main__":
+    main()
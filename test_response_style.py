@@ -1,6 +1,7 @@
 import json
 import os
 from unified_dataset import generate_instruction_pair, create_instruction_prompt
+from llm_cache import get_llm_cache
 
 # Load wiki data
 def load_wiki_data():
@@ -41,7 +42,7 @@ def test_response_styles():
         
         # Test both with and without thinking
         include_thinking = i % 2 == 0  # Alternate between with and without thinking
-        example = generate_instruction_pair(wiki_data, conv_type, model="llama3.2:latest", include_thinking=include_thinking)
+        example = generate_instruction_pair(wiki_data, conv_type, model="llama3.2:latest", include_thinking=include_thinking, seed=i)
         
         if example:
             examples.append(example)
@@ -58,6 +59,7 @@ def test_response_styles():
         json.dump(examples, f, indent=2)
     
     print(f"\nSaved {len(examples)} test examples to test_internet_mature_responses.json")
+    get_llm_cache().print_stats()
 
 if __name__ == "__main__":
     test_response_styles()
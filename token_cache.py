@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Pre-tokenized, memory-mapped cache of the compiled training set.
+
+The chat template is rendered and tokenized once per (data, tokenizer, template)
+combination. Each split is stored as three flat little-endian arrays: every
+example's token ids back to back (uint32), the offset where each example starts
+(uint64, one extra at the end) and the length of each example's prompt (uint32), so
+the loss can skip it. The cache directory is named after a fingerprint of the
+compiled shards' checksums (compile_dataset.py's manifest), the tokenizer and the
+template. A run whose inputs haven't changed opens the arrays with mmap instead of
+tokenizing, which is near-instant and shares the pages between dataloader workers.
+
+Tokenizers are anything with fingerprint() and encode_batch(texts); "bytes" is a
+dependency-free byte-level tokenizer for trying the pipeline on CPU, and any other
+name is loaded with transformers.AutoTokenizer.
+
+    python token_cache.py --tokenizer bytes
+    python token_cache.py --tokenizer mistralai/Ministral-8B-Instruct-2410
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+from compile_dataset import COMPILED_DIR, load_manifest, shard_paths
+
+TOKEN_CACHE_DIR = os.path.join("training_data", "token_cache")
+CACHE_VERSION = 1
+META_NAME = "meta.json"
+
+# finetune.py's Mistral Instruct format, split where the loss starts
+PROMPT_TEMPLATE = "<s>[INST] {instruction} [/INST]"
+RESPONSE_TEMPLATE = " {output}</s>"
+
+ENCODE_BATCH_SIZE = 1000
+
+def render_example(example, prompt_template=PROMPT_TEMPLATE, response_template=RESPONSE_TEMPLATE):
+    """(prompt, response) text of an example; the prompt ends where the model's answer starts"""
+    return prompt_template.format(**example), response_template.format(**example)
+
+class ByteTokenizer:
+    """UTF-8 bytes as token ids, with <s>/</s> as special tokens; for tests and CPU runs"""
+
+    SPECIAL_TOKENS = {"<pad>": 0, "<s>": 1, "</s>": 2}
+    _SPECIAL_RE = re.compile("(" + "|".join(re.escape(token) for token in SPECIAL_TOKENS) + ")")
+
+    vocab_size = 259
+    pad_token_id = 0
+
+    def fingerprint(self):
+        return "bytes-v1"
+
+    def encode(self, text):
+        ids = []
+        for piece in self._SPECIAL_RE.split(text):
+            if piece in self.SPECIAL_TOKENS:
+                ids.append(self.SPECIAL_TOKENS[piece])
+            else:
+                ids.extend(b + 3 for b in piece.encode("utf-8"))
+        return ids
+
+    def encode_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+class HFTokenizer:
+    """A transformers tokenizer; special tokens in the template text map to their ids"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+    @classmethod
+    def from_pretrained(cls, name):
+        from transformers import AutoTokenizer
+        return cls(AutoTokenizer.from_pretrained(name))
+
+    def fingerprint(self):
+        tok = self.tokenizer
+        # The serialized fast tokenizer covers the vocab, merges and normalizers
+        if getattr(tok, "is_fast", False):
+            spec = tok.backend_tokenizer.to_str()
+        else:
+            spec = json.dumps(sorted(tok.get_vocab().items()))
+        digest = hashlib.sha256(spec.encode("utf-8")).hexdigest()[:16]
+        return f"{tok.name_or_path}:{len(tok)}:{digest}"
+
+    def encode_batch(self, texts):
+        return self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+def load_tokenizer(name):
+    return ByteTokenizer() if name == "bytes" else HFTokenizer.from_pretrained(name)
+
+def cache_fingerprint(manifest, tokenizer, prompt_template=PROMPT_TEMPLATE, response_template=RESPONSE_TEMPLATE):
+    spec = {
+        "version": CACHE_VERSION,
+        "data": {split: [shard["sha256"] for shard in info["shards"]] for split, info in manifest["splits"].items()},
+        "tokenizer": tokenizer.fingerprint(),
+        "template": [prompt_template, response_template],
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def write_array(f, arr):
+    """Write an array.array to f in the cache's little-endian layout"""
+    if sys.byteorder != "little":
+        arr.byteswap()
+    arr.tofile(f)
+
+def map_array(path, typecode):
+    """Read-only, zero-copy view of an array file written by write_array"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"").cast(typecode)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # The memoryview keeps the mapping open for as long as it is used
+    return memoryview(mapped).cast(typecode)
+
+def _build_split(examples, tokenizer, split_dir, prompt_template, response_template, batch_size):
+    """Tokenize examples into split_dir/{tokens,offsets,prompt_lengths}.bin; returns the split's counts"""
+    os.makedirs(split_dir)
+    count = 0
+    total = 0
+    max_length = 0
+    offsets = array("Q", [0])
+    prompt_lengths = array("I")
+    with open(os.path.join(split_dir, "tokens.bin"), 'wb') as tokens_file:
+        batch = []
+
+        def flush():
+            nonlocal count, total, max_length
+            prompts = tokenizer.encode_batch([prompt for prompt, _ in batch])
+            responses = tokenizer.encode_batch([response for _, response in batch])
+            for prompt_ids, response_ids in zip(prompts, responses):
+                ids = array("I", prompt_ids)
+                ids.extend(response_ids)
+                write_array(tokens_file, ids)
+                total += len(ids)
+                max_length = max(max_length, len(ids))
+                offsets.append(total)
+                prompt_lengths.append(len(prompt_ids))
+            count += len(batch)
+            batch.clear()
+
+        for example in examples:
+            batch.append(render_example(example, prompt_template, response_template))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    for name, arr in (("offsets.bin", offsets), ("prompt_lengths.bin", prompt_lengths)):
+        with open(os.path.join(split_dir, name), 'wb') as f:
+            write_array(f, arr)
+    return {"examples": count, "tokens": total, "max_length": max_length}
+
+def _iter_shards(paths):
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+class TokenizedSplit:
+    """Read-only view of one split: split[i] is a memoryview of example i's token ids"""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        self.tokens = map_array(os.path.join(self.path, "tokens.bin"), "I")
+        self.offsets = map_array(os.path.join(self.path, "offsets.bin"), "Q")
+        self.prompt_lengths = map_array(os.path.join(self.path, "prompt_lengths.bin"), "I")
+
+    # mmaps can't be pickled; workers started with spawn reopen the files instead
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def length(self, i):
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def prompt_length(self, i):
+        return self.prompt_lengths[i]
+
+    @property
+    def num_tokens(self):
+        return len(self.tokens)
+
+class TokenCache:
+    """An opened cache directory: meta plus a TokenizedSplit per split"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if sys.byteorder != "little":
+            # The arrays are read in place, so the host has to share their byte order
+            raise ValueError(f"Token cache {path} is little-endian and can't be mapped on this host")
+        self.splits = {split: TokenizedSplit(os.path.join(path, split)) for split in self.meta["splits"]}
+
+    def split(self, name):
+        return self.splits[name]
+
+def build_token_cache(tokenizer, compiled_dir=COMPILED_DIR, cache_dir=TOKEN_CACHE_DIR,
+                      prompt_template=PROMPT_TEMPLATE, response_template=RESPONSE_TEMPLATE,
+                      batch_size=ENCODE_BATCH_SIZE):
+    """Open the cache for the compiled set, tokenizer and template, building it on a miss"""
+    manifest = load_manifest(compiled_dir)
+    fingerprint = cache_fingerprint(manifest, tokenizer, prompt_template, response_template)
+    path = os.path.join(cache_dir, fingerprint)
+    if os.path.exists(os.path.join(path, META_NAME)):
+        print(f"Token cache hit: {path}")
+        return TokenCache(path)
+
+    print(f"Building token cache {path} ({tokenizer.fingerprint()})")
+    started = time.time()
+    os.makedirs(cache_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".build-", dir=cache_dir)
+    try:
+        splits = {}
+        for split in manifest["splits"]:
+            examples = _iter_shards(shard_paths(manifest, compiled_dir, split))
+            splits[split] = _build_split(examples, tokenizer, os.path.join(build_dir, split),
+                                         prompt_template, response_template, batch_size)
+        meta = {"version": CACHE_VERSION, "fingerprint": fingerprint, "tokenizer": tokenizer.fingerprint(),
+                "template": [prompt_template, response_template], "byteorder": "little",
+                "compiled": manifest.get("created"), "build_seconds": round(time.time() - started, 2),
+                "splits": splits}
+        with open(os.path.join(build_dir, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(build_dir, path)
+    finally:
+        if os.path.exists(build_dir):
+            shutil.rmtree(build_dir)
+    return TokenCache(path)
+
+def print_cache_stats(cache):
+    meta = cache.meta
+    print(f"Token cache {cache.path} ({meta['tokenizer']}, built in {meta['build_seconds']}s)")
+    for split, info in meta["splits"].items():
+        mean = info["tokens"] / info["examples"] if info["examples"] else 0
+        print(f"  {split}: {info['examples']} examples, {info['tokens']} tokens "
+              f"(mean {mean:.0f}, max {info['max_length']})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Tokenize the compiled training set into a memory-mapped cache')
+    parser.add_argument('--tokenizer', default="bytes", help='"bytes" or a transformers tokenizer name or path')
+    parser.add_argument('--compiled-dir', default=COMPILED_DIR, help='Output of compile_dataset.py')
+    parser.add_argument('--cache-dir', default=TOKEN_CACHE_DIR, help='Directory the caches are kept in')
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.tokenizer)
+    started = time.time()
+    cache = build_token_cache(tokenizer, args.compiled_dir, args.cache_dir)
+    print(f"Ready in {time.time() - started:.2f}s")
+    print_cache_stats(cache)
+
+if __name__ == "__main__":
+    main()
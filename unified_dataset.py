@@ -2,12 +2,23 @@
 import json
 import os
 import random
-import requests
 import time
 from tqdm import tqdm
+import llm_client
+from article_sampler import SAMPLER_STATE_FILE, ArticleSampler, article_key, source_to_key
+from generation_telemetry import ACCEPTED, TelemetryLog, telemetry_path
+from lineage import LineageIndex, content_hash, lineage_path
+from near_duplicates import NearDuplicateIndex
+from output_budgets import DEFAULT_OUTPUT_BUDGET, DEFAULT_THINKING_BUDGET, OutputBudgets
+from llm_cache import get_llm_cache
+from model_residency import ModelScheduler, get_residency, print_residency_stats
+from response_validation import MAX_RESPONSE_CHARS, default_engine as validation_engine
+from sharded_generation import (
+    UNIFIED_DATASET_PATH, shard_dataset_path, shard_sampler_state_path, shard_seed, shard_wiki_data
+)
 
-# Initialize Ollama API endpoint
-OLLAMA_API = "http://localhost:11434/api/generate"
+# Initialize Ollama API endpoint (any /api/generate or OpenAI-compatible /v1 URL works)
+OLLAMA_API = os.environ.get("OLLAMA_API", "http://localhost:11434/api/generate")
 
 # Define the categories of conversations we want to generate
 CONVERSATION_TYPES = [
@@ -44,47 +55,59 @@ def load_wiki_data():
         print(f"Error loading wiki data: {e}")
         return None
 
-def ollama_generate(prompt, model="llama3.2:latest", temp=0.7, max_tokens=512, context_window=50000):
-    """Generate text using Ollama API"""
-    try:
-        data = {
-            "model": model,
-            "prompt": prompt,
-            "temperature": temp,
-            "max_tokens": max_tokens,
-            "stream": False,
-            "options": {
-                "num_ctx": context_window  # This is the correct parameter name for context window size
-            }
-        }
-        
-        response = requests.post(OLLAMA_API, json=data)
-        if response.status_code == 200:
-            print(response.json()["response"])
-            return response.json()["response"]
-        else:
-            print(f"Error from Ollama API: {response.status_code}")
-            print(response.text)
-            return None
-    except Exception as e:
-        print(f"Error calling Ollama API: {e}")
-        return None
+def ollama_generate(prompt, model="llama3.2:latest", temp=0.7, max_tokens=512, context_window=50000, seed=None,
+                    stream_check=None, format=None, telemetry=None, stop=None):
+    """Generate text using Ollama API (responses are served from the shared LLM cache when possible)
+
+    If stream_check is given the response is streamed and cancelled as soon as
+    stream_check(text_so_far) returns a rejection reason. format is an optional JSON
+    schema the output is constrained to. max_tokens is enforced by the server
+    (num_predict) and stop sequences end the generation there. telemetry, if given,
+    receives the call's token counts and timings.
+    """
+    options = {
+        "num_ctx": context_window  # This is the correct parameter name for context window size
+    }
+    if stop:
+        options["stop"] = stop
+    response = llm_client.generate(OLLAMA_API, model, prompt, temperature=temp, max_tokens=max_tokens,
+                                   options=options, seed=seed, stream_check=stream_check, format=format,
+                                   telemetry=telemetry)
+    if response:
+        print(response)
+    return response
 
-def create_instruction_prompt(wiki_data, conversation_type, include_thinking=False):
-    """Create a system prompt for Ollama to generate an instruction-response pair"""
+def create_instruction_prompt(wiki_data, conversation_type, include_thinking=False, structured=False, sampler=None,
+                              telemetry=None, article=None):
+    """Create a system prompt for Ollama to generate an instruction-response pair
+
+    With structured=True the model is asked for a JSON object (see response_schema)
+    instead of the PLAYER_QUESTION/ASSISTANT_RESPONSE text format. If an ArticleSampler
+    is given the article is drawn from it instead of uniformly at random; a
+    (category, article) pair pins the article (used when regenerating stale examples).
+    The chosen article is noted in telemetry if a dict is given.
+    """
     
-    # Select a random category from the wiki data (ensuring it's not empty)
-    categories = [k for k, v in wiki_data.items() if v and len(v) > 0]
-    if not categories:
-        raise ValueError("No valid categories with content found in wiki data")
+    if article is not None:
+        selected_category, selected_article = article
+    elif sampler is not None:
+        selected_category, selected_article = sampler.draw(conversation_type)
+    else:
+        # Select a random category from the wiki data (ensuring it's not empty)
+        categories = [k for k, v in wiki_data.items() if v and len(v) > 0]
+        if not categories:
+            raise ValueError("No valid categories with content found in wiki data")
+            
+        selected_category = random.choice(categories)
         
-    selected_category = random.choice(categories)
-    
-    # Select a random article from that category
-    articles = wiki_data[selected_category]
-    selected_article = random.choice(articles)
+        # Select a random article from that category
+        articles = wiki_data[selected_category]
+        selected_article = random.choice(articles)
     article_content = selected_article.get("content", "")
     article_title = selected_article.get("title", "Unknown")
+    if telemetry is not None:
+        telemetry["article"] = article_key(selected_category, selected_article)
+        telemetry["article_chars"] = len(article_content)
     
     # Limit content length to avoid token issues
     if len(article_content) > 40000:
@@ -150,20 +173,17 @@ def create_instruction_prompt(wiki_data, conversation_type, include_thinking=Fal
     if include_thinking:
         system_prompt += " Before giving the final answer, include a 'thinking' step where you reason through the information to arrive at the accurate answer."
     
-    # Build the complete prompt
-    prompt = f"""You are an expert machine learning dataset creator. I'll provide you with an article from the Minecraft Wiki, and I want you to help generate a question and answer pair that mimics a conversation between a Minecraft player and a in-world Minecraft bot.
-    The bot's personality is like a seasoned IRC/forum user - knowledgeable, concise, and casually cool without trying too hard. They use occasional internet shorthand (like "tbh", "imo", "afaik", "lmao") but never overdo it. Their humor is dry and understated, sometimes self-deprecating, but never forced. They get straight to the point without unnecessary fluff, but still manage to be helpful and approachable. They're the kind of person who's been playing Minecraft since alpha and has seen it all, but isn't elitist about it. They offer practical advice efficiently, occasionally dropping in a relevant personal experience when it adds value.
-
-ARTICLE TITLE: {article_title}
-CATEGORY: {selected_category}
-
-ARTICLE CONTENT:
-{article_content.strip()}
-
-INSTRUCTION:
-{system_prompt}
+    # Describe the expected output format
+    if structured:
+        thinking_key = '- "thinking": your step-by-step reasoning process\n' if include_thinking else ""
+        output_format = f"""Respond with a single JSON object with these keys:
+- "player_question": the player's question
+{thinking_key}- "assistant_response": the bot's response - make sure you do not start by repeating the player's question. For crafting recipes, be specific about materials, quantities, and grid patterns. For resource acquisition, provide complete step-by-step instructions. Keep it concise and internet-mature, like a seasoned Minecraft player who's helpful without being verbose or cringey.
 
-Format your response EXACTLY as follows:
+DO NOT include any text outside of the JSON object.
+"""
+    else:
+        output_format = f"""Format your response EXACTLY as follows:
 ```
 PLAYER_QUESTION: [The player's question]
 
@@ -176,97 +196,184 @@ DO NOT include any explanations or additional text outside of the specified form
 IMPORTANT: Do not use backticks, markdown formatting, or any other characters in your response except what is shown in the template above.
 STRICTLY follow the format shown above with the exact section headers and no additional text.
 """
+
+    # Build the complete prompt
+    prompt = f"""You are an expert machine learning dataset creator. I'll provide you with an article from the Minecraft Wiki, and I want you to help generate a question and answer pair that mimics a conversation between a Minecraft player and a in-world Minecraft bot.
+    The bot's personality is like a seasoned IRC/forum user - knowledgeable, concise, and casually cool without trying too hard. They use occasional internet shorthand (like "tbh", "imo", "afaik", "lmao") but never overdo it. Their humor is dry and understated, sometimes self-deprecating, but never forced. They get straight to the point without unnecessary fluff, but still manage to be helpful and approachable. They're the kind of person who's been playing Minecraft since alpha and has seen it all, but isn't elitist about it. They offer practical advice efficiently, occasionally dropping in a relevant personal experience when it adds value.
+
+ARTICLE TITLE: {article_title}
+CATEGORY: {selected_category}
+
+ARTICLE CONTENT:
+{article_content.strip()}
+
+INSTRUCTION:
+{system_prompt}
+
+{output_format}"""
     
     return prompt, article_title, selected_category
 
 def validate_response_quality(response, conversation_type):
-    """Validate that the response meets quality standards for the given conversation type"""
-    
-    # Check for minimum length
-    if len(response) < 50:
-        return False, "Response too short"
-    
-    # Check for maximum length (to avoid extremely verbose responses)
-    if len(response) > 2000:
-        return False, "Response too long"
-    
-    # Check for basic helpfulness
-    if "I don't know" in response.lower() or "I'm not sure" in response.lower():
-        # Only reject if this is the primary content
-        if len(response) < 100:
-            return False, "Response lacks helpful information"
-    
-    # Specific checks based on conversation type
-    if conversation_type == "crafting_and_recipes":
-        # Check for specific crafting information
-        if not any(term in response.lower() for term in ["need", "require", "use", "place", "craft", "recipe", "grid", "pattern", "shaped", "shapeless"]):
-            return False, "Crafting response doesn't describe the recipe pattern"
-    
-    elif conversation_type == "survival_scenarios":
-        # Check for actionable advice
-        if not any(term in response.lower() for term in ["should", "could", "try", "do", "don't", "avoid", "use", "find", "craft", "build", "run", "hide", "fight"]):
-            return False, "Survival response doesn't provide actionable advice"
-    
-    elif conversation_type == "resource_chains":
-        # Check for step-by-step instructions
-        if not any(term in response.lower() for term in ["first", "then", "next", "after", "finally", "step", "process", "start", "begin"]):
-            return False, "Resource chain response doesn't provide sequential steps"
+    """Validate that the response meets quality standards for the given conversation type
+
+    The rules live in response_validation.VALIDATION_RULES and are compiled into a single
+    matcher; `python response_validation.py <dataset.jsonl>` re-checks existing datasets.
+    """
+    return validation_engine.validate(response, conversation_type)
+
+def early_reject_reason(partial_text, conversation_type):
+    """Return a rejection reason if a partial generation is already guaranteed to fail, else None.
+
+    Mirrors the extraction in generate_instruction_pair: the assistant response is the
+    text between the first and second ASSISTANT_RESPONSE: marker (or the end). Missing
+    markers can't be decided until the stream ends, since they may still show up.
+    """
+    marker = "ASSISTANT_RESPONSE:"
+    if marker not in partial_text:
+        return None
+
+    cleaned = partial_text.replace("```", "")
+    sections = cleaned.split(marker)
+    if len(sections) > 2:
+        # A second marker closes the response section, so it is final - run the real checks
+        is_valid, validation_message = validate_response_quality(sections[1].strip(), conversation_type)
+        return None if is_valid else validation_message
+
+    # Still open: the section can only grow, except that a marker or ``` still being
+    # streamed at the tail could cut off a few characters
+    if len(sections[1].strip()) - len(marker) - 2 > MAX_RESPONSE_CHARS:
+        return "Response too long"
+    return None
+
+def response_schema(include_thinking):
+    """JSON schema for structured generation (sent as Ollama's `format`)"""
+    keys = ["player_question", "thinking", "assistant_response"] if include_thinking else ["player_question", "assistant_response"]
+    properties = {key: {"type": "string"} for key in keys}
+    properties["assistant_response"]["maxLength"] = MAX_RESPONSE_CHARS
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": keys,
+        "additionalProperties": False
+    }
+
+_json_decoder = json.JSONDecoder(strict=True)
+
+def parse_structured_response(response_text, include_thinking):
+    """Strictly decode a structured generation into (question, thinking, response), or None"""
+    try:
+        data, end = _json_decoder.raw_decode(response_text.strip())
+    except json.JSONDecodeError:
+        return None
+
+    # Exactly one object with string values for the schema keys, nothing trailing
+    if not isinstance(data, dict) or response_text.strip()[end:].strip():
+        return None
+    expected = set(response_schema(include_thinking)["required"])
+    if set(data) != expected or not all(isinstance(v, str) for v in data.values()):
+        return None
+
+    return data["player_question"].strip(), data.get("thinking", "").strip() or None, data["assistant_response"].strip()
+
+def parse_text_response(response_text, include_thinking):
+    """Extract (question, thinking, response) from the PLAYER_QUESTION/THINKING/ASSISTANT_RESPONSE format"""
+    player_question = None
+    assistant_response = None
+    thinking = None
     
-    # Check for internet-mature style (some shorthand, casual but not overly so)
-    internet_style_markers = ["tbh", "imo", "afaik", "fwiw", "btw", "iirc", "ymmv", "tl;dr"]
-    casual_markers = ["pretty", "basically", "actually", "just", "really", "honestly", "generally", "typically"]
+    # Clean response by removing any markdown code block formatting
+    response_text = response_text.replace("```", "").strip()
     
-    # The response should have some casual markers but not be too formal
-    has_casual_style = any(marker in response.lower() for marker in casual_markers)
+    if "PLAYER_QUESTION:" in response_text:
+        player_question_part = response_text.split("PLAYER_QUESTION:")[1]
+        player_question_end = min(
+            [player_question_part.find(f"\n\n{marker}") for marker in ["THINKING:", "ASSISTANT_RESPONSE:"] 
+            if player_question_part.find(f"\n\n{marker}") != -1] or [len(player_question_part)]
+        )
+        player_question = player_question_part[:player_question_end].strip()
     
-    # Ideally would have some internet shorthand, but not required
-    has_internet_style = any(marker in response.lower() for marker in internet_style_markers)
+    if include_thinking and "THINKING:" in response_text:
+        thinking_part = response_text.split("THINKING:")[1]
+        thinking_end = thinking_part.find("\n\nASSISTANT_RESPONSE:")
+        if thinking_end != -1:
+            thinking = thinking_part[:thinking_end].strip()
     
-    # No need to reject based on style alone, as the main priority is accurate information
+    if "ASSISTANT_RESPONSE:" in response_text:
+        assistant_response = response_text.split("ASSISTANT_RESPONSE:")[1].strip()
     
-    return True, "Response meets quality standards"
+    return player_question, thinking, assistant_response
+
+# Accepted examples per LLM call, per output mode
+YIELD_STATS = {
+    "text": {"calls": 0, "accepted": 0, "parse_failures": 0, "fallback_parses": 0},
+    "json": {"calls": 0, "accepted": 0, "parse_failures": 0, "fallback_parses": 0}
+}
 
-def generate_instruction_pair(wiki_data, conversation_type, model="mistral-small", include_thinking=True):
-    """Generate an instruction-response pair using Ollama"""
+def print_yield_stats():
+    for mode, stats in YIELD_STATS.items():
+        if not stats["calls"]:
+            continue
+        print(f"Yield ({mode} mode): {stats['accepted']}/{stats['calls']} accepted per LLM call "
+              f"({stats['accepted'] / stats['calls']:.1%}), {stats['parse_failures']} parse failures, "
+              f"{stats['fallback_parses']} recovered by the text parser")
+
+# A second pair after the first one is never used, so stop the text format there
+TEXT_STOP_SEQUENCES = ["\n\nPLAYER_QUESTION:"]
+
+def generate_instruction_pair(wiki_data, conversation_type, model="mistral-small", include_thinking=True, seed=None,
+                              structured=False, sampler=None, telemetry=None, article=None, max_tokens=None):
+    """Generate an instruction-response pair using Ollama (seed makes the LLM call reproducible and cacheable)
+
+    With structured=True the backend is constrained to response_schema and the output is
+    decoded as JSON, falling back to the text parser if that fails. max_tokens is the
+    output budget (see output_budgets.py); outputs cut off by it are rejected. If a
+    telemetry dict is given it is filled with the article, the call's token counts and
+    the outcome.
+    """
+    mode = "json" if structured else "text"
+    if max_tokens is None:
+        max_tokens = DEFAULT_THINKING_BUDGET if include_thinking else DEFAULT_OUTPUT_BUDGET
+    telemetry = {} if telemetry is None else telemetry
+    telemetry.update(conversation_type=conversation_type, mode=mode, thinking=include_thinking,
+                     max_tokens=max_tokens, outcome="error")
     
     try:
         # Create the instruction prompt
-        prompt, article_title, selected_category = create_instruction_prompt(wiki_data, conversation_type, include_thinking=include_thinking)
+        prompt, article_title, selected_category = create_instruction_prompt(wiki_data, conversation_type, include_thinking=include_thinking,
+                                                                             structured=structured, sampler=sampler,
+                                                                             telemetry=telemetry, article=article)
         
-        # Generate response using Ollama API
-        response_text = ollama_generate(prompt, model=model)
+        # Generate response using Ollama API, cancelling it as soon as it can no longer pass validation
+        YIELD_STATS[mode]["calls"] += 1
+        response_text = ollama_generate(prompt, model=model, seed=seed, max_tokens=max_tokens,
+                                        stream_check=lambda text: early_reject_reason(text, conversation_type),
+                                        format=response_schema(include_thinking) if structured else None,
+                                        stop=None if structured else TEXT_STOP_SEQUENCES, telemetry=telemetry)
         
         if not response_text:
+            telemetry["outcome"] = "aborted" if telemetry.get("aborted") else "no_response"
             print("Failed to generate response")
             return None
         
-        # Extract player question and assistant response
-        player_question = None
-        assistant_response = None
-        thinking = None
-        
-        # Clean response by removing any markdown code block formatting
-        response_text = response_text.replace("```", "").strip()
-        
-        if "PLAYER_QUESTION:" in response_text:
-            player_question_part = response_text.split("PLAYER_QUESTION:")[1]
-            player_question_end = min(
-                [player_question_part.find(f"\n\n{marker}") for marker in ["THINKING:", "ASSISTANT_RESPONSE:"] 
-                if player_question_part.find(f"\n\n{marker}") != -1] or [len(player_question_part)]
-            )
-            player_question = player_question_part[:player_question_end].strip()
-        
-        if include_thinking and "THINKING:" in response_text:
-            thinking_part = response_text.split("THINKING:")[1]
-            thinking_end = thinking_part.find("\n\nASSISTANT_RESPONSE:")
-            if thinking_end != -1:
-                thinking = thinking_part[:thinking_end].strip()
+        # The output budget cut the generation off, so whatever parses out of it is incomplete
+        if telemetry.get("done_reason") == "length":
+            telemetry["outcome"] = "truncated"
+            print(f"Generation hit the {max_tokens} token budget")
+            return None
         
-        if "ASSISTANT_RESPONSE:" in response_text:
-            assistant_response = response_text.split("ASSISTANT_RESPONSE:")[1].strip()
+        # Extract player question and assistant response
+        parsed = parse_structured_response(response_text, include_thinking) if structured else None
+        if parsed is None:
+            parsed = parse_text_response(response_text, include_thinking)
+            if structured and parsed[0] and parsed[2]:
+                YIELD_STATS[mode]["fallback_parses"] += 1
+        player_question, thinking, assistant_response = parsed
         
         # If we couldn't extract properly, return None
         if not player_question or not assistant_response:
+            YIELD_STATS[mode]["parse_failures"] += 1
+            telemetry["outcome"] = "parse_failure"
             print("Could not properly extract question and response")
             print(f"Raw response: {response_text}")
             return None
@@ -274,6 +381,7 @@ def generate_instruction_pair(wiki_data, conversation_type, model="mistral-small
         # Validate response quality
         is_valid, validation_message = validate_response_quality(assistant_response, conversation_type)
         if not is_valid:
+            telemetry["outcome"] = f"invalid: {validation_message}"
             print(f"Invalid response: {validation_message}")
             return None
         
@@ -289,15 +397,157 @@ def generate_instruction_pair(wiki_data, conversation_type, model="mistral-small
         # Add thinking if applicable
         if include_thinking and thinking:
             instruction_pair["thinking"] = thinking
-            
+        
+        YIELD_STATS[mode]["accepted"] += 1
+        telemetry["outcome"] = ACCEPTED
         return instruction_pair
         
     except Exception as e:
         print(f"Error in generate_instruction_pair: {e}")
         return None
 
-def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="mistral-small"):
-    """Create a unified dataset combining synthetic and wiki-based examples"""
+# Cascade mode: a larger model reviews drafts that passed the cheap filters.
+# Scores are 1-10; in "rewrite" mode drafts between the two thresholds are replaced
+# by the verifier's revision instead of being dropped.
+VERIFY_ACCEPT_SCORE = 7
+VERIFY_REWRITE_SCORE = 4
+VERIFY_CONTEXT_CHARS = 12000  # article excerpt the verifier checks facts against
+VERIFY_OUTPUT_BUDGET = 1024  # a verdict plus a revision of up to MAX_RESPONSE_CHARS
+
+CASCADE_STATS = {"verified": 0, "accepted": 0, "rewritten": 0, "rejected": 0, "verify_failures": 0}
+
+def verification_schema():
+    """JSON schema for the verifier's verdict"""
+    return {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer", "minimum": 1, "maximum": 10},
+            "issues": {"type": "string"},
+            "revised_response": {"type": "string", "maxLength": MAX_RESPONSE_CHARS}
+        },
+        "required": ["score", "issues", "revised_response"],
+        "additionalProperties": False
+    }
+
+def create_verification_prompt(example, article):
+    """Prompt asking the verify model to grade a drafted pair against its source article"""
+    article_content = article.get("content", "") if article else ""
+    if len(article_content) > VERIFY_CONTEXT_CHARS:
+        article_content = article_content[:VERIFY_CONTEXT_CHARS] + "..."
+    
+    return f"""You are reviewing a question and answer pair written for a Minecraft fine-tuning dataset. Use the wiki article as the ground truth.
+
+ARTICLE TITLE: {article.get("title", "Unknown") if article else "Unknown"}
+
+ARTICLE CONTENT:
+{article_content.strip()}
+
+PLAYER QUESTION: {example["instruction"]}
+
+ASSISTANT RESPONSE: {example["output"]}
+
+INSTRUCTION:
+Score the assistant response from 1 to 10: 10 means it is factually correct according to the article, answers the question completely and keeps the concise, casual tone of a seasoned player; 1 means it is wrong or useless. List any factual errors or omissions in "issues". In "revised_response", give a corrected version in the same tone that fixes every issue (repeat the response unchanged if there are none).
+
+Respond with a single JSON object with the keys "score", "issues" and "revised_response". DO NOT include any text outside of the JSON object.
+"""
+
+def parse_verification(response_text):
+    """Decode the verifier's verdict into (score, revised_response), or None"""
+    try:
+        data, _ = _json_decoder.raw_decode(response_text.strip())
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("score"), int):
+        return None
+    revised = data.get("revised_response")
+    return data["score"], revised.strip() if isinstance(revised, str) else None
+
+def verify_instruction_pair(example, article, verify_model, mode="review", seed=None, telemetry=None):
+    """Second cascade tier: return the example (possibly rewritten) if the verify model accepts it, else None
+
+    mode="review" keeps drafts scoring at least VERIFY_ACCEPT_SCORE. mode="rewrite" also
+    keeps drafts scoring at least VERIFY_REWRITE_SCORE, with the verifier's revision as
+    the output if it passes validation.
+    """
+    telemetry = {} if telemetry is None else telemetry
+    telemetry.update(tier="verify", model=verify_model, outcome="error")
+    CASCADE_STATS["verified"] += 1
+    
+    response_text = ollama_generate(create_verification_prompt(example, article), model=verify_model,
+                                    temp=0.2, max_tokens=VERIFY_OUTPUT_BUDGET, seed=seed, format=verification_schema(),
+                                    telemetry=telemetry)
+    verdict = parse_verification(response_text) if response_text else None
+    if verdict is None:
+        CASCADE_STATS["verify_failures"] += 1
+        telemetry["outcome"] = "verify_failure"
+        print("Could not get a verdict from the verify model")
+        return None
+    
+    score, revised = verdict
+    telemetry["verify_score"] = score
+    if score >= VERIFY_ACCEPT_SCORE:
+        CASCADE_STATS["accepted"] += 1
+        telemetry["outcome"] = ACCEPTED
+        return example
+    
+    if mode == "rewrite" and score >= VERIFY_REWRITE_SCORE and revised:
+        is_valid, validation_message = validate_response_quality(revised, example["conversation_type"])
+        if is_valid:
+            CASCADE_STATS["rewritten"] += 1
+            telemetry.update(outcome=ACCEPTED, rewritten=True)
+            return dict(example, output=revised)
+        print(f"Invalid rewrite: {validation_message}")
+    
+    CASCADE_STATS["rejected"] += 1
+    telemetry["outcome"] = f"verify_rejected: score {score}"
+    print(f"Verify model rejected the draft (score {score})")
+    return None
+
+def print_cascade_stats():
+    s = CASCADE_STATS
+    if not s["verified"]:
+        return
+    print(f"Cascade: {s['verified']} drafts verified, {s['accepted']} accepted, {s['rewritten']} rewritten, "
+          f"{s['rejected']} rejected, {s['verify_failures']} without a verdict")
+
+def save_dataset(dataset_path, dataset, sampler=None, lineage=None):
+    """Write the dataset (and the sampler's usage and lineage index) to disk, used for checkpoints and the final save"""
+    with open(dataset_path, 'w') as f:
+        json.dump(dataset, f, indent=2)
+    if sampler:
+        sampler.save()
+    if lineage:
+        lineage.save()
+
+def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="mistral-small", seed=None,
+                           structured=False, sampler_weighting="size", shard_index=0, num_shards=1,
+                           verify_model=None, verify_mode="review", model_batch_size=10):
+    """Create a unified dataset combining synthetic and wiki-based examples
+
+    Passing a seed makes article/type sampling and the LLM sampling seeds deterministic,
+    so a rerun with LLM_CACHE_MODE=replay reproduces the run from the response cache.
+    Articles are drawn by a coverage-aware ArticleSampler weighted by sampler_weighting
+    ("size", "informativeness" or "uniform"); None falls back to plain random choice.
+
+    With num_shards > 1 only the shard's own articles are used, with a seed derived
+    from (seed, shard_index, num_shards), and output goes to the shard's own segment
+    (see sharded_generation.py), so a shard is reproducible on its own.
+
+    Each draft's num_predict comes from the learned per-type budgets in
+    output_budgets.OUTPUT_BUDGET_FILE (defaults until `python output_budgets.py` is run).
+
+    With a verify_model, `model` only drafts: drafts that pass parsing, validation and
+    near-duplicate checks are reviewed (or rewritten, verify_mode="rewrite") by
+    verify_model, see verify_instruction_pair. Each tier's calls are logged separately
+    in the telemetry sidecar. Drafts and verifications run in batches of model_batch_size
+    grouped by model (see model_residency.ModelScheduler), so each batch loads each
+    model at most once.
+    """
+    sharded = num_shards > 1
+    seed = shard_seed(seed, shard_index, num_shards)
+    if seed is not None:
+        random.seed(seed)
     
     # Load wiki data
     wiki_data = []
@@ -311,9 +561,14 @@ def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="
         print("Error: Wiki data file not found")
         return
     
+    if sharded:
+        wiki_data = shard_wiki_data(wiki_data, shard_index, num_shards)
+        print(f"Shard {shard_index + 1}/{num_shards}: {sum(len(a) for a in wiki_data.values())} articles")
+    
     # Load existing dataset if available
     existing_data = []
-    dataset_path = "training_data/unified_minecraft_dataset.json"
+    dataset_path = shard_dataset_path(shard_index, num_shards) if sharded else UNIFIED_DATASET_PATH
+    os.makedirs(os.path.dirname(dataset_path), exist_ok=True)
     
     if os.path.exists(dataset_path):
         try:
@@ -323,6 +578,27 @@ def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="
         except json.JSONDecodeError:
             print("Error loading existing dataset, starting fresh")
     
+    # Build (or load) the article sampling index, counting articles the dataset already covers
+    sampler = None
+    if sampler_weighting:
+        state_path = shard_sampler_state_path(shard_index, num_shards) if sharded else SAMPLER_STATE_FILE
+        sampler = ArticleSampler(wiki_data, weighting=sampler_weighting, seed=seed, state_path=state_path)
+        sampler.seed_usage_from_examples(existing_data)
+    
+    # Index what's already been generated so paraphrased repeats are rejected on arrival
+    dedup_index = NearDuplicateIndex()
+    dedup_index.load_examples(existing_data)
+    
+    # Token counts, timings and outcome of every LLM call, next to the dataset
+    telemetry_log = TelemetryLog(telemetry_path(dataset_path))
+    
+    # The verify tier checks drafts against their source article, and lineage records its content hash
+    articles_by_key = {article_key(c, a): a for c, articles in wiki_data.items() for a in articles or []}
+    lineage = LineageIndex(lineage_path(dataset_path))
+    
+    # Server-side output limits per conversation type, learned by output_budgets.py
+    output_budgets = OutputBudgets()
+    
     # Determine how many new examples to generate
     num_to_generate = max(0, num_examples - len(existing_data))
     
@@ -347,7 +623,13 @@ def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="
         
         # Generate new examples with progress bar
         new_examples = []
-        for i in tqdm(range(num_to_generate)):
+        # With a verify model, drafts and verifications run in batches grouped by model, so a
+        # server that can't hold both models loads each once per batch instead of per example
+        batch_size = model_batch_size if verify_model else 1
+        scheduler = ModelScheduler(OLLAMA_API, warm=bool(verify_model))
+        get_residency(OLLAMA_API).warm(model)
+        
+        def draft(i):
             # Randomly select conversation type
             conversation_type = random.choice(conversation_types)
             
@@ -355,16 +637,69 @@ def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="
             include_thinking = random.random() < include_thinking_ratio
             
             # Generate example
-            example = generate_instruction_pair(wiki_data, conversation_type, model=model, include_thinking=include_thinking)
+            # Per-example LLM seed so identical reruns hit the response cache
+            llm_seed = None if seed is None else seed * 1000003 + len(existing_data) + i
+            call = {"tier": "draft", "model": model}
+            example = generate_instruction_pair(wiki_data, conversation_type, model=model,
+                                                include_thinking=include_thinking, seed=llm_seed,
+                                                structured=structured, sampler=sampler, telemetry=call,
+                                                max_tokens=output_budgets.get(conversation_type, include_thinking))
             
             if example:
-                new_examples.append(example)
+                duplicate = dedup_index.check(example)
+                if duplicate:
+                    call["outcome"] = "near_duplicate"
+                    telemetry_log.record(call)
+                    print(f"Skipping {duplicate}")
+                    # The article has likely been mined out, so steer future draws elsewhere
+                    if sampler:
+                        sampler.mark_saturated(source_to_key(example.get("source")))
+                    return None
+            return example, call, llm_seed
+        
+        def verify(drafted):
+            example, call, llm_seed = drafted
+            # An earlier draft of the same batch may have been accepted since this one was checked
+            if dedup_index.check(example):
+                call["outcome"] = "near_duplicate"
+                return None, call
+            review = {"conversation_type": example["conversation_type"], "article": call.get("article"),
+                      "article_chars": call.get("article_chars")}
+            example = verify_instruction_pair(example, articles_by_key.get(call.get("article")), verify_model,
+                                              mode=verify_mode, seed=llm_seed, telemetry=review)
+            # The draft's outcome is the verdict, so its tokens count as wasted if the draft is dropped
+            call.update(outcome=review["outcome"], verified=True)
+            telemetry_log.record(call)
+            return example, review
+        
+        with tqdm(total=num_to_generate) as progress:
+            for batch_start in range(0, num_to_generate, batch_size):
+                batch = range(batch_start, min(num_to_generate, batch_start + batch_size))
+                drafted = [d for d in scheduler.map(model, draft, batch) if d is not None]
+                if verify_model:
+                    passed = [d for d in drafted if d[0]]
+                    for d in drafted:
+                        if not d[0]:
+                            telemetry_log.record(d[1])
+                    results = scheduler.map(verify_model, verify, passed)
+                else:
+                    results = [(example, call) for example, call, _ in drafted]
+                
+                accepted = False
+                for example, call in results:
+                    if example:
+                        dedup_index.add(example)
+                        new_examples.append(example)
+                        accepted = True
+                        if call.get("article") in articles_by_key:
+                            lineage.record(example, call["article"], articles_by_key[call["article"]])
+                    telemetry_log.record(call)
+                progress.update(len(batch))
                 
                 # Save progress every 10 examples
-                if (i + 1) % 10 == 0:
-                    temp_dataset = existing_data + new_examples
-                    with open(dataset_path, 'w') as f:
-                        json.dump(temp_dataset, f, indent=2)
+                if accepted and batch.stop // 10 > batch.start // 10:
+                    save_dataset(dataset_path, existing_data + new_examples, sampler, lineage)
+                    telemetry_log.flush()
         
         # Combine with existing data
         unified_dataset = existing_data + new_examples
@@ -373,13 +708,94 @@ def create_unified_dataset(num_examples=200, include_thinking_ratio=0.3, model="
         unified_dataset = existing_data
     
     # Save final dataset
-    with open(dataset_path, 'w') as f:
-        json.dump(unified_dataset, f, indent=2)
+    save_dataset(dataset_path, unified_dataset, sampler, lineage)
+    
+    telemetry_log.close()
     
     print(f"Saved unified dataset with {len(unified_dataset)} examples")
+    if sampler:
+        sampler.print_stats()
+    dedup_index.print_stats()
+    get_llm_cache().print_stats()
+    llm_client.print_stream_stats()
+    llm_client.print_backend_stats()
+    print_residency_stats()
+    print_yield_stats()
+    print_cascade_stats()
+    validation_engine.print_stats()
     return unified_dataset
 
+def regenerate_stale_examples(dataset_path, wiki_data, model="llama3.2:latest", seed=None, structured=False,
+                              verify_model=None, verify_mode="review"):
+    """Regenerate only the examples whose source article changed since they were generated
+
+    Examples from edited articles are replaced in place by a fresh example of the same
+    conversation type from the current article (dropped if generation fails); examples
+    from deleted articles are dropped. Examples without lineage are left alone, run
+    `python lineage.py --backfill` before re-scraping to track them.
+    """
+    with open(dataset_path, 'r') as f:
+        dataset = json.load(f)
+    lineage = LineageIndex(lineage_path(dataset_path))
+    articles_by_key = {article_key(c, a): a for c, articles in wiki_data.items() for a in articles or []}
+    categories = {article_key(c, a): c for c, articles in wiki_data.items() for a in articles or []}
+    status = lineage.classify(dataset, {k: content_hash(a) for k, a in articles_by_key.items()})
+    stale = set(status["changed"]) | set(status["deleted"])
+    print(f"{len(status['changed'])} examples from edited articles, {len(status['deleted'])} from deleted articles, "
+          f"{len(status['untracked'])} untracked")
+    if not stale:
+        return dataset
+    
+    # Regenerated examples must not repeat the ones being kept
+    dedup_index = NearDuplicateIndex()
+    dedup_index.load_examples([e for i, e in enumerate(dataset) if i not in stale])
+    telemetry_log = TelemetryLog(telemetry_path(dataset_path))
+    output_budgets = OutputBudgets()
+    
+    regenerated = 0
+    result = []
+    for i, example in enumerate(tqdm(dataset)):
+        if i not in stale:
+            result.append(example)
+            continue
+        key = lineage.get(example)["article"]
+        lineage.forget(example)
+        if key not in articles_by_key:
+            continue
+        
+        conversation_type = example.get("conversation_type", random.choice(CONVERSATION_TYPES))
+        llm_seed = None if seed is None else seed * 1000003 + i
+        call = {"tier": "draft", "model": model, "regenerated": True}
+        replacement = generate_instruction_pair(wiki_data, conversation_type, model=model,
+                                                include_thinking="thinking" in example, seed=llm_seed,
+                                                structured=structured, telemetry=call,
+                                                article=(categories[key], articles_by_key[key]),
+                                                max_tokens=output_budgets.get(conversation_type, "thinking" in example))
+        if replacement and dedup_index.check(replacement):
+            call["outcome"] = "near_duplicate"
+            replacement = None
+        if replacement and verify_model:
+            review = {"conversation_type": conversation_type, "article": key, "regenerated": True}
+            replacement = verify_instruction_pair(replacement, articles_by_key[key], verify_model,
+                                                  mode=verify_mode, seed=llm_seed, telemetry=review)
+            call.update(outcome=review["outcome"], verified=True)
+            telemetry_log.record(call)
+            call = review
+        telemetry_log.record(call)
+        if replacement:
+            dedup_index.add(replacement)
+            lineage.record(replacement, key, articles_by_key[key])
+            result.append(replacement)
+            regenerated += 1
+    
+    lineage.prune(result)
+    save_dataset(dataset_path, result, lineage=lineage)
+    telemetry_log.close()
+    print(f"Regenerated {regenerated} of {len(status['changed'])} examples from edited articles, "
+          f"dropped {len(dataset) - len(result)} examples ({len(dataset)} -> {len(result)})")
+    return result
+
 if __name__ == "__main__":
     # Create the unified dataset
     print("Creating unified Minecraft dataset with wiki-based examples...")
-    create_unified_dataset(num_examples=10000, model="llama3.2:latest")
+    create_unified_dataset(num_examples=10000, model="llama3.2:latest", seed=42)